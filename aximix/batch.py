@@ -0,0 +1,437 @@
+"""Headless batch plotting, with the same layout options as the UI.
+
+Examples::
+
+    python -m aximix.batch --page-format a4 --margin 15mm --fit-to-page *.svg
+    python -m aximix.batch --queue tonight.txt --dry-run --json
+    python -m aximix.batch --serial /dev/ttyUSB0 --rtscts drawing.svg
+    python -m aximix.batch --port /dev/ttyACM0 --port /dev/ttyACM1 --queue tonight.txt
+"""
+
+import asyncio
+import contextlib
+import json
+import os
+import signal
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import click
+
+from axy import BACKENDS, get_backend
+from axy.kinematics import MotionSettings, PlotGeometry, format_duration
+
+from .layer_schedule import schedule_layers
+from .pagelayout import PageLayout, read_vector_data
+from .plot_worker import PlotJob
+from .plotter_pool import PlotterPool
+from .settings import get_axidraw_config, get_layer_config, get_layer_order
+
+
+def _parse_option(value: str) -> Tuple[str, Any]:
+    key, sep, raw = value.partition("=")
+    if not sep:
+        raise click.BadParameter(f"expected KEY=VALUE, got '{value}'")
+    for convert in (int, float):
+        try:
+            return key, convert(raw)
+        except ValueError:
+            pass
+    if raw.lower() in ("true", "false"):
+        return key, raw.lower() == "true"
+    return key, raw
+
+
+def _read_queue(path: str) -> List[str]:
+    """Read a queue file: one SVG path per line, relative to the queue file, with
+    blank lines and ``#`` comments ignored."""
+    base = os.path.dirname(os.path.abspath(path))
+    paths = []
+    with open(path) as fp:
+        for line in fp:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                paths.append(os.path.join(base, os.path.expanduser(line)))
+    return paths
+
+
+class _Reporter:
+    def __init__(self, as_json: bool):
+        self._json = as_json
+
+    def __call__(self, event: str, message: str = "", **fields: Any) -> None:
+        if self._json:
+            click.echo(json.dumps({"event": event, "time": time.time(), **fields}))
+        elif message:
+            click.echo(message)
+
+
+@click.command()
+@click.argument("files", nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@click.option("--queue", "-q", type=click.Path(exists=True), help="file listing SVGs")
+@click.option("--page-format", "-p", default="a4", show_default=True)
+@click.option("--landscape/--portrait", default=False, show_default=True)
+@click.option("--rotate", is_flag=True, help="rotate by 90 degrees")
+@click.option("--center/--no-center", default=True, show_default=True)
+@click.option("--fit-to-page", is_flag=True)
+@click.option("--margin", "-m", default="20mm", show_default=True)
+@click.option("--merge", is_flag=True, help="merge line ends")
+@click.option("--sort", is_flag=True, help="sort lines to reduce pen-up travel")
+@click.option("--simplify", is_flag=True, help="simplify lines")
+@click.option(
+    "--layer", "-l", "layers", type=int, multiple=True, help="plot only these layers"
+)
+@click.option(
+    "--backend",
+    "-b",
+    type=click.Choice(BACKENDS),
+    default="axidraw",
+    show_default=True,
+)
+@click.option(
+    "--realtime-factor",
+    type=float,
+    help="simulator backend: simulated time divided by this factor (1: real time)",
+)
+@click.option(
+    "--option",
+    "-o",
+    "options",
+    multiple=True,
+    help="AxiDraw option as KEY=VALUE, on top of ~/.aximix.ini's [axidraw] section",
+)
+@click.option(
+    "--port",
+    "ports",
+    multiple=True,
+    help="AxiDraw port, repeat to share the files between several plotters",
+)
+@click.option(
+    "--hpgl",
+    "hpgl_dir",
+    type=click.Path(file_okay=False, writable=True),
+    help="write HPGL files to this directory instead of plotting",
+)
+@click.option(
+    "--serial",
+    "serial_port",
+    help="send HPGL to a serial plotter on this port instead of plotting",
+)
+@click.option("--rtscts", is_flag=True, help="enable hardware flow control")
+@click.option("--velocity", type=float, help="HPGL pen velocity (VS), in cm/s")
+@click.option("--dry-run", "-n", is_flag=True, help="lay out and estimate only")
+@click.option("--json", "as_json", is_flag=True, help="JSON lines progress output")
+@click.option(
+    "--wait/--no-wait",
+    default=True,
+    show_default=True,
+    help="wait for a key press (e.g. to change paper) between files, with one port",
+)
+def batch(
+    files: Tuple[str, ...],
+    queue: Optional[str],
+    page_format: str,
+    landscape: bool,
+    rotate: bool,
+    center: bool,
+    fit_to_page: bool,
+    margin: str,
+    merge: bool,
+    sort: bool,
+    simplify: bool,
+    layers: Tuple[int, ...],
+    backend: str,
+    realtime_factor: Optional[float],
+    options: Tuple[str, ...],
+    ports: Tuple[str, ...],
+    hpgl_dir: Optional[str],
+    serial_port: Optional[str],
+    rtscts: bool,
+    velocity: Optional[float],
+    dry_run: bool,
+    as_json: bool,
+    wait: bool,
+) -> None:
+    """Lay out and plot SVG files without the Launchpad and terminal UI."""
+    paths = list(files) + (_read_queue(queue) if queue else [])
+    if not paths:
+        raise click.UsageError("no file to plot")
+    if sum((hpgl_dir is not None, serial_port is not None, len(ports) > 1)) > 1:
+        raise click.UsageError("--hpgl, --serial and --port are mutually exclusive")
+    if serial_port is not None:
+        try:
+            from serialwrite.serialwrite import send
+        except ImportError:
+            raise click.UsageError("--serial requires the serialwrite package")
+    if hpgl_dir is not None:
+        os.makedirs(hpgl_dir, exist_ok=True)
+
+    report = _Reporter(as_json)
+    axy_options: Dict[str, Any] = get_axidraw_config()
+    axy_options.update(_parse_option(option) for option in options)
+    settings = MotionSettings.from_options(axy_options)
+    layer_config = get_layer_config()
+
+    axy = None
+    axy_factory = None
+    if not dry_run and hpgl_dir is None and serial_port is None:
+        # keep stdout for JSON lines
+        with contextlib.redirect_stdout(sys.stderr if as_json else sys.stdout):
+            axy_backend = get_backend(backend)
+        if as_json and hasattr(axy_backend, "set_print_callback"):
+            axy_backend.set_print_callback(lambda *a: click.echo(*a, err=True))
+
+        def configure(axy):
+            if hasattr(axy, "realtime_factor"):
+                axy.realtime_factor = realtime_factor
+            for key, value in axy_options.items():
+                axy.set_option(key, value)
+            return axy
+
+        if len(ports) > 1:
+
+            def axy_factory():
+                return configure(axy_backend.Axy())
+
+        else:
+            axy = configure(axy_backend.axy)
+            if ports:
+                axy.set_option("port", ports[0])
+
+    # the first Ctrl-C stops after the current line, with the pen raised
+    stop_requested = False
+
+    def request_stop(signum, frame):
+        nonlocal stop_requested
+        if stop_requested:
+            raise KeyboardInterrupt
+        stop_requested = True
+
+    signal.signal(signal.SIGINT, request_stop)
+
+    pl = PageLayout()
+    pl.page_format = page_format
+    pl.landscape = landscape
+    pl.rotate = rotate
+    pl.center = center
+    pl.fit_to_page = fit_to_page
+    pl.margin = margin
+    pl.merge = merge
+    pl.sort = sort
+    pl.simplify = simplify
+    pl.layer_order = get_layer_order()
+
+    total_estimate = 0.0
+    total_elapsed = 0.0
+
+    def prepare(index: int, path: str) -> Optional[Tuple[Dict[int, Any], float]]:
+        """Lay out a file, returning its paths and estimated plot time."""
+        nonlocal total_estimate
+        start = time.perf_counter()
+        try:
+            pl.set_vector_data(path, read_vector_data(path))
+        except Exception as exc:
+            report("failed", f"{path}: {exc}", file=path, error=str(exc))
+            return None
+        if layers:
+            for layer_id in pl.layer_ids:
+                pl.set_layer_enabled(layer_id, layer_id in layers)
+        plot_paths = pl.get_plot_paths()
+        line_count = sum(len(lines) for lines in plot_paths.values())
+        estimated = 0.0
+        if plot_paths:
+            # with the per-layer settings, like the UI's estimate
+            layer_settings = {
+                step.layer_id: step.motion_settings(axy_options)
+                for step in schedule_layers(plot_paths, axy_options, layer_config)
+            }
+            estimated = (
+                PlotGeometry(plot_paths).estimate(settings, layer_settings).total
+            )
+        total_estimate += estimated
+        report(
+            "prepared",
+            f"[{index + 1}/{len(paths)}] {path}: {line_count} lines, "
+            f"estimated {format_duration(estimated)}",
+            file=path,
+            index=index,
+            count=len(paths),
+            lines=line_count,
+            layers=list(plot_paths),
+            estimate=estimated,
+            prepare_time=time.perf_counter() - start,
+        )
+        return plot_paths, estimated
+
+    async def plot_on_pool() -> None:
+        """Plot the files on all ports, laying out the next ones while plotting."""
+        nonlocal total_elapsed
+        loop = asyncio.get_running_loop()
+        pool = PlotterPool(loop, axy_factory, list(ports))
+        started: Dict[str, float] = {}
+        estimates: Dict[str, float] = {}
+
+        def on_job_started(port: str, job: PlotJob) -> None:
+            started[port] = time.perf_counter()
+            report(
+                "started", f"{job.name}: plotting on {port}", file=job.name, port=port
+            )
+
+        def on_job_finished(port: str, job: PlotJob) -> None:
+            elapsed = time.perf_counter() - started[port]
+            report(
+                "plotted" if job.position >= job.line_count else "interrupted",
+                f"{job.name}: {job.position}/{job.line_count} lines on {port} in "
+                f"{format_duration(elapsed)}",
+                file=job.name,
+                port=port,
+                done=job.position,
+                lines=job.line_count,
+                elapsed=elapsed,
+                estimate=estimates[job.name],
+            )
+
+        def on_job_failed(port: Optional[str], job: PlotJob, exc: Exception) -> None:
+            report(
+                "failed",
+                f"{job.name}: {exc}" + (f" on {port}" if port else ""),
+                file=job.name,
+                port=port,
+                done=job.position,
+                lines=job.line_count,
+                error=str(exc),
+            )
+
+        def on_progress(port: str, done: int, total: int) -> None:
+            job = pool.workers[port].job
+            name = job.name if job is not None else None
+            report("progress", file=name, port=port, done=done, total=total)
+
+        pool.on_job_started.connect(on_job_started)
+        pool.on_job_finished.connect(on_job_finished)
+        pool.on_job_failed.connect(on_job_failed)
+        if as_json:
+            pool.on_progress.connect(on_progress)
+
+        async def watch_stop():
+            while not stop_requested:
+                await asyncio.sleep(0.1)
+            pool.cancel_all()
+
+        watcher = asyncio.ensure_future(watch_stop())
+        start = time.perf_counter()
+        try:
+            for index, path in enumerate(paths):
+                if stop_requested:
+                    break
+                prepared = await loop.run_in_executor(None, prepare, index, path)
+                if prepared is not None and prepared[0]:
+                    estimates[path] = prepared[1]
+                    pool.submit(PlotJob(path, prepared[0]))
+            while not pool.idle:
+                await asyncio.sleep(0.1)
+        finally:
+            watcher.cancel()
+            for worker in pool.workers.values():
+                worker.run(worker.axy.disconnect)
+            await loop.run_in_executor(None, pool.close)
+        total_elapsed = time.perf_counter() - start
+
+    try:
+        if axy_factory is not None:
+            asyncio.run(plot_on_pool())
+        else:
+            for index, path in enumerate(paths):
+                if stop_requested:
+                    break
+
+                prepared = prepare(index, path)
+                if dry_run or not prepared or not prepared[0]:
+                    continue
+                plot_paths, estimated = prepared
+                line_count = sum(len(lines) for lines in plot_paths.values())
+
+                if hpgl_dir is not None:
+                    output = os.path.join(
+                        hpgl_dir, os.path.splitext(os.path.basename(path))[0] + ".hpgl"
+                    )
+                    with open(output, "w") as fp:
+                        fp.writelines(pl.iter_hpgl(velocity=velocity))
+                    report("exported", f"{path}: {output}", file=path, output=output)
+                    continue
+
+                if wait and index > 0:
+                    click.pause("Press any key to plot the next file...", err=True)
+
+                if serial_port is not None:
+                    interrupted = False
+
+                    def hpgl_chunks():
+                        # chunks hold whole commands: stop between them, pen raised
+                        nonlocal interrupted
+                        for chunk in pl.iter_hpgl(velocity=velocity):
+                            if stop_requested:
+                                interrupted = True
+                                yield b"PU;SP0;\n"
+                                return
+                            yield chunk.encode("ascii")
+
+                    start = time.perf_counter()
+                    send(hpgl_chunks(), serial_port, rtscts=rtscts)
+                    elapsed = time.perf_counter() - start
+                    total_elapsed += elapsed
+                    report(
+                        "interrupted" if interrupted else "sent",
+                        f"{path}: {'interrupted sending' if interrupted else 'sent'} to "
+                        f"{serial_port} in {format_duration(elapsed)}",
+                        file=path,
+                        lines=line_count,
+                        elapsed=elapsed,
+                    )
+                    continue
+
+                def on_progress(done: int, total: int) -> None:
+                    report("progress", file=path, done=done, total=total)
+
+                start = time.perf_counter()
+                done = axy.plot_paths(
+                    plot_paths,
+                    on_progress=on_progress if as_json else None,
+                    should_stop=lambda: stop_requested,
+                )
+                elapsed = time.perf_counter() - start
+                total_elapsed += elapsed
+                report(
+                    "plotted" if done >= line_count else "interrupted",
+                    f"{path}: {done}/{line_count} lines in {format_duration(elapsed)}",
+                    file=path,
+                    done=done,
+                    lines=line_count,
+                    elapsed=elapsed,
+                    estimate=estimated,
+                )
+
+        if axy is not None:
+            axy.disconnect()
+    finally:
+        pl.close()
+
+    report(
+        "finished",
+        f"total: estimated {format_duration(total_estimate)}"
+        + (
+            ""
+            if dry_run or hpgl_dir
+            else f", plotted in {format_duration(total_elapsed)}"
+        ),
+        estimate=total_estimate,
+        elapsed=total_elapsed,
+        interrupted=stop_requested,
+    )
+    if stop_requested:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    batch()
@@ -0,0 +1,153 @@
+"""Launchpad input latency benchmark, run on a virtual device.
+
+Measures, for typical interactions, the delay between a key press and the resulting LED
+update reaching the device, as well as the MIDI traffic per interaction::
+
+    python -m aximix.benchmark --count 200
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Callable, List, Optional
+
+from .color_defs import GREEN, PURPLE, RED
+from .launchpad import Checkbox, Fader, Launchpad, Scene
+from .midi_output import DEFAULT_BYTE_RATE, DEFAULT_MESSAGE_RATE
+from .virtual_launchpad import VirtualLaunchpad
+
+FADER_PLUS_KEY = 38
+FADER_MINUS_KEY = 31
+FADER_KEYS = [32, 33, 34, 35, 36, 37]
+CHECKBOX_KEY = 21
+SCENE_KEY = 95
+SETTLE_TIME = 0.05  # seconds, to let the output queue drain between scenarios
+QUIET_TIME = 0.01  # seconds
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def _measure(
+    name: str,
+    device: VirtualLaunchpad,
+    count: int,
+    interact: Callable[[int], Optional[int]],
+) -> None:
+    """Run ``interact`` ``count`` times, waiting for the LED update of the returned key
+    (any key if None) after each call."""
+    await asyncio.sleep(SETTLE_TIME)
+    device.reset_counters()
+
+    latencies = []
+    for i in range(count):
+        start = time.perf_counter()
+        key = interact(i)
+        received = await asyncio.wait_for(device.wait_for_update(key), 1)
+        latencies.append(received - start)
+
+    await asyncio.sleep(SETTLE_TIME)
+    _report(name, device, count, latencies)
+
+
+async def _measure_burst(
+    name: str, device: VirtualLaunchpad, lp: Launchpad, count: int
+) -> None:
+    """Inject presses as fast as possible, then wait until the output is drained. The
+    reported latency is the time until the last LED update."""
+    await asyncio.sleep(SETTLE_TIME)
+    device.reset_counters()
+
+    start = time.perf_counter()
+    for i in range(count):
+        device.press(FADER_KEYS[i % len(FADER_KEYS)])
+        if i % 10 == 9:
+            await asyncio.sleep(0)
+    # done once the output is drained and quiet
+    while True:
+        await asyncio.sleep(0.001)
+        last = device.messages[-1][0] if device.messages else start
+        if lp.output.depth == 0 and time.perf_counter() - last > QUIET_TIME:
+            break
+    total = last - start
+
+    await asyncio.sleep(SETTLE_TIME)
+    _report(name, device, count, [total])
+
+
+def _report(
+    name: str, device: VirtualLaunchpad, count: int, latencies: List[float]
+) -> None:
+    print(
+        f"{name:<16}{count:>8}"
+        f"{1000 * statistics.mean(latencies):>12.2f}"
+        f"{1000 * _percentile(latencies, 0.95):>12.2f}"
+        f"{device.message_count / count:>12.2f}"
+        f"{device.byte_count / count:>12.1f}"
+    )
+
+
+async def run_benchmark(count: int, message_rate: float, byte_rate: float) -> None:
+    device = VirtualLaunchpad()
+    lp = Launchpad(
+        asyncio.get_running_loop(),
+        message_rate=message_rate,
+        byte_rate=byte_rate,
+        backend=device,
+    )
+
+    Fader(lp, FADER_PLUS_KEY, FADER_MINUS_KEY, FADER_KEYS)
+    Checkbox(lp, CHECKBOX_KEY, GREEN, RED)
+
+    # a second scene sharing part of the main scene's colors
+    scene = Scene(lp)
+    for key in FADER_KEYS:
+        scene.set_key_color(key, PURPLE)
+    scene.on_key_press(SCENE_KEY).connect(lambda key: lp.pop_scene())
+    lp.on_key_press(SCENE_KEY).connect(lambda key: lp.push_scene(scene))
+    lp.set_key_color(SCENE_KEY, PURPLE)
+    scene.set_key_color(SCENE_KEY, RED)
+
+    def fader_step(i: int) -> Optional[int]:
+        device.press(FADER_PLUS_KEY if (i // 20) % 2 == 0 else FADER_MINUS_KEY)
+        return None
+
+    def fader_jump(i: int) -> Optional[int]:
+        device.press(FADER_KEYS[i % len(FADER_KEYS)])
+        return None
+
+    def checkbox(i: int) -> Optional[int]:
+        device.press(CHECKBOX_KEY)
+        return CHECKBOX_KEY
+
+    def scene_switch(i: int) -> Optional[int]:
+        device.press(SCENE_KEY)
+        return SCENE_KEY
+
+    print(
+        f"{'scenario':<16}{'count':>8}{'mean (ms)':>12}{'p95 (ms)':>12}"
+        f"{'msg/press':>12}{'bytes/press':>12}"
+    )
+    await _measure("fader step", device, count, fader_step)
+    await _measure("fader jump", device, count, fader_jump)
+    await _measure("checkbox", device, count, checkbox)
+    await _measure("scene switch", device, count, scene_switch)
+    await _measure_burst("fader burst", device, lp, count)
+    print(f"output queue: {lp.output.metrics}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m aximix.benchmark")
+    parser.add_argument("--count", "-n", type=int, default=100)
+    parser.add_argument("--message-rate", type=float, default=DEFAULT_MESSAGE_RATE)
+    parser.add_argument("--byte-rate", type=float, default=DEFAULT_BYTE_RATE)
+    args = parser.parse_args()
+
+    asyncio.run(run_benchmark(args.count, args.message_rate, args.byte_rate))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+from typing import Dict, Optional, Tuple
+
+from watchgod import Change
+
+from .signal import Signal
+
+COALESCE_DELAY = 0.1  # seconds
+POLL_INTERVAL = 1.0  # seconds, when inotify isn't available
+
+# from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct("iIII")
+_WATCH_MASK = (
+    IN_MODIFY
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+)
+
+
+def _event_change(mask: int) -> Optional[Change]:
+    if mask & (IN_CREATE | IN_MOVED_TO):
+        return Change.added
+    if mask & (IN_DELETE | IN_MOVED_FROM):
+        return Change.deleted
+    if mask & (IN_MODIFY | IN_CLOSE_WRITE):
+        return Change.modified
+    return None
+
+
+def _merge(previous: Optional[Change], change: Change) -> Optional[Change]:
+    """Combine two consecutive changes of the same path (None: no net change)."""
+    if previous is None:
+        return change
+    if previous == Change.added:
+        return None if change == Change.deleted else Change.added
+    if previous == Change.deleted and change == Change.added:
+        return Change.modified
+    return change
+
+
+class _Inotify:
+    def __init__(self, directory: str):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+
+    def read_events(self):
+        """Yield ``(mask, name)`` for all available events."""
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                yield mask, os.fsdecode(name)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class DirWatcher:
+    """Watch a directory (not recursively) and fan out changes to subscribers.
+
+    Uses inotify where available, with no work at all while idle, and falls back to
+    polling the directory otherwise. Changes are coalesced over a short delay and
+    emitted by :attr:`on_changes` as a set of ``(Change, path)``, like watchgod's.
+
+    A snapshot of the directory is kept up to date with the emitted changes, so that
+    if inotify events are lost (queue overflow), the directory is rescanned and the
+    differences emitted as when polling.
+    """
+
+    def __init__(
+        self,
+        loop,
+        directory: str,
+        coalesce_delay: float = COALESCE_DELAY,
+        poll_interval: float = POLL_INTERVAL,
+    ):
+        self.on_changes = Signal()  # set of (Change, path)
+
+        self._loop = loop
+        self._dir = directory
+        self._coalesce_delay = coalesce_delay
+        self._poll_interval = poll_interval
+        self._pending: Dict[str, Optional[Change]] = {}
+        self._flush_handle: Optional[asyncio.Handle] = None
+        self._inotify: Optional[_Inotify] = None
+        self._poll_task: Optional[asyncio.Task] = None
+        self._last_snapshot: Dict[str, Tuple[float, int]] = {}
+
+        try:
+            self._inotify = _Inotify(directory)
+        except (OSError, AttributeError) as exc:
+            logging.info(f"inotify unavailable ({exc}), polling {directory}")
+            self._start_polling()
+        else:
+            self._last_snapshot = self._snapshot()
+            loop.add_reader(self._inotify.fd, self._read_inotify)
+
+    @property
+    def polling(self) -> bool:
+        return self._poll_task is not None
+
+    def close(self) -> None:
+        if self._inotify is not None:
+            self._loop.remove_reader(self._inotify.fd)
+            self._inotify.close()
+            self._inotify = None
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            self._poll_task = None
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+
+    def _add(self, change: Change, path: str) -> None:
+        merged = _merge(self._pending.get(path), change)
+        if path in self._pending and merged is None:
+            del self._pending[path]
+        else:
+            self._pending[path] = merged
+        if self._flush_handle is None:
+            self._flush_handle = self._loop.call_later(
+                self._coalesce_delay, self._flush
+            )
+
+    def _flush(self) -> None:
+        self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        changes = {(change, path) for path, change in pending.items() if change}
+        if self._inotify is not None:
+            for change, path in changes:
+                self._update_snapshot(path)
+        if changes:
+            self.on_changes(changes)
+
+    def _read_inotify(self) -> None:
+        for mask, name in self._inotify.read_events():
+            if mask & IN_Q_OVERFLOW:
+                logging.warning(f"inotify queue overflow on {self._dir}, rescanning")
+                self._rescan()
+            elif mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                # the directory itself is gone, poll until it comes back
+                self._loop.remove_reader(self._inotify.fd)
+                self._inotify.close()
+                self._inotify = None
+                self._start_polling()
+                return
+            else:
+                change = _event_change(mask)
+                if change is not None and name:
+                    self._add(change, os.path.join(self._dir, name))
+
+    def _snapshot(self) -> Dict[str, Tuple[float, int]]:
+        snapshot = {}
+        try:
+            with os.scandir(self._dir) as it:
+                for entry in it:
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    snapshot[entry.path] = (stat.st_mtime, stat.st_size)
+        except OSError:
+            pass
+        return snapshot
+
+    def _update_snapshot(self, path: str) -> None:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._last_snapshot.pop(path, None)
+        else:
+            self._last_snapshot[path] = (stat.st_mtime, stat.st_size)
+
+    def _rescan(self) -> None:
+        """Add the changes since the last snapshot and take a new one."""
+        snapshot = self._snapshot()
+        for path, state in snapshot.items():
+            old_state = self._last_snapshot.get(path)
+            if old_state is None:
+                self._add(Change.added, path)
+            elif old_state != state:
+                self._add(Change.modified, path)
+        for path in self._last_snapshot.keys() - snapshot.keys():
+            self._add(Change.deleted, path)
+        self._last_snapshot = snapshot
+
+    def _start_polling(self) -> None:
+        self._poll_task = self._loop.create_task(self._poll())
+
+    async def _poll(self) -> None:
+        self._last_snapshot = self._snapshot()
+        while True:
+            await asyncio.sleep(self._poll_interval)
+            self._rescan()
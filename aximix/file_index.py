@@ -0,0 +1,287 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import attr
+
+from axy.kinematics import MotionSettings, PlotGeometry
+
+from .loader import lower_thread_priority
+from .pagelayout import read_vector_data
+from .signal import Signal
+
+INDEX_PATH = os.path.expanduser("~/.aximix_index.json")
+INDEX_VERSION = 1
+METADATA_WORKERS = 2
+SAVE_DELAY = 5.0  # seconds, metadata updates are saved in batches
+
+
+@attr.s(auto_attribs=True)
+class FileEntry:
+    path: str
+    mtime: float
+    size: int
+    layer_count: Optional[int] = None
+    bounds: Optional[Tuple[float, float, float, float]] = None  # CSS pixels
+    estimated_time: Optional[float] = None  # seconds, unscaled and with default speeds
+
+    @property
+    def has_metadata(self) -> bool:
+        return self.layer_count is not None
+
+
+def extract_metadata(path: str) -> Dict[str, Any]:
+    """Parse a file and compute its metadata. Runs in a worker process."""
+    vd = read_vector_data(path)
+    bounds = vd.bounds()
+    geometry = PlotGeometry(
+        {layer_id: list(vd.layers[layer_id]) for layer_id in sorted(vd.layers)}
+    )
+    return {
+        "layer_count": len(vd.layers),
+        "bounds": None if bounds is None else [float(b) for b in bounds],
+        "estimated_time": geometry.estimate(MotionSettings()).total,
+    }
+
+
+def scan_directory(directory: str) -> Optional[Dict[str, os.stat_result]]:
+    """Stat the SVG files of a directory. Returns None if it can't be read. Runs in an
+    executor, as this may be slow on large or network directories."""
+    stats = {}
+    try:
+        with os.scandir(directory) as it:
+            for dir_entry in it:
+                if not dir_entry.name.lower().endswith(".svg"):
+                    continue
+                try:
+                    if not dir_entry.is_file():
+                        continue
+                    stats[dir_entry.path] = dir_entry.stat()
+                except OSError:
+                    continue
+    except OSError as exc:
+        logging.warning(f"could not scan {directory}: {exc}")
+        return None
+    return stats
+
+
+class FileIndex:
+    """Index of the SVG files of a directory, newest first.
+
+    The index is persisted, along with per-file metadata (layer count, bounds and
+    estimated plot time) which is extracted in the background and kept as long as the
+    file's mtime and size are unchanged. Until the directory is scanned, the persisted
+    entries are listed.
+    """
+
+    def __init__(self, directory: str, index_path: str = INDEX_PATH):
+        self.on_metadata = Signal()  # path, emitted when a file's metadata is ready
+        self.on_scanned = Signal()  # emitted when the directory scan is applied
+
+        self._dir = directory
+        self._index_path = index_path
+        self._entries: Dict[str, FileEntry] = self._load()
+        self._sorted: Optional[List[FileEntry]] = None
+        self._scanning = False
+        self._touched: set = set()  # paths updated or removed while scanning
+        self._priority: List[str] = []
+        self._in_progress: set = set()
+        self._failed: set = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._executor: Optional[Executor] = None
+        self._save_handle: Optional[asyncio.Handle] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def entries(self) -> List[FileEntry]:
+        if self._sorted is None:
+            self._sorted = sorted(
+                self._entries.values(), key=lambda e: e.mtime, reverse=True
+            )
+        return self._sorted
+
+    @property
+    def paths(self) -> List[str]:
+        return [entry.path for entry in self.entries]
+
+    def get(self, path: str) -> Optional[FileEntry]:
+        return self._entries.get(path)
+
+    async def scan(self) -> None:
+        """Rebuild the index from the directory content, reusing the metadata of
+        unchanged files. Updates received while scanning take precedence."""
+        self._scanning = True
+        try:
+            stats = await asyncio.get_running_loop().run_in_executor(
+                None, scan_directory, self._dir
+            )
+        finally:
+            self._scanning = False
+        touched, self._touched = self._touched, set()
+        if stats is None:
+            return
+
+        entries = {
+            path: self._make_entry(path, stat, self._entries.get(path))
+            for path, stat in stats.items()
+            if path not in touched
+        }
+        for path in touched:
+            if path in self._entries:
+                entries[path] = self._entries[path]
+        self._entries = entries
+        self._sorted = None
+        self._wake()
+        self.on_scanned()
+
+    def update(self, path: str) -> None:
+        """Add or refresh a file, e.g. after a watch event."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.remove(path)
+            return
+        self._entries[path] = self._make_entry(path, stat, self._entries.get(path))
+        self._failed.discard(path)
+        self._sorted = None
+        if self._scanning:
+            self._touched.add(path)
+        self._wake()
+
+    def remove(self, path: str) -> None:
+        if self._scanning:
+            self._touched.add(path)
+        if self._entries.pop(path, None) is not None:
+            self._sorted = None
+
+    def prioritize(self, paths: Iterable[str]) -> None:
+        """Extract the metadata of ``paths`` (e.g. the visible files) first."""
+        self._priority = list(paths)
+        self._wake()
+
+    def start(self, loop, max_workers: int = METADATA_WORKERS) -> None:
+        """Scan the directory and start extracting missing metadata in a low priority
+        process pool."""
+        loop.create_task(self.scan())
+        self._wakeup = asyncio.Event()
+        self._executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=lower_thread_priority,
+        )
+        for _ in range(max_workers):
+            loop.create_task(self._metadata_worker(loop))
+
+    def close(self) -> None:
+        self.save()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def save(self) -> None:
+        self._save_handle = None
+        data = {
+            "version": INDEX_VERSION,
+            "directory": os.path.abspath(self._dir),
+            "files": [attr.asdict(entry) for entry in self._entries.values()],
+        }
+        tmp_path = self._index_path + ".tmp"
+        try:
+            with open(tmp_path, "w") as fp:
+                json.dump(data, fp)
+            os.replace(tmp_path, self._index_path)
+        except OSError as exc:
+            logging.warning(f"could not save file index: {exc}")
+
+    @staticmethod
+    def _make_entry(path: str, stat, cached: Optional[FileEntry]) -> FileEntry:
+        if (
+            cached is not None
+            and cached.mtime == stat.st_mtime
+            and cached.size == stat.st_size
+        ):
+            return cached
+        return FileEntry(path, stat.st_mtime, stat.st_size)
+
+    def _load(self) -> Dict[str, FileEntry]:
+        try:
+            with open(self._index_path) as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != INDEX_VERSION or data.get(
+            "directory"
+        ) != os.path.abspath(self._dir):
+            return {}
+
+        entries = {}
+        for item in data.get("files", []):
+            try:
+                entry = FileEntry(**item)
+            except TypeError:
+                continue
+            if entry.bounds is not None:
+                entry.bounds = tuple(entry.bounds)
+            entries[entry.path] = entry
+        return entries
+
+    def _wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _next_pending(self) -> Optional[FileEntry]:
+        def pending(entry: Optional[FileEntry]) -> bool:
+            return (
+                entry is not None
+                and not entry.has_metadata
+                and entry.path not in self._in_progress
+                and entry.path not in self._failed
+            )
+
+        for path in self._priority:
+            entry = self._entries.get(path)
+            if pending(entry):
+                return entry
+        for entry in self.entries:
+            if pending(entry):
+                return entry
+        return None
+
+    def _schedule_save(self, loop) -> None:
+        if self._save_handle is None:
+            self._save_handle = loop.call_later(SAVE_DELAY, self.save)
+
+    async def _metadata_worker(self, loop) -> None:
+        while True:
+            entry = self._next_pending()
+            if entry is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            self._in_progress.add(entry.path)
+            try:
+                metadata = await loop.run_in_executor(
+                    self._executor, extract_metadata, entry.path
+                )
+            except Exception as exc:
+                logging.info(f"could not extract metadata of {entry.path}: {exc}")
+                self._failed.add(entry.path)
+                continue
+            finally:
+                self._in_progress.discard(entry.path)
+
+            # the file may have changed or been removed in the meantime
+            if self._entries.get(entry.path) is not entry:
+                continue
+            entry.layer_count = metadata["layer_count"]
+            if metadata["bounds"] is not None:
+                entry.bounds = tuple(metadata["bounds"])
+            entry.estimated_time = metadata["estimated_time"]
+            self._schedule_save(loop)
+            self.on_metadata(entry.path)
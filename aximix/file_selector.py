@@ -1,13 +1,16 @@
 import asyncio
 import math
 import os
-from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 
 import urwid
-from watchgod import Change, awatch
+from watchgod import Change
+
+from axy.kinematics import format_duration
 
 from .color_defs import RED
+from .dir_watch import DirWatcher
+from .file_index import FileIndex
 from .launchpad import Launchpad, Scene
 from .signal import Signal
 
@@ -19,6 +22,10 @@ FILE_SELECTOR_PALETTE = [
 ]
 
 
+DEBOUNCE = 0.3  # seconds without changes before updating the list
+MAX_DEBOUNCE = 2.0  # seconds, upper bound on the update delay during bursts
+
+
 def _make_square(a):
     return [a, a + 1, a - 10, a - 9]
 
@@ -43,109 +50,186 @@ class FileSelector:
         (3, 3): ("file0", _make_square(27), 45),
     }
 
-    def __init__(self, loop, launchpad: Launchpad, svg_dir: str):
+    PREV_PAGE_KEY = 93
+    NEXT_PAGE_KEY = 94
+
+    def __init__(
+        self,
+        loop,
+        launchpad: Launchpad,
+        svg_dir: str,
+        watcher: Optional[DirWatcher] = None,
+    ):
         self.on_accept = Signal()
+        self.on_files_changed = Signal()  # list of added/modified paths, newest first
 
         self._loop = loop
         self._lp = launchpad
         self._dir = svg_dir
         self._scene = Scene(launchpad)
         self._old_widget: Optional[urwid.Widget] = None
-        self._file_list: List[str] = []
-
+        self._columns = 4
+        self._rows = 4
+        self._page = 0
+        self._pending_changes: Dict[str, bool] = {}  # path -> deleted
+        self._flush_handle: Optional[asyncio.Handle] = None
+        self._flush_deadline: Optional[float] = None
+
+        # one fixed text widget per slot, only changed slots are updated
+        self._slots: List[Tuple[Optional[str], str]] = [(None, "")] * self.page_size
+        self._texts = [urwid.Text("", wrap="ellipsis") for _ in range(self.page_size)]
+        self._attr_maps = [urwid.AttrMap(txt, None) for txt in self._texts]
+        contents = []
+        for row in range(self._rows):
+            if row > 0:
+                contents.append((urwid.Text(""), ("weight", 1)))
+            row_widgets = self._attr_maps[
+                row * self._columns : (row + 1) * self._columns
+            ]
+            contents.append((urwid.Columns(row_widgets, dividechars=2), ("weight", 1)))
         self._pile_of_cols = urwid.Pile([])
+        self._pile_of_cols.contents = contents
+        self._title = "Choose a file..."
+        self._line_box = urwid.LineBox(self._pile_of_cols, self._title)
         self._overlay_widget = urwid.Overlay(
-            urwid.Filler(urwid.LineBox(self._pile_of_cols, "Choose a file...")),
+            urwid.Filler(self._line_box),
             self._loop.widget,
             align="center",
             width=("relative", 80),
             valign="middle",
-            height=9,
+            height=13,
         )
-        self._columns = 4
-        self._rows = 4
 
-        # setup file list
-        for path in sorted(
-            Path(self._dir).iterdir(), key=os.path.getmtime, reverse=True
-        ):
-            if path.is_file() and path.name.lower().endswith(".svg"):
-                self._file_list.append(str(path))
+        # setup file list, metadata is extracted in the background
+        self._index = FileIndex(svg_dir)
+        self._index.on_metadata.connect(self._metadata_ready)
+        self._index.on_scanned.connect(self._update_path_list)
+        self._index.start(asyncio.get_event_loop())
         self._update_path_list()
-        asyncio.get_event_loop().create_task(self._process_dir_change(self._dir))
+        if watcher is None:
+            watcher = DirWatcher(asyncio.get_event_loop(), svg_dir)
+        watcher.on_changes.connect(self._dir_changed)
 
         # setup scene
         self._scene.set_key_color(19, RED)
         self._scene.on_key_press(19).connect(lambda key: self.hide())
+        self._scene.on_key_press(self.PREV_PAGE_KEY).connect(
+            lambda key: self.set_page(self._page - 1)
+        )
+        self._scene.on_key_press(self.NEXT_PAGE_KEY).connect(
+            lambda key: self.set_page(self._page + 1)
+        )
 
-    async def _process_dir_change(self, dirpath: str):
-        async for changes in awatch(dirpath):
-            for change, path in changes:
-                if not path.lower().endswith(".svg"):
-                    continue
-
-                if change == Change.added:
-                    self._file_list.insert(0, path)
-                elif change == Change.modified:
-                    try:
-                        idx = self._file_list.index(path)
-                    except ValueError:
-                        self._file_list.insert(0, path)
-                    else:
-                        self._file_list.insert(0, self._file_list.pop(idx))
-                elif change == Change.deleted:
-                    try:
-                        self._file_list.remove(path)
-                    except ValueError:
-                        pass
-            self._update_path_list()
+    @property
+    def page_size(self) -> int:
+        return self._columns * self._rows
 
-    def _update_path_list(self):
-        cnt = len(self._file_list)
-        row_cnt = min(math.ceil(cnt / self._columns), 4)
+    @property
+    def page_count(self) -> int:
+        return max(1, math.ceil(len(self._index) / self.page_size))
 
-        contents = []
-        for row in range(row_cnt):
-            files = self._file_list[(row * self._columns) : ((row + 1) * self._columns)]
-            column_widgets = [
-                urwid.AttrMap(
-                    urwid.Text(f.lstrip(self._dir), wrap="ellipsis"),
-                    self.LAYOUT_DEF[(row, col)][0],
-                )
-                for col, f in enumerate(files)
-            ]
-            # pad columns to the total count
-            column_widgets += [urwid.Text("")] * (self._columns - len(column_widgets))
+    @property
+    def index(self) -> FileIndex:
+        return self._index
+
+    def set_page(self, page: int) -> None:
+        page = min(max(page, 0), self.page_count - 1)
+        if page != self._page:
+            self._page = page
+            self._update_path_list()
 
-            def make_callback(f):
-                return lambda k: self.accept(f)
+    def _dir_changed(self, changes: Set[Tuple[Change, str]]) -> None:
+        for change, path in changes:
+            if path.lower().endswith(".svg"):
+                self._pending_changes[path] = change == Change.deleted
+        if self._pending_changes:
+            self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        """Debounce bursts of changes (e.g. a generator saving files in a row), while
+        making sure they are shown within MAX_DEBOUNCE."""
+        loop = asyncio.get_event_loop()
+        now = loop.time()
+        if self._flush_deadline is None:
+            self._flush_deadline = now + MAX_DEBOUNCE
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        self._flush_handle = loop.call_at(
+            min(now + DEBOUNCE, self._flush_deadline), self._flush_changes
+        )
 
-            # setup key colors
-            for col, f in enumerate(files):
-                color = self.LAYOUT_DEF[(row, col)][2]
-                for key in self.LAYOUT_DEF[(row, col)][1]:
-                    self._scene.set_key_color(key, color)
-                    self._scene.on_key_press(key).connect(make_callback(f))
-            for col in range(len(files), self._columns):
-                for key in self.LAYOUT_DEF[(row, col)][1]:
-                    self._scene.set_key_color(key, 0)
+    def _flush_changes(self) -> None:
+        self._flush_handle = None
+        self._flush_deadline = None
+        changes, self._pending_changes = self._pending_changes, {}
+
+        changed_paths = []
+        for path, deleted in changes.items():
+            if deleted:
+                self._index.remove(path)
+            else:
+                self._index.update(path)
+                if self._index.get(path) is not None:
+                    changed_paths.append(path)
+        self._update_path_list()
+        if changed_paths:
+            changed_paths.sort(key=lambda p: self._index.get(p).mtime, reverse=True)
+            self.on_files_changed(changed_paths)
+
+    def _metadata_ready(self, path: str) -> None:
+        if path in self._visible_files():
+            self._update_path_list()
 
-            contents.append(
-                (
-                    urwid.Columns(column_widgets, dividechars=2),
-                    ("weight", 1),
-                )
+    def _visible_files(self) -> List[str]:
+        start = self._page * self.page_size
+        return self._index.paths[start : start + self.page_size]
+
+    def _file_label(self, path: str) -> str:
+        label = os.path.basename(path)
+        entry = self._index.get(path)
+        if entry is not None and entry.has_metadata:
+            duration = (
+                format_duration(entry.estimated_time)
+                if entry.estimated_time is not None
+                else "?"
             )
+            label += f"\n{entry.layer_count}L, ~{duration}"
+        else:
+            label += "\n..."
+        return label
 
-            if row < (row_cnt - 1):
-                contents.append((urwid.Text(""), ("weight", 1)))
-        self._pile_of_cols.contents = contents
+    def _update_path_list(self):
+        self._page = min(self._page, self.page_count - 1)
+        visible = self._visible_files()
+        self._index.prioritize(visible)
+        title = f"Choose a file... (page {self._page + 1}/{self.page_count})"
+        if title != self._title:
+            self._title = title
+            self._line_box.set_title(title)
+        self._scene.set_key_color(self.PREV_PAGE_KEY, 45 if self._page > 0 else 0)
+        self._scene.set_key_color(
+            self.NEXT_PAGE_KEY, 45 if self._page < self.page_count - 1 else 0
+        )
 
-        # clear unused row's of LED
-        for row in range(row_cnt, self._rows):
-            for col in range(self._columns):
-                for key in self.LAYOUT_DEF[(row, col)][1]:
+        for i, (old_path, old_label) in enumerate(self._slots):
+            path = visible[i] if i < len(visible) else None
+            label = self._file_label(path) if path is not None else ""
+            if path == old_path and label == old_label:
+                continue
+
+            self._slots[i] = (path, label)
+            attr_name, keys, color = self.LAYOUT_DEF[divmod(i, self._columns)]
+            self._texts[i].set_text(label)
+            self._attr_maps[i].set_attr_map({None: attr_name if path else None})
+            if path == old_path:
+                continue
+            for key in keys:
+                if path is None:
                     self._scene.set_key_color(key, 0)
+                    self._scene.unbind_key(key)
+                else:
+                    self._scene.set_key_color(key, color)
+                    self._scene.bind_key(key, lambda k, path=path: self.accept(path))
 
     def show(self):
         self._lp.push_scene(self._scene)
@@ -0,0 +1,88 @@
+"""HPGL output for serial pen plotters (see ``serialwrite``)."""
+
+from typing import Iterable, Iterator, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+PLU_PER_INCH = 1016  # plotter units, 0.025mm
+PX_PER_INCH = 96.0
+CHUNK_LINES = 1000  # lines formatted at once
+
+
+def quantize_lines(
+    lines: List[np.ndarray], page_height: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Convert lines (complex arrays in CSS pixels, y down) to plotter units, with the
+    origin at the bottom left of the page and y up.
+
+    Returns the (n, 2) integer coordinates of all points and the number of points of
+    each line. Points which round to the same coordinates as the previous one are
+    dropped, and single points are doubled so that they are plotted as a dot.
+    """
+    lines = [line for line in lines if len(line) > 0]
+    if not lines:
+        return np.empty((0, 2), dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    sizes = np.array([len(line) for line in lines])
+    points = np.concatenate(lines)
+    scale = PLU_PER_INCH / PX_PER_INCH
+    coords = np.empty((len(points), 2), dtype=np.int64)
+    coords[:, 0] = np.rint(points.real * scale)
+    coords[:, 1] = np.rint((page_height - points.imag) * scale)
+
+    starts = np.cumsum(sizes) - sizes
+    keep = np.ones(len(coords), dtype=bool)
+    keep[1:] = np.any(coords[1:] != coords[:-1], axis=1)
+    keep[starts] = True
+    line_index = np.repeat(np.arange(len(sizes)), sizes)[keep]
+    coords = coords[keep]
+    sizes = np.bincount(line_index, minlength=len(sizes))
+
+    single = sizes == 1
+    if np.any(single):
+        coords = np.repeat(coords, np.where(single, 2, 1)[line_index], axis=0)
+        sizes[single] = 2
+    return coords, sizes
+
+
+def format_lines(lines: List[np.ndarray], page_height: float) -> str:
+    """HPGL commands plotting ``lines``, one ``PU x,y;PD x,y,...;`` per line."""
+    coords, sizes = quantize_lines(lines, page_height)
+    if len(coords) == 0:
+        return ""
+
+    # each point is written as <prefix><x>,<y><separator>
+    ends = np.cumsum(sizes)
+    starts = ends - sizes
+    prefixes = np.full(len(coords), "", dtype="<U2")
+    prefixes[starts] = "PU"
+    separators = np.full(len(coords), ",", dtype="<U3")
+    separators[starts] = ";PD"
+    separators[ends - 1] = ";\n"
+    commas = np.full(len(coords), ",")
+    x, y = coords[:, 0].astype(str), coords[:, 1].astype(str)
+    tokens = np.stack([prefixes, x, commas, y, separators], axis=1)
+    return "".join(tokens.ravel().tolist())
+
+
+def iter_hpgl(
+    layers: Mapping[int, Iterable[np.ndarray]],
+    page_height: float,
+    pens: Optional[Mapping[int, int]] = None,
+    velocity: Optional[float] = None,
+) -> Iterator[str]:
+    """Generate the HPGL program for ``layers``, in chunks of at most
+    :data:`CHUNK_LINES` lines, so that the output is never materialised at once. Each
+    layer is plotted with pen ``pens[layer_id]`` (by default, the layer id)."""
+    yield "IN;DF;" + (f"VS{velocity:g};" if velocity else "") + "\n"
+    for layer_id, lines in layers.items():
+        yield f"SP{(pens or {}).get(layer_id, layer_id)};\n"
+        batch = []
+        for line in lines:
+            batch.append(line)
+            if len(batch) == CHUNK_LINES:
+                yield format_lines(batch, page_height)
+                batch = []
+        if batch:
+            yield format_lines(batch, page_height)
+    yield "PU;SP0;\n"
@@ -0,0 +1,252 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import attr
+import numpy as np
+
+JOURNAL_PATH = os.path.expanduser("~/.aximix_journal.jsonl")
+PROGRESS_INTERVAL = 5.0  # seconds, progress is journaled at most this often
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@attr.s(auto_attribs=True)
+class JournalEntry:
+    """State of a journaled plot, as far as it made it to the disk."""
+
+    file: str
+    file_hash: str
+    layout: Dict[str, Any]
+    layers: List[Tuple[int, int]]  # (layer id, line count), in plotting order
+    position: int = 0  # lines plotted
+    resume_svg: Optional[str] = None  # pyaxidraw's resume data, for SVG plots
+
+    @property
+    def line_count(self) -> int:
+        return sum(count for _, count in self.layers)
+
+    @property
+    def completed(self) -> bool:
+        return self.position >= self.line_count and self.resume_svg is None
+
+    @property
+    def layers_done(self) -> List[int]:
+        done = []
+        end = 0
+        for layer_id, count in self.layers:
+            end += count
+            if end > self.position:
+                break
+            done.append(layer_id)
+        return done
+
+    @property
+    def current_layer(self) -> Optional[int]:
+        end = 0
+        for layer_id, count in self.layers:
+            end += count
+            if end > self.position:
+                return layer_id
+        return None
+
+    def describe(self) -> str:
+        layer = self.current_layer
+        return (
+            f"{os.path.basename(self.file)}, {self.position}/{self.line_count} lines"
+            + ("" if layer is None else f" (layer {layer})")
+        )
+
+
+class JobJournal:
+    """Append-only journal of the current plot, so that it can be resumed after a
+    crash or a power loss.
+
+    Each event is a JSON line: ``start`` (file hash, layout and layers), ``progress``
+    and ``layer_done`` (lines plotted), ``paused`` (with pyaxidraw's resume data for
+    SVG plots), ``resumed`` and ``finished``. Progress is written at most every
+    :data:`PROGRESS_INTERVAL` and only flushed, the other events are synced to the disk
+    before the call returns: a power loss replots at most a few seconds of lines. The
+    journal only ever holds one job and is truncated when the next one starts. A
+    truncated last line, e.g. after a power loss, is ignored.
+    """
+
+    def __init__(self, path: str = JOURNAL_PATH):
+        self._path = path
+        self._fp = None
+        self._entry: Optional[JournalEntry] = None
+        self._last_progress = 0.0
+
+    @property
+    def entry(self) -> Optional[JournalEntry]:
+        """The journaled job, if not finished."""
+        return self._entry
+
+    def load(self) -> Optional[JournalEntry]:
+        """Read the journal left by the last session. Returns the job to resume, if
+        any."""
+        self._entry = None
+        try:
+            with open(self._path) as fp:
+                lines = fp.readlines()
+        except OSError:
+            return None
+
+        for line in lines:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            kind = event.get("event")
+            if kind == "start":
+                self._entry = JournalEntry(
+                    event["file"],
+                    event["file_hash"],
+                    event["layout"],
+                    [tuple(layer) for layer in event["layers"]],
+                )
+            elif self._entry is None:
+                continue
+            elif kind in ("progress", "layer_done", "paused"):
+                self._entry.position = max(self._entry.position, event["position"])
+                if "resume_svg" in event:
+                    self._entry.resume_svg = event["resume_svg"]
+            elif kind == "finished":
+                self._entry = None
+
+        if self._entry is not None and self._entry.completed:
+            self._entry = None
+        return self._entry
+
+    def start(
+        self,
+        path: str,
+        hash_: str,
+        layout: Dict[str, Any],
+        layers: List[Tuple[int, int]],
+    ) -> None:
+        self._entry = JournalEntry(path, hash_, dict(layout), list(layers))
+        self._last_progress = time.monotonic()
+        self._open("w")
+        self._write(
+            "start",
+            sync=True,
+            file=path,
+            file_hash=hash_,
+            layout=self._entry.layout,
+            layers=self._entry.layers,
+        )
+
+    def resume(self) -> None:
+        """Continue journaling the job read by :meth:`load`."""
+        if self._entry is None:
+            return
+        self._last_progress = time.monotonic()
+        self._open("a")
+        self._write("resumed", sync=True, position=self._entry.position)
+
+    def progress(self, position: int) -> None:
+        entry = self._entry
+        if entry is None or position <= entry.position:
+            return
+
+        done_before = len(entry.layers_done)
+        entry.position = position
+        layers_done = entry.layers_done[done_before:]
+        now = time.monotonic()
+        if layers_done or now - self._last_progress >= PROGRESS_INTERVAL:
+            self._last_progress = now
+            self._write("progress", position=position)
+        for layer_id in layers_done:
+            self._write("layer_done", layer=layer_id, position=position)
+
+    def pause(self, position: int, resume_svg: Optional[str] = None) -> None:
+        if self._entry is None:
+            return
+        self._entry.position = max(self._entry.position, position)
+        self._entry.resume_svg = resume_svg
+        self._write(
+            "paused", sync=True, position=self._entry.position, resume_svg=resume_svg
+        )
+
+    def finish(self) -> None:
+        """Mark the job as done or cancelled (e.g. a resume declined by the user):
+        nothing left to resume."""
+        if self._entry is None:
+            return
+        if self._fp is None:
+            self._open("a")
+        self._write(
+            "finished",
+            sync=True,
+            status="done" if self._entry.completed else "cancelled",
+        )
+        self._entry = None
+        self.close()
+
+    def close(self) -> None:
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+    def _open(self, mode: str) -> None:
+        self.close()
+        try:
+            self._fp = open(self._path, mode)
+            if mode == "a" and self._fp.tell() > 0:
+                # terminate a line torn by a crash, so it doesn't swallow the next one
+                with open(self._path, "rb") as fp:
+                    fp.seek(-1, os.SEEK_END)
+                    if fp.read(1) != b"\n":
+                        self._fp.write("\n")
+        except OSError as exc:
+            logging.warning(f"could not open job journal: {exc}")
+
+    def _write(self, event: str, sync: bool = False, **fields: Any) -> None:
+        if self._fp is None:
+            return
+        try:
+            self._fp.write(json.dumps({"event": event, "time": time.time(), **fields}))
+            self._fp.write("\n")
+            self._fp.flush()
+            if sync:
+                os.fsync(self._fp.fileno())
+        except OSError as exc:
+            logging.warning(f"could not write job journal: {exc}")
+
+
+def prepare_resume(entry: JournalEntry) -> Dict[int, List[np.ndarray]]:
+    """Lay out a journaled file again, checking that the result is the plot that was
+    interrupted. Raises ValueError otherwise. This is expensive and safe to run outside
+    of the event loop."""
+    # vpype is only needed to resume
+    from .pagelayout import PageLayout
+
+    if file_hash(entry.file) != entry.file_hash:
+        raise ValueError(f"{entry.file} changed since it was plotted")
+
+    layout = dict(entry.layout)
+    layout["page_format"] = tuple(layout["page_format"])
+    pl = PageLayout()
+    try:
+        pl.layout = layout
+        pl.path = entry.file
+        layer_ids = {layer_id for layer_id, _ in entry.layers}
+        for layer_id in pl.layer_ids:
+            pl.set_layer_enabled(layer_id, layer_id in layer_ids)
+        paths = pl.get_plot_paths()
+    finally:
+        pl.close()
+
+    if [(layer_id, len(lines)) for layer_id, lines in paths.items()] != entry.layers:
+        raise ValueError(f"{entry.file} doesn't lay out as it did")
+    return paths
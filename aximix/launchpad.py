@@ -1,12 +1,12 @@
 import asyncio
 import logging
 import math
-from typing import Dict, Iterable, List, Optional, Tuple, TypeVar, Union
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, TypeVar, Union
 
-import attr
 import mido
 
-from .signal import Signal
+from .midi_output import DEFAULT_BYTE_RATE, DEFAULT_MESSAGE_RATE, OutputQueue
+from .signal import Connection, Signal
 
 ALL_KEYS = list(key for key in range(11, 99) if key % 10 != 0)
 SET_LED_PREAMBLE = [0, 32, 41, 2, 13, 3]
@@ -25,31 +25,86 @@ def _make_stream(loop):
     return callback, stream()
 
 
-@attr.s(auto_attribs=True)
-class _LEDState:
-    key: int
-    mode: int
-    data: List[int]
+# number of color bytes per LED mode (solid, alternate/blink, pulse, RGB)
+LED_DATA_LENGTH = {0: 1, 1: 2, 2: 1, 3: 3}
+_SLOT = 4  # mode + up to 3 color bytes
 
-    def encode(self) -> List[int]:
-        return [self.mode, self.key, *self.data]
+
+class _Framebuffer:
+    """LED state of all keys, stored as ``[mode, *data]`` slots in a bytearray indexed
+    by key number. Unused data bytes are kept at zero so that slots can be compared."""
+
+    def __init__(self):
+        self._buf = bytearray(_SLOT * 100)
+
+    def set(self, key: int, mode: int, data: List[int]) -> bool:
+        """Set the state of a key. Returns True if it changed."""
+        slot = bytes((mode, *data)).ljust(_SLOT, b"\0")
+        offset = key * _SLOT
+        if self._buf[offset : offset + _SLOT] == slot:
+            return False
+        self._buf[offset : offset + _SLOT] = slot
+        return True
+
+    def differing_keys(self, other: "_Framebuffer", keys: Iterable[int]) -> List[int]:
+        """Return the subset of ``keys`` whose state differs in ``other``."""
+        a, b = self._buf, other._buf
+        return [
+            key
+            for key in keys
+            if a[key * _SLOT : (key + 1) * _SLOT] != b[key * _SLOT : (key + 1) * _SLOT]
+        ]
+
+    def copy_from(self, other: "_Framebuffer", keys: Iterable[int]) -> None:
+        for key in keys:
+            offset = key * _SLOT
+            self._buf[offset : offset + _SLOT] = other._buf[offset : offset + _SLOT]
+
+    def encode_key(self, key: int) -> bytes:
+        """Encode the state of ``key`` as expected in a LED sysex payload."""
+        offset = key * _SLOT
+        mode = self._buf[offset]
+        return (
+            bytes((mode, key))
+            + self._buf[offset + 1 : offset + 1 + LED_DATA_LENGTH[mode]]
+        )
 
 
 class Scene:
     def __init__(self, launchpad: "Launchpad"):
         self._lp = launchpad
-        self._map: Dict[int, _LEDState] = {}
+        self._fb = _Framebuffer()
+        self._dirty: Set[int] = set(ALL_KEYS)
         self._active = False
-        self._on_key_press = {}
-
-        self.clear_all()
+        self._on_key_press: Dict[int, Signal] = {}
+        self._bindings: Dict[int, Connection] = {}
 
     def on_key_press(self, key: int):
         return self._on_key_press.setdefault(key, Signal())
 
+    def bind_key(self, key: int, callback: Callable[[int], None]) -> Connection:
+        """Connect ``callback`` to ``key``, replacing the callback previously bound to
+        it with this method (callbacks connected directly to :meth:`on_key_press` are
+        not affected)."""
+        self.unbind_key(key)
+        connection = self.on_key_press(key).connect(callback)
+        self._bindings[key] = connection
+        return connection
+
+    def unbind_key(self, key: int) -> None:
+        connection = self._bindings.pop(key, None)
+        if connection is not None:
+            connection.disconnect()
+
+    @property
+    def slot_count(self) -> int:
+        """Number of key press callbacks connected (diagnostics)."""
+        return sum(signal.slot_count for signal in self._on_key_press.values())
+
     def activate(self) -> None:
         self._active = True
-        self._update_all()
+        self._dirty.update(ALL_KEYS)
+        self._lp.request_flush()
 
     def trigger_on_key_press(self, key: int):
         """used by launchpad"""
@@ -61,9 +116,7 @@ class Scene:
 
     def clear_all(self) -> None:
         for key in ALL_KEYS:
-            self._map[key] = _LEDState(key, 0, [0])
-
-        self._update_all()
+            self._set(key, 0, [0])
 
     def set_key_color(
         self,
@@ -112,32 +165,31 @@ class Scene:
                     f"mode {mode} unsupported with one color index, reverting to 'solid'"
                 )
 
-        state = _LEDState(key, mode, data)
-        self._map[key] = state
-        self._update([state])
+        self._set(key, mode, data)
 
     def set_keys_color(self, colors: List[Tuple[int, int, int, int]]) -> None:
-        to_update = []
         for key, r, g, b in colors:
             if key in ALL_KEYS:
-                state = _LEDState(key, 3, [r, g, b])
-                to_update.append(state)
-                self._map[key] = state
+                self._set(key, 3, [r, g, b])
             else:
                 logging.warning(f"key {key} invalid, ignoring")
-        self._update(to_update)
 
-    def _update_all(self) -> None:
-        self._update(self._map.values())
+    def take_dirty(self) -> List[int]:
+        """used by launchpad: return and reset the keys changed since the last flush"""
+        keys = sorted(self._dirty)
+        self._dirty.clear()
+        return keys
 
-    def _update(self, states: Iterable[_LEDState]) -> None:
-        if self._active:
-            self._lp.sysex(
-                sum(
-                    (state.encode() for state in states),
-                    SET_LED_PREAMBLE,
-                )
-            )
+    @property
+    def framebuffer(self) -> _Framebuffer:
+        """used by launchpad"""
+        return self._fb
+
+    def _set(self, key: int, mode: int, data: List[int]) -> None:
+        if self._fb.set(key, mode, data):
+            self._dirty.add(key)
+            if self._active:
+                self._lp.request_flush()
 
 
 class _ScenePopper:
@@ -152,23 +204,44 @@ class _ScenePopper:
 
 
 class Launchpad:
-    def __init__(self, loop, input_name: str = "", output_name: str = ""):
+    def __init__(
+        self,
+        loop,
+        input_name: str = "",
+        output_name: str = "",
+        message_rate: float = DEFAULT_MESSAGE_RATE,
+        byte_rate: float = DEFAULT_BYTE_RATE,
+        backend=mido,
+    ):
+        """``backend`` provides ``open_input()`` and ``open_output()``, e.g. ``mido`` or
+        a :class:`aximix.virtual_launchpad.VirtualLaunchpad`."""
         self.on_raw_event = Signal()  # msg
 
+        self._loop = loop
+        self._flush_scheduled = False
+        self._device_fb = _Framebuffer()  # LED state currently shown by the device
         cb, self._stream = _make_stream(loop)
 
         self._event_callbacks = []
         self._key_callbacks = {}
-        self._in = mido.open_input(input_name, callback=cb)
-        self._out = mido.open_output(output_name)
+        self._in = backend.open_input(input_name, callback=cb)
+        self._out = backend.open_output(output_name)
 
         # set in programmer mode and clear all LEDs
         self._out.send(mido.Message("sysex", data=[0, 32, 41, 2, 13, 14, 1]))
+        self._output = OutputQueue(
+            loop, self._out.send, SET_LED_PREAMBLE, message_rate, byte_rate
+        )
         loop.create_task(self._process_messages())
 
         self._scene_stack = [Scene(self)]
         self._scene_stack[-1].activate()
 
+    @property
+    def output(self) -> OutputQueue:
+        """MIDI output queue, see its ``depth`` and ``metrics`` attributes."""
+        return self._output
+
     @property
     def scene(self) -> Scene:
         return self._scene_stack[-1]
@@ -191,8 +264,31 @@ class Launchpad:
         self._scene_stack.pop().deactivate()
         self.scene.activate()
 
-    def sysex(self, data: List[int]) -> None:
-        self._out.send(mido.Message("sysex", data=data))
+    def sysex(self, data: Iterable[int]) -> None:
+        self._output.put_sysex(data)
+
+    def request_flush(self) -> None:
+        """Schedule sending LED changes. All changes made within one event loop
+        iteration are sent as a single sysex message."""
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self._loop.call_soon(self.flush)
+
+    def flush(self) -> None:
+        """Send pending LED changes of the active scene now. Only keys whose state
+        differs from what the device currently shows are sent, so that switching
+        between similar scenes is cheap."""
+        self._flush_scheduled = False
+        fb = self.scene.framebuffer
+        keys = fb.differing_keys(self._device_fb, self.scene.take_dirty())
+        if keys:
+            self._output.put_leds((key, fb.encode_key(key)) for key in keys)
+            self._device_fb.copy_from(fb, keys)
+
+    def close(self) -> None:
+        """Send all pending output, bypassing the rate limit."""
+        self.flush()
+        self._output.send_all()
 
     def on_key_press(self, key: int):
         return self.scene.on_key_press(key)
@@ -0,0 +1,54 @@
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+import attr
+
+from axy.kinematics import MotionSettings
+
+
+@attr.s(auto_attribs=True)
+class LayerStep:
+    """How a layer is plotted, see :func:`schedule_layers`."""
+
+    layer_id: int
+    options: Dict[str, Any]  # AxiDraw options to set before plotting the layer
+    pen: Optional[str] = None
+    pen_change: bool = False  # pause for a pen change before plotting the layer
+
+    def motion_settings(self, base_options: Mapping[str, Any]) -> MotionSettings:
+        return MotionSettings.from_options({**base_options, **self.options})
+
+
+def schedule_layers(
+    layer_ids: Iterable[int],
+    base_options: Mapping[str, Any],
+    layer_config: Mapping[int, Mapping[str, Any]],
+) -> List[LayerStep]:
+    """Plan the plot of ``layer_ids``, in this order, from the per-layer settings (see
+    :func:`.settings.get_layer_config`).
+
+    An option overridden for some layer is set for every layer, from ``base_options``
+    (or the AxiDraw default if not set there) where not overridden, so that it doesn't
+    leak into the next layer. A pen change is requested whenever a layer's pen differs
+    from the previous layer's.
+    """
+    layer_ids = list(layer_ids)
+    overridden = {
+        key
+        for layer_id in layer_ids
+        for key in layer_config.get(layer_id, {})
+        if key != "pen"
+    }
+    defaults = {**attr.asdict(MotionSettings()), **base_options}
+
+    steps = []
+    for layer_id in layer_ids:
+        config = layer_config.get(layer_id, {})
+        options = {
+            key: config.get(key, defaults.get(key))
+            for key in overridden
+            if key in config or key in defaults
+        }
+        pen = config.get("pen")
+        pen_change = bool(steps) and pen != steps[-1].pen
+        steps.append(LayerStep(layer_id, options, pen, pen_change))
+    return steps
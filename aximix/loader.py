@@ -0,0 +1,249 @@
+import asyncio
+import collections
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+import vpype as vp
+
+from .pagelayout import read_vector_data
+from .signal import Signal
+
+PROGRESS_INTERVAL = 0.1  # seconds
+DEFAULT_CACHE_BUDGET = 256 * 1024 * 1024  # bytes
+MAX_PREFETCH = 8  # files queued for prefetching at most
+
+
+def lower_thread_priority() -> None:
+    """Lower the calling thread's scheduling priority (Linux applies niceness per
+    thread), so that speculative work doesn't compete with the UI or a plot."""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (AttributeError, OSError):
+        pass
+
+
+def _get_mtime(path: str) -> Optional[float]:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def estimate_memory(vector_data: vp.VectorData) -> int:
+    """Rough memory footprint of some vector data, in bytes."""
+    line_count = 0
+    point_count = 0
+    for lc in vector_data.layers.values():
+        line_count += len(lc)
+        point_count += sum(len(line) for line in lc)
+    return 16 * point_count + 112 * line_count
+
+
+class VectorDataCache:
+    """LRU cache of parsed files, invalidated by mtime and bounded by a memory
+    budget."""
+
+    def __init__(self, budget: int = DEFAULT_CACHE_BUDGET):
+        self._budget = budget
+        self._size = 0
+        # path -> (mtime, vector_data, size)
+        self._entries: Dict[str, Tuple[float, vp.VectorData, int]]
+        self._entries = collections.OrderedDict()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, path: str) -> bool:
+        entry = self._entries.get(path)
+        return entry is not None and entry[0] == _get_mtime(path)
+
+    def get(self, path: str) -> Optional[vp.VectorData]:
+        entry = self._entries.get(path)
+        if entry is None:
+            return None
+        if entry[0] != _get_mtime(path):
+            self.discard(path)
+            return None
+        self._entries.move_to_end(path)
+        return entry[1]
+
+    def put(self, path: str, mtime: float, vector_data: vp.VectorData) -> None:
+        self.discard(path)
+        size = estimate_memory(vector_data)
+        if size > self._budget:
+            return
+        self._entries[path] = (mtime, vector_data, size)
+        self._size += size
+        while self._size > self._budget:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._size -= evicted_size
+
+    def discard(self, path: str) -> None:
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self._size -= entry[2]
+
+
+class FileLoader:
+    """Load SVG files on a worker thread so that the event loop stays responsive.
+
+    Only the last requested file matters: starting a new load cancels the previous one.
+    SVG parsing does not report progress, so it is estimated from the file size and the
+    throughput measured on previous loads.
+
+    Files can also be speculatively parsed ahead of time with :meth:`prefetch`. This runs
+    on a single low priority thread and can be suspended, e.g. while plotting. Each
+    prefetch request replaces the previous one, so that paging quickly through a
+    directory doesn't queue every file.
+    """
+
+    def __init__(
+        self,
+        loop,
+        executor: Optional[Executor] = None,
+        cache_budget: int = DEFAULT_CACHE_BUDGET,
+    ):
+        self.on_started = Signal()  # path
+        self.on_progress = Signal()  # path, fraction
+        self.on_loaded = Signal()  # path, vector_data
+        self.on_failed = Signal()  # path, exception
+
+        self._loop = loop
+        # two workers so that a new load doesn't wait on a cancelled, still running one
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="aximix_loader"
+        )
+        self._prefetch_executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="aximix_prefetch",
+            initializer=lower_thread_priority,
+        )
+        self._task: Optional[asyncio.Task] = None
+        self._throughput = 2e6  # bytes/s, refined after each load
+        self._cache = VectorDataCache(cache_budget)
+        self._prefetching: Dict[str, asyncio.Future] = {}
+        # cleared while suspended, set again to resume (or to close)
+        self._prefetch_allowed = threading.Event()
+        self._prefetch_allowed.set()
+        self._closed = False
+
+    @property
+    def loading(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def cache(self) -> VectorDataCache:
+        return self._cache
+
+    def load(self, path: str) -> None:
+        self.cancel()
+        self._task = self._loop.create_task(self._load(path))
+
+    def cancel(self) -> None:
+        if self.loading:
+            self._task.cancel()
+
+    def close(self) -> None:
+        """Cancel the current load and the queued prefetches."""
+        self.cancel()
+        self._closed = True
+        for task in self._prefetching.values():
+            task.cancel()
+        self._prefetching.clear()
+        self._prefetch_allowed.set()
+        self._prefetch_executor.shutdown(wait=False)
+
+    def prefetch(self, paths: Iterable[str]) -> None:
+        """Parse ``paths`` into the cache in the background, most important first (at
+        most :data:`MAX_PREFETCH`). Queued prefetches of other paths are dropped."""
+        paths = [path for path in paths if path not in self._cache][:MAX_PREFETCH]
+        for path in list(self._prefetching):
+            if path not in paths:
+                # no effect on the parse if it already started
+                self._prefetching.pop(path).cancel()
+        for path in paths:
+            if path not in self._prefetching:
+                self._prefetching[path] = self._loop.create_task(self._prefetch(path))
+
+    def suspend_prefetch(self, suspended: bool = True) -> None:
+        """Prevent queued prefetches from starting (running ones complete)."""
+        if suspended:
+            self._prefetch_allowed.clear()
+        else:
+            self._prefetch_allowed.set()
+
+    def _parse_for_prefetch(self, path: str) -> Optional[vp.VectorData]:
+        # runs on the prefetch thread
+        self._prefetch_allowed.wait()
+        if self._closed:
+            return None
+        return read_vector_data(path)
+
+    async def _prefetch(self, path: str) -> None:
+        mtime = _get_mtime(path)
+        try:
+            vector_data = await self._loop.run_in_executor(
+                self._prefetch_executor, self._parse_for_prefetch, path
+            )
+        except Exception as exc:
+            logging.info(f"could not prefetch {path}: {exc}")
+        else:
+            if vector_data is None:
+                return
+            if mtime is not None and mtime == _get_mtime(path):
+                self._cache.put(path, mtime, vector_data)
+        finally:
+            if self._prefetching.get(path) is asyncio.current_task():
+                del self._prefetching[path]
+
+    async def _load(self, path: str) -> None:
+        self.on_started(path)
+
+        # pending prefetch is reused rather than parsing the same file twice (waiting
+        # doesn't cancel it, and it being dropped meanwhile is fine)
+        if path in self._prefetching and self._prefetch_allowed.is_set():
+            await asyncio.wait({self._prefetching[path]})
+        vector_data = self._cache.get(path)
+        if vector_data is not None:
+            self.on_progress(path, 1.0)
+            self.on_loaded(path, vector_data)
+            return
+
+        mtime = _get_mtime(path)
+        size = os.path.getsize(path) if mtime is not None else 0
+
+        start = time.monotonic()
+        future = self._loop.run_in_executor(self._executor, read_vector_data, path)
+        try:
+            while True:
+                done, _ = await asyncio.wait({future}, timeout=PROGRESS_INTERVAL)
+                if done:
+                    break
+                elapsed = time.monotonic() - start
+                fraction = elapsed * self._throughput / size if size else 0.0
+                self.on_progress(path, min(fraction, 0.99))
+            vector_data = future.result()
+        except asyncio.CancelledError:
+            # the parse itself can't be interrupted, its result is simply dropped
+            future.cancel()
+            raise
+        except Exception as exc:
+            logging.warning(f"could not load {path}: {exc}")
+            self.on_failed(path, exc)
+            return
+
+        elapsed = time.monotonic() - start
+        if size and elapsed > 0:
+            self._throughput = size / elapsed
+        if mtime is not None:
+            self._cache.put(path, mtime, vector_data)
+        self.on_progress(path, 1.0)
+        self.on_loaded(path, vector_data)
@@ -0,0 +1,164 @@
+import asyncio
+import collections
+import logging
+import time
+from typing import Callable, Deque, Dict, Iterable, List, Tuple
+
+import attr
+import mido
+
+SYSEX_FRAMING = 2  # F0 and F7 bytes
+MAX_SYSEX_SIZE = 256  # bytes, LED updates are split in messages of at most this size
+DEFAULT_MESSAGE_RATE = 200  # messages per second
+DEFAULT_BYTE_RATE = 32000  # bytes per second
+BURST_WINDOW = 0.05  # seconds worth of budget that may be sent in a burst
+LATENCY_SMOOTHING = 0.2
+
+
+@attr.s(auto_attribs=True)
+class OutputMetrics:
+    sent_messages: int = 0
+    sent_bytes: int = 0
+    merged_updates: int = 0  # LED updates superseded before being sent
+    latency: float = 0.0  # seconds, smoothed delay between queuing and sending
+    max_latency: float = 0.0
+
+    def __str__(self):
+        return (
+            f"sent={self.sent_messages} ({self.sent_bytes}B), "
+            f"merged={self.merged_updates}, latency={1000 * self.latency:.1f}ms "
+            f"(max {1000 * self.max_latency:.1f}ms)"
+        )
+
+
+class OutputQueue:
+    """Rate-limited MIDI output.
+
+    Raw sysex messages are sent in order. LED updates are queued per key: an update for
+    a key which is still pending replaces the previous one. Pending LED updates are
+    packed into as few sysex messages as the budget allows. Sending is paced by two
+    token buckets, one for the message rate and one for the byte rate.
+    """
+
+    def __init__(
+        self,
+        loop,
+        send: Callable[[mido.Message], None],
+        led_preamble: List[int],
+        message_rate: float = DEFAULT_MESSAGE_RATE,
+        byte_rate: float = DEFAULT_BYTE_RATE,
+        max_sysex_size: int = MAX_SYSEX_SIZE,
+    ):
+        self.metrics = OutputMetrics()
+
+        self._send = send
+        self._led_preamble = bytes(led_preamble)
+        self._message_rate = message_rate
+        self._byte_rate = byte_rate
+        self._max_sysex_size = max_sysex_size
+        self._message_capacity = max(1.0, message_rate * BURST_WINDOW)
+        self._byte_capacity = max(float(max_sysex_size), byte_rate * BURST_WINDOW)
+        self._message_tokens = self._message_capacity
+        self._byte_tokens = self._byte_capacity
+        self._last_refill = time.monotonic()
+
+        self._messages: Deque[Tuple[List[int], float]] = collections.deque()
+        # key -> (encoded update, time the first unsent update was queued)
+        self._leds: Dict[int, Tuple[bytes, float]] = {}
+        self._wakeup = asyncio.Event()
+        loop.create_task(self._run())
+
+    @property
+    def depth(self) -> int:
+        """Number of pending messages and LED updates."""
+        return len(self._messages) + len(self._leds)
+
+    def put_sysex(self, data: Iterable[int]) -> None:
+        self._messages.append((list(data), time.monotonic()))
+        self._wakeup.set()
+
+    def put_leds(self, updates: Iterable[Tuple[int, bytes]]) -> None:
+        """Queue LED updates, as ``(key, encoded state)`` tuples."""
+        now = time.monotonic()
+        for key, encoded in updates:
+            pending = self._leds.get(key)
+            if pending is None:
+                self._leds[key] = (encoded, now)
+            else:
+                self._leds[key] = (encoded, pending[1])
+                self.metrics.merged_updates += 1
+        self._wakeup.set()
+
+    def send_all(self) -> None:
+        """Send everything pending right away, ignoring the budget (e.g. on exit)."""
+        while self.depth:
+            self._send_next(self._max_sysex_size)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._message_tokens = min(
+            self._message_capacity, self._message_tokens + elapsed * self._message_rate
+        )
+        self._byte_tokens = min(
+            self._byte_capacity, self._byte_tokens + elapsed * self._byte_rate
+        )
+
+    def _next_size(self) -> int:
+        if self._messages:
+            return len(self._messages[0][0]) + SYSEX_FRAMING
+        encoded, _ = next(iter(self._leds.values()))
+        return len(self._led_preamble) + len(encoded) + SYSEX_FRAMING
+
+    def _send_next(self, max_size: int) -> None:
+        now = time.monotonic()
+        if self._messages:
+            data, queued = self._messages.popleft()
+            latencies = [now - queued]
+        else:
+            data = bytearray(self._led_preamble)
+            latencies = []
+            while self._leds:
+                key = next(iter(self._leds))
+                encoded, queued = self._leds[key]
+                if latencies and len(data) + len(encoded) + SYSEX_FRAMING > max_size:
+                    break
+                del self._leds[key]
+                data += encoded
+                latencies.append(now - queued)
+
+        self._send(mido.Message("sysex", data=data))
+
+        size = len(data) + SYSEX_FRAMING
+        self._message_tokens -= 1
+        self._byte_tokens -= size
+        metrics = self.metrics
+        metrics.sent_messages += 1
+        metrics.sent_bytes += size
+        latency = sum(latencies) / len(latencies)
+        metrics.latency += LATENCY_SMOOTHING * (latency - metrics.latency)
+        metrics.max_latency = max(metrics.max_latency, max(latencies))
+
+    async def _run(self) -> None:
+        while True:
+            if not self.depth:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            self._refill()
+            needed = min(self._next_size(), self._byte_capacity)
+            if self._message_tokens < 1 or self._byte_tokens < needed:
+                await asyncio.sleep(
+                    max(
+                        (1 - self._message_tokens) / self._message_rate,
+                        (needed - self._byte_tokens) / self._byte_rate,
+                    )
+                )
+                continue
+
+            try:
+                self._send_next(min(self._max_sysex_size, int(self._byte_tokens)))
+            except Exception as exc:
+                logging.warning(f"MIDI output failed: {exc}")
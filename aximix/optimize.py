@@ -0,0 +1,91 @@
+"""Path optimisation stage.
+
+Functions operate on plain lists of lines (complex NumPy arrays) so that layers can be
+cheaply shipped to worker processes.
+"""
+
+from typing import List, Tuple
+
+import numpy as np
+import vpype as vp
+
+MERGE_TOLERANCE = vp.convert_length("0.05mm")
+SIMPLIFY_TOLERANCE = vp.convert_length("0.05mm")
+
+
+def pen_up_distance(lines: List[np.ndarray]) -> float:
+    """Total pen-up travel between consecutive lines (excluding travel from/to home)."""
+    lines = [line for line in lines if len(line) > 0]
+    if len(lines) < 2:
+        return 0.0
+    ends = np.array([line[-1] for line in lines[:-1]])
+    starts = np.array([line[0] for line in lines[1:]])
+    return float(np.abs(starts - ends).sum())
+
+
+def merge_lines(lines: List[np.ndarray], tolerance: float) -> List[np.ndarray]:
+    """Join lines whose ends are within ``tolerance``, flipping them if needed."""
+    lc = vp.LineCollection(lines)
+    lc.merge(tolerance=tolerance, flip=True)
+    return list(lc)
+
+
+def sort_lines(lines: List[np.ndarray]) -> List[np.ndarray]:
+    """Greedy nearest neighbour ordering, flipping lines if needed."""
+    if len(lines) < 2:
+        return list(lines)
+
+    index = vp.LineIndex(lines[1:], reverse=True)
+    sorted_lines = [lines[0]]
+    while len(index) > 0:
+        idx, reverse = index.find_nearest(sorted_lines[-1][-1])
+        line = index.pop(idx)
+        sorted_lines.append(np.flip(line) if reverse else line)
+    return sorted_lines
+
+
+def _segment_distances(points: np.ndarray, a: complex, b: complex) -> np.ndarray:
+    ab = b - a
+    norm = abs(ab) ** 2
+    if norm == 0:
+        return np.abs(points - a)
+    t = np.clip(((points - a) * np.conj(ab)).real / norm, 0, 1)
+    return np.abs(points - (a + t * ab))
+
+
+def simplify_line(line: np.ndarray, tolerance: float) -> np.ndarray:
+    """Douglas-Peucker simplification, with distances computed for whole spans at
+    once."""
+    if len(line) < 3:
+        return line
+
+    keep = np.zeros(len(line), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(line) - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        distances = _segment_distances(line[i + 1 : j], line[i], line[j])
+        k = int(np.argmax(distances))
+        if distances[k] > tolerance:
+            k += i + 1
+            keep[k] = True
+            stack.append((i, k))
+            stack.append((k, j))
+    return line[keep]
+
+
+def optimize_lines(
+    lines: List[np.ndarray], merge: bool, sort: bool, simplify: bool
+) -> Tuple[List[np.ndarray], float, float]:
+    """Run the enabled optimisations on one layer's lines. Returns the optimised lines
+    together with the pen-up distance before and after."""
+    before = pen_up_distance(lines)
+    if simplify:
+        lines = [simplify_line(line, SIMPLIFY_TOLERANCE) for line in lines]
+    if merge:
+        lines = merge_lines(lines, MERGE_TOLERANCE)
+    if sort:
+        lines = sort_lines(lines)
+    return lines, before, pen_up_distance(lines)
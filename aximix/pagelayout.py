@@ -1,27 +1,47 @@
 import copy
 import io
-import itertools
 import math
-import os
-from typing import Dict, Optional, Tuple, Union
+import multiprocessing
+import threading
+from concurrent.futures import CancelledError, Executor, Future, ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple, Union
 
+import numpy as np
 import vpype as vp
-from matplotlib.colors import hsv_to_rgb
-
-COLORS = [
-    hsv_to_rgb((h, s, v))
-    for v, s, h in list(
-        itertools.product(
-            (0.8, 0.5),
-            (1, 0.5, 0.25),
-            (0, 0.14, 0.35, 0.5, 0.6, 0.75, 0.9),
-        )
-    )
-]
+
+from axy.kinematics import PlotGeometry
+
+from .hpgl import iter_hpgl
+from .optimize import optimize_lines
+from .preview import PreviewViewer, render_vector_data, write_png
+
+PREVIEW_PATH = "/tmp/.aximix_preview.png"
+LAYOUT_SETTINGS = (
+    "page_format",
+    "landscape",
+    "rotate",
+    "center",
+    "fit_to_page",
+    "margin",
+    "merge",
+    "sort",
+    "simplify",
+    "layer_order",
+)
+
+
+def read_vector_data(path: str) -> vp.VectorData:
+    """Parse a SVG file. This is the expensive part of loading a file and is safe to
+    run outside of the event loop."""
+    return vp.read_multilayer_svg(path, vp.convert_length("0.05mm"), False)
 
 
 class PageLayout:
-    def __init__(self, path=""):
+    """Page setup of the current file. Layers can optionally be optimised (merged,
+    sorted and simplified) in a process pool, with results cached until the file or
+    the optimisation options change."""
+
+    def __init__(self, path="", executor: Optional[Executor] = None):
         self._path = ""
         self._landscape = False
         self._rotate = False
@@ -31,6 +51,15 @@ class PageLayout:
         self._page_format = vp.convert_page_format("a4")
         self._vector_data: Optional[vp.VectorData] = None
         self._layer_enabled: Dict[int, bool] = {}
+        self._merge = False
+        self._sort = False
+        self._simplify = False
+        self._layer_order: List[int] = []
+        self._executor = executor
+        self._owns_executor = executor is None  # shut down by close()
+        self._executor_lock = threading.Lock()
+        # (layer_id, merge, sort, simplify) -> future of (lines, pen-up before, after)
+        self._optimized: Dict[Tuple[int, bool, bool, bool], Future] = {}
 
         self.path = path
 
@@ -82,47 +111,201 @@ class PageLayout:
     def margin(self, margin: Union[float, str]) -> None:
         self._margin = vp.convert_length(margin)
 
+    @property
+    def merge(self) -> bool:
+        return self._merge
+
+    @merge.setter
+    def merge(self, val: bool) -> None:
+        self._merge = val
+
+    @property
+    def sort(self) -> bool:
+        return self._sort
+
+    @sort.setter
+    def sort(self, val: bool) -> None:
+        self._sort = val
+
+    @property
+    def simplify(self) -> bool:
+        return self._simplify
+
+    @simplify.setter
+    def simplify(self, val: bool) -> None:
+        self._simplify = val
+
+    @property
+    def layer_order(self) -> List[int]:
+        """Layers to plot first, in this order. Other layers follow in increasing
+        order."""
+        return self._layer_order
+
+    @layer_order.setter
+    def layer_order(self, layer_order: List[int]) -> None:
+        self._layer_order = list(layer_order)
+
+    @property
+    def optimizing(self) -> bool:
+        return self._merge or self._sort or self._simplify
+
+    @property
+    def layout(self) -> Dict[str, Any]:
+        """Layout and optimisation settings, e.g. to lay out the same plot again."""
+        return {name: getattr(self, name) for name in LAYOUT_SETTINGS}
+
+    @layout.setter
+    def layout(self, layout: Mapping[str, Any]) -> None:
+        for name in LAYOUT_SETTINGS:
+            if name in layout:
+                setattr(self, name, layout[name])
+
+    def snapshot(self) -> "PageLayout":
+        """Copy of the current file and settings, which an executor thread can lay out
+        while this one keeps changing. The copy shares the vector data, the process
+        pool and the optimisations started so far; those cancelled when this layout
+        moves to another file are resubmitted by the copy."""
+        if self.optimizing:
+            self._get_executor()
+        snapshot = copy.copy(self)
+        snapshot._owns_executor = False
+        snapshot._layer_enabled = dict(self._layer_enabled)
+        snapshot._layer_order = list(self._layer_order)
+        snapshot._optimized = dict(self._optimized)
+        return snapshot
+
     @property
     def path(self) -> str:
         return self._path
 
     @path.setter
     def path(self, path: str) -> None:
+        self.set_vector_data(path, read_vector_data(path) if path else None)
+
+    def set_vector_data(self, path: str, vector_data: Optional[vp.VectorData]) -> None:
+        """Set the current file from already parsed vector data (see
+        :func:`read_vector_data`)."""
         self._path = path
-        if path:
-            self._vector_data = vp.read_multilayer_svg(
-                path, vp.convert_length("0.05mm"), False
-            )
-            self._layer_enabled = {
-                layer_id: True for layer_id in self._vector_data.layers
-            }
+        self._vector_data = vector_data
+        for future in self._optimized.values():
+            future.cancel()
+        self._optimized = {}
+        if vector_data is not None:
+            self._layer_enabled = {layer_id: True for layer_id in vector_data.layers}
         else:
-            self._vector_data = None
             self._layer_enabled = {}
 
     @property
     def layer_count(self) -> int:
         return len(self._layer_enabled)
 
+    @property
+    def layer_ids(self) -> List[int]:
+        return list(self._layer_enabled)
+
     def layer_enabled(self, layer_id: int) -> bool:
         return self._layer_enabled.get(layer_id, False)
 
+    def set_layer_enabled(self, layer_id: int, enabled: bool) -> None:
+        if layer_id in self._layer_enabled:
+            self._layer_enabled[layer_id] = enabled
+
     def toggle_layer_enabled(self, idx: int):
         if 0 <= idx < len(self._layer_enabled):
             self._layer_enabled[idx] = not self._layer_enabled[idx]
 
+    def _plot_order(self, vd: vp.VectorData) -> List[int]:
+        first = [lid for lid in dict.fromkeys(self._layer_order) if lid in vd.layers]
+        return first + sorted(set(vd.layers) - set(first))
+
+    def _page_size(self) -> Tuple[float, float]:
+        width, height = self.page_format
+        if self.landscape:
+            width, height = height, width
+        return width, height
+
+    def _get_executor(self) -> Executor:
+        # also called from executor threads, see get_plot_vector_data()
+        with self._executor_lock:
+            if self._executor is None:
+                # spawn to keep MIDI ports, threads and the event loop out of the workers
+                self._executor = ProcessPoolExecutor(
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def close(self) -> None:
+        """Shut down the optimisation process pool, unless it was provided."""
+        with self._executor_lock:
+            executor = self._executor if self._owns_executor else None
+            self._executor = None
+        if executor is not None:
+            for future in self._optimized.values():
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def optimize(self) -> List[Future]:
+        """Start optimising the enabled layers with the current options (if not already
+        done or in progress) and return the corresponding futures."""
+        if self._vector_data is None or not self.optimizing:
+            return []
+
+        return [
+            self._optimize_layer(layer_id)
+            for layer_id, enabled in self._layer_enabled.items()
+            if enabled
+        ]
+
+    def _optimize_layer(self, layer_id: int) -> Future:
+        key = (layer_id, self._merge, self._sort, self._simplify)
+        future = self._optimized.get(key)
+        if future is None or future.cancelled():
+            future = self._optimized[key] = self._get_executor().submit(
+                optimize_lines,
+                list(self._vector_data.layers[layer_id]),
+                self._merge,
+                self._sort,
+                self._simplify,
+            )
+        return future
+
+    def pen_up_report(self) -> Optional[Tuple[float, float]]:
+        """Pen-up distance of the enabled layers before and after optimisation, or None
+        if optimisation is disabled or not completed."""
+        futures = self.optimize()
+        if not futures or not all(future.done() for future in futures):
+            return None
+        try:
+            results = [future.result() for future in futures]
+        except Exception:
+            return None
+        return sum(r[1] for r in results), sum(r[2] for r in results)
+
     def get_plot_vector_data(self) -> Optional[vp.VectorData]:
+        """Laid out page. This waits for the optimisation to complete and must run
+        outside of the event loop, like the methods calling it."""
         if self._vector_data is None:
             return None
 
         vd = vp.VectorData()
-        for layer_id, enabled in self._layer_enabled.items():
-            if enabled:
-                vd.layers[layer_id] = copy.deepcopy(self._vector_data.layers[layer_id])
+        if self.optimizing:
+            layer_ids = [lid for lid, enabled in self._layer_enabled.items() if enabled]
+            for layer_id, future in zip(layer_ids, self.optimize()):
+                try:
+                    lines, _, _ = future.result()
+                except CancelledError:
+                    # cancelled meanwhile by the layout this is a snapshot of
+                    lines, _, _ = self._optimize_layer(layer_id).result()
+                # lines are copied since the layout transforms modify them in place
+                vd.layers[layer_id] = vp.LineCollection([line.copy() for line in lines])
+        else:
+            for layer_id, enabled in self._layer_enabled.items():
+                if enabled:
+                    vd.layers[layer_id] = copy.deepcopy(
+                        self._vector_data.layers[layer_id]
+                    )
 
-        width, height = self.page_format
-        if self.landscape:
-            width, height = height, width
+        width, height = self._page_size()
 
         if self.rotate:
             vd.rotate(-math.pi / 2)
@@ -159,6 +342,20 @@ class PageLayout:
 
         return vd
 
+    def get_plot_paths(self) -> Dict[int, List[np.ndarray]]:
+        """Laid out lines per layer, in plotting order, for :meth:`Axy.plot_paths`."""
+        vd = self.get_plot_vector_data()
+        if vd is None:
+            return {}
+        return {
+            layer_id: list(vd.layers[layer_id]) for layer_id in self._plot_order(vd)
+        }
+
+    def get_plot_geometry(self) -> Optional[PlotGeometry]:
+        """Pre-processed geometry for plot time estimation."""
+        paths = self.get_plot_paths()
+        return PlotGeometry(paths) if paths else None
+
     def get_plot_svg(self) -> str:
         vd = self.get_plot_vector_data()
 
@@ -166,102 +363,39 @@ class PageLayout:
         vp.write_svg(
             str_io,
             vd,
-            page_format=tuple(reversed(self.page_format))
-            if self.landscape
-            else self.page_format,
+            page_format=self._page_size(),
             center=False,
         )
 
         return str_io.getvalue()
 
-    def preview(self):
+    def iter_hpgl(
+        self, pens: Optional[Mapping[int, int]] = None, velocity: Optional[float] = None
+    ) -> Iterator[str]:
+        """Laid out page as HPGL, generated lazily in chunks (see
+        :func:`.hpgl.iter_hpgl`). Layers are plotted in plotting order, with pen
+        ``pens[layer_id]`` (by default, the layer id)."""
         vd = self.get_plot_vector_data()
         if vd is None:
             return
+        _, height = self._page_size()
+        yield from iter_hpgl(
+            {layer_id: vd.layers[layer_id] for layer_id in self._plot_order(vd)},
+            height,
+            pens,
+            velocity,
+        )
 
-        svg_width, svg_height = self.page_format
-        if self.landscape:
-            svg_width, svg_height = svg_height, svg_width
-
-        # TODO: ugly af
-        with open("/tmp/.aximix_preview.svg", "w") as fp:
-            vp.write_svg(
-                fp,
-                vd,
-                page_format=(svg_width, svg_height),
-                center=self.center,
-                show_pen_up=True,
-                color_mode="layer",
-            )
-            os.system(
-                f"vpype read /tmp/.aximix_preview.svg rect -l 10 0 0 {svg_width} {svg_height} "
-                "show -ap -u cm 2> /dev/null &"
-            )
+    def preview(self, viewer: Optional[PreviewViewer] = None) -> Optional[np.ndarray]:
+        """Render the laid out page in-process. The image is written to
+        :data:`PREVIEW_PATH` and displayed by ``viewer`` if provided. This is expensive
+        and should run outside of the event loop."""
+        vd = self.get_plot_vector_data()
+        if vd is None:
+            return None
 
-    # def preview_broken(self):
-    #     vd = self.get_plot_vector_data()
-    #     if vd is None:
-    #         return
-    #
-    #     scale = vp.convert_length("1cm")
-    #
-    #     fig = plt.figure()
-    #     ax = plt.subplot(1, 1, 1)
-    #
-    #     # draw page
-    #     w = self.page_format[0] * scale
-    #     h = self.page_format[1] * scale
-    #     if self.landscape:
-    #         w, h = h, w
-    #     dw = 10 * scale
-    #     ax.plot(
-    #         np.array([0, 1, 1, 0, 0]) * w,
-    #         np.array([0, 0, 1, 1, 0]) * h,
-    #         "-k",
-    #         lw=0.25,
-    #     )
-    #     ax.fill(
-    #         np.array([w, w + dw, w + dw, dw, dw, w]),
-    #         np.array([dw, dw, h + dw, h + dw, h, h]),
-    #         "k",
-    #         alpha=0.3,
-    #     )
-    #
-    #     for layer_id, lc in vd.layers.items():
-    #         color = COLORS[(layer_id - 1) % len(COLORS)]
-    #
-    #         layer_lines = matplotlib.collections.LineCollection(
-    #             (vp.as_vector(line) * scale for line in lc),
-    #             color=color,
-    #             lw=1,
-    #             alpha=0.5,
-    #             label=str(layer_id),
-    #         )
-    #
-    #         ax.add_collection(layer_lines)
-    #
-    #         if True:
-    #             pen_up_lines = matplotlib.collections.LineCollection(
-    #                 (
-    #                     (
-    #                         vp.as_vector(lc[i])[-1] * scale,
-    #                         vp.as_vector(lc[i + 1])[0] * scale,
-    #                     )
-    #                     for i in range(len(lc) - 1)
-    #                 ),
-    #                 color=(0, 0, 0),
-    #                 lw=0.5,
-    #                 alpha=0.5,
-    #             )
-    #             ax.add_collection(pen_up_lines)
-    #
-    #     ax.invert_yaxis()
-    #     ax.axis("equal")
-    #
-    #     ax.axis("on")
-    #     ax.set_xlabel(f"[cm]")
-    #     ax.set_ylabel(f"[cm]")
-    #     ax.grid("on", alpha=0.2)
-    #
-    #     plt.ion()
-    #     plt.show()
+        image = render_vector_data(vd, self._page_size())
+        write_png(PREVIEW_PATH, image)
+        if viewer is not None:
+            viewer.show(image, self.path)
+        return image
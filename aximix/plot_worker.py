@@ -0,0 +1,228 @@
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import attr
+import numpy as np
+
+from .layer_schedule import LayerStep
+from .signal import Signal
+
+IDLE = "idle"
+PLOTTING = "plotting"
+PAUSED = "paused"
+
+PROGRESS_INTERVAL = 0.25  # seconds
+
+
+@attr.s(auto_attribs=True)
+class PlotJob:
+    """A plot, either as paths (see ``Axy.plot_paths``) or as SVG.
+
+    ``position`` is the number of lines already plotted for path jobs, while
+    ``resume_svg`` holds pyaxidraw's resume data for paused SVG jobs. Path jobs are
+    plotted layer by layer following ``schedule`` (if any), and ``pen_change`` is the
+    layer waiting for a pen change while paused for it.
+    """
+
+    name: str = ""
+    paths: Optional[Dict[int, List[np.ndarray]]] = None
+    svg: Optional[str] = None
+    position: int = 0
+    resume_svg: Optional[str] = None
+    schedule: List[LayerStep] = attr.Factory(list)
+    pen_change: Optional[LayerStep] = None
+
+    @property
+    def line_count(self) -> int:
+        if self.paths is None:
+            return 0
+        return sum(len(lines) for lines in self.paths.values())
+
+
+class PlotWorker:
+    """Run plots and other plotter commands on a dedicated thread.
+
+    All calls to the underlying ``Axy`` instance go through the worker, so that the
+    serial connection is only ever used by a single thread. Path plots can be paused,
+    resumed and cancelled between lines; SVG plots can only be paused with the AxiDraw's
+    button, in which case they are resumed from pyaxidraw's resume data.
+
+    Signals are emitted on the event loop thread.
+    """
+
+    def __init__(self, loop, axy: Any):
+        self.on_state_changed = Signal()  # state
+        self.on_progress = Signal()  # lines done, line count
+        self.on_error = Signal()  # exception
+
+        self._loop = loop
+        self._axy = axy
+        self._state = IDLE
+        self._job: Optional[PlotJob] = None
+        self._stop_requested = threading.Event()
+        self._cancel_requested = False
+        self._last_progress = 0.0
+        self._queue: "queue.Queue[Optional[Callable[[], None]]]" = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name="aximix_plot", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @property
+    def job(self) -> Optional[PlotJob]:
+        """Job being plotted or paused, if any."""
+        return self._job
+
+    @property
+    def axy(self) -> Any:
+        return self._axy
+
+    def plot(self, job: PlotJob) -> bool:
+        """Start plotting ``job``. Returns False if another job is plotting or paused."""
+        if self._state != IDLE:
+            logging.warning(f"plotter busy ({self._state}), ignoring plot request")
+            return False
+
+        self._job = job
+        self._start()
+        return True
+
+    def pause(self) -> None:
+        if self._state == PLOTTING:
+            if self._job is not None and self._job.paths is None:
+                logging.warning("SVG plots can only be paused with the AxiDraw button")
+            self._stop_requested.set()
+
+    def resume(self) -> None:
+        if self._state == PAUSED:
+            self._start()
+
+    def cancel(self) -> None:
+        if self._state == PLOTTING:
+            self._cancel_requested = True
+            self._stop_requested.set()
+        elif self._state == PAUSED:
+            self._job = None
+            self._set_state(IDLE)
+
+    def run(self, func: Callable[[], None], force: bool = False) -> bool:
+        """Queue a plotter command (e.g. ``axy.pen_up``). Commands are refused while
+        plotting, unless ``force`` is set, in which case they execute once the current
+        plot stops."""
+        if self._state == PLOTTING and not force:
+            logging.warning("plotter busy, ignoring command")
+            return False
+        self._queue.put(func)
+        return True
+
+    def close(self) -> None:
+        """Cancel the current plot, run the queued commands and stop the thread."""
+        self.cancel()
+        self._queue.put(None)
+        self._thread.join()
+
+    def _start(self) -> None:
+        self._stop_requested.clear()
+        self._cancel_requested = False
+        self._set_state(PLOTTING)
+        self._queue.put(self._plot_job)
+
+    def _set_state(self, state: str) -> None:
+        # called from both threads, signal is always emitted on the loop
+        self._state = state
+        self._loop.call_soon_threadsafe(self.on_state_changed, state)
+
+    def _report_progress(self, done: int, total: int) -> None:
+        if self._job is not None:
+            self._job.position = done
+        now = time.monotonic()
+        if done == total or now - self._last_progress > PROGRESS_INTERVAL:
+            self._last_progress = now
+            self._loop.call_soon_threadsafe(self.on_progress, done, total)
+
+    def _plot_job(self) -> None:
+        job = self._job
+        if job is None:
+            return
+
+        if job.paths is not None:
+            self._plot_layers(job)
+            completed = job.position >= job.line_count
+        else:
+            resume = job.resume_svg is not None
+            job.resume_svg = self._axy.plot_svg(
+                job.resume_svg if resume else job.svg, resume=resume
+            )
+            completed = job.resume_svg is None
+
+        if completed or self._cancel_requested:
+            self._job = None
+            self._set_state(IDLE)
+        else:
+            self._set_state(PAUSED)
+
+    def _plot_layers(self, job: PlotJob) -> None:
+        """Plot the remaining layers of a path job, setting each layer's options and
+        stopping before a layer which needs a pen change. The carriage is only sent home
+        after the last layer."""
+        steps = {step.layer_id: step for step in job.schedule}
+        # resuming from a pen change pause means the pen was changed
+        pen_changed, job.pen_change = job.pen_change, None
+        total = job.line_count
+
+        layer_start = 0
+        for layer_id, lines in job.paths.items():
+            layer_end = layer_start + len(lines)
+            if job.position >= layer_end:
+                layer_start = layer_end
+                continue
+
+            step = steps.get(layer_id)
+            if step is not None:
+                if (
+                    step.pen_change
+                    and job.position == layer_start
+                    and step is not pen_changed
+                ):
+                    job.pen_change = step
+                    return
+                for key, value in step.options.items():
+                    self._axy.set_option(key, value)
+
+            done = self._axy.plot_paths(
+                {layer_id: lines},
+                start=job.position - layer_start,
+                on_progress=lambda d, t: self._report_progress(layer_start + d, total),
+                should_stop=self._stop_requested.is_set,
+                home=layer_end == total,
+            )
+            job.position = layer_start + done
+            if job.position < layer_end:
+                return
+            layer_start = layer_end
+
+    def _run(self) -> None:
+        while True:
+            func = self._queue.get()
+            if func is None:
+                return
+
+            try:
+                func()
+            except Exception as exc:
+                logging.warning(f"plotter command failed: {exc}")
+                self._loop.call_soon_threadsafe(self.on_error, exc)
+                if self._state == PLOTTING:
+                    if self._cancel_requested:
+                        self._job = None
+                        self._set_state(IDLE)
+                    else:
+                        # the job's position is kept so that it can be resumed
+                        self._set_state(PAUSED)
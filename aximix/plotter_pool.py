@@ -0,0 +1,153 @@
+import collections
+import logging
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+
+from .plot_worker import IDLE, PAUSED, PlotJob, PlotWorker
+from .signal import Signal
+
+
+class PlotterPool:
+    """Several plotters, each with its own :class:`PlotWorker`, fed from a shared queue.
+
+    Plotters are keyed by their port. Jobs (whole files, or single layers with
+    :meth:`submit_layers`) are dispatched in order to whichever plotter is idle. Jobs
+    are plotted without pauses, so they shouldn't have a pen change schedule.
+
+    A plotter failing (e.g. disconnected) is taken out of service. Its job is put back
+    at the front of the queue if nothing was plotted yet, and fails otherwise, since
+    the rest of it can't go to another plotter's paper. Queued jobs fail once no
+    plotter is left. Jobs paused otherwise (with the AxiDraw button) fail too.
+    """
+
+    def __init__(self, loop, axy_factory: Callable[[], Any], ports: List[str]):
+        self.on_job_started = Signal()  # port, job
+        self.on_job_finished = Signal()  # port, job
+        self.on_job_failed = Signal()  # port (None if none was left), job, exception
+        self.on_progress = Signal()  # port, lines done, line count
+
+        self._workers: Dict[str, PlotWorker] = {}
+        self._current: Dict[str, Optional[PlotJob]] = {}
+        self._errors: Dict[str, Optional[Exception]] = {}
+        self._failed_ports: Set[str] = set()
+        self._queue: Deque[PlotJob] = collections.deque()
+
+        for port in ports:
+            axy = axy_factory()
+            axy.set_option("port", port)
+            worker = PlotWorker(loop, axy)
+            worker.on_state_changed.connect(
+                lambda state, port=port: self._state_changed(port, state)
+            )
+            worker.on_progress.connect(
+                lambda done, total, port=port: self.on_progress(port, done, total)
+            )
+            worker.on_error.connect(lambda exc, port=port: self._error(port, exc))
+            self._workers[port] = worker
+            self._current[port] = None
+            self._errors[port] = None
+
+    @property
+    def ports(self) -> List[str]:
+        return list(self._workers)
+
+    @property
+    def available_ports(self) -> List[str]:
+        """Ports of the plotters still in service."""
+        return [port for port in self._workers if port not in self._failed_ports]
+
+    @property
+    def workers(self) -> Dict[str, PlotWorker]:
+        return dict(self._workers)
+
+    @property
+    def queue_length(self) -> int:
+        return len(self._queue)
+
+    @property
+    def idle(self) -> bool:
+        """True when the queue is empty and no plotter is busy."""
+        return not self._queue and all(job is None for job in self._current.values())
+
+    def set_option(self, option: str, value: Any) -> None:
+        """Set an option on all plotters."""
+        for worker in self._workers.values():
+            worker.axy.set_option(option, value)
+
+    def submit(self, job: PlotJob) -> None:
+        self._queue.append(job)
+        self._dispatch()
+
+    def submit_layers(self, job: PlotJob) -> None:
+        """Split a path job into one job per layer, so that layers of a single file can
+        be plotted on different plotters."""
+        if job.paths is None:
+            self.submit(job)
+            return
+        for layer_id, lines in job.paths.items():
+            self._queue.append(PlotJob(f"{job.name} [{layer_id}]", {layer_id: lines}))
+        self._dispatch()
+
+    def cancel_all(self) -> None:
+        self._queue.clear()
+        for worker in self._workers.values():
+            worker.cancel()
+
+    def close(self) -> None:
+        self._queue.clear()
+        for worker in self._workers.values():
+            worker.close()
+
+    def _dispatch(self) -> None:
+        if not self.available_ports:
+            while self._queue:
+                self.on_job_failed(
+                    None, self._queue.popleft(), RuntimeError("no plotter left")
+                )
+            return
+
+        for port, worker in self._workers.items():
+            if not self._queue:
+                return
+            if port in self._failed_ports:
+                continue
+            if self._current[port] is None and worker.state == IDLE:
+                job = self._queue.popleft()
+                if worker.plot(job):
+                    self._current[port] = job
+                    self.on_job_started(port, job)
+                else:
+                    self._queue.appendleft(job)
+
+    def _state_changed(self, port: str, state: str) -> None:
+        if state == PAUSED:
+            self._job_paused(port)
+            return
+        if state != IDLE:
+            return
+
+        job = self._current[port]
+        if job is not None:
+            self._current[port] = None
+            logging.info(f"{port}: finished {job.name}")
+            self.on_job_finished(port, job)
+        self._dispatch()
+
+    def _error(self, port: str, exc: Exception) -> None:
+        self._errors[port] = exc
+
+    def _job_paused(self, port: str) -> None:
+        # nobody is there to resume: an error takes the plotter out of service, and the
+        # job goes back to the queue if it can still be plotted on another one
+        job, self._current[port] = self._current[port], None
+        error, self._errors[port] = self._errors[port], None
+        if error is not None:
+            logging.warning(f"{port}: out of service ({error})")
+            self._failed_ports.add(port)
+        # back to IDLE, which dispatches the queued jobs
+        self._workers[port].cancel()
+        if job is None:
+            return
+        if error is not None and job.position == 0 and job.resume_svg is None:
+            self._queue.appendleft(job)
+        else:
+            self.on_job_failed(port, job, error or RuntimeError("plot paused"))
@@ -0,0 +1,252 @@
+"""In-process preview rendering.
+
+Laid out vector data is rasterised with NumPy and either written as PNG or sent to a
+long-lived viewer process (``python -m aximix.preview``) which reads frames from its
+standard input.
+"""
+
+import itertools
+import os
+import queue
+import struct
+import subprocess
+import sys
+import threading
+import zlib
+from typing import Optional, Tuple
+
+import numpy as np
+import vpype as vp
+from matplotlib.colors import hsv_to_rgb
+
+COLORS = [
+    hsv_to_rgb((h, s, v))
+    for v, s, h in list(
+        itertools.product(
+            (0.8, 0.5),
+            (1, 0.5, 0.25),
+            (0, 0.14, 0.35, 0.5, 0.6, 0.75, 0.9),
+        )
+    )
+]
+PEN_UP_COLOR = (200, 200, 200)
+PEN_UP_STEP = 4.0  # pixels between pen-up trajectory dots
+PAGE_COLOR = (0, 0, 0)
+DEFAULT_WIDTH = 1200  # pixels
+_BATCH_SAMPLES = 1 << 21
+
+
+def _draw_segments(
+    image: np.ndarray, starts: np.ndarray, ends: np.ndarray, color, step: float = 1.0
+) -> None:
+    """Draw segments given as complex arrays of pixel coordinates by sampling each of
+    them every ``step`` pixels (``step`` > 1 yields dotted lines)."""
+    if len(starts) == 0:
+        return
+
+    counts = np.ceil(np.abs(ends - starts) / step).astype(int) + 1
+
+    # process in batches to bound the memory used by the sample points
+    cum_counts = np.cumsum(counts)
+    start = 0
+    while start < len(starts):
+        limit = cum_counts[start] - counts[start] + _BATCH_SAMPLES
+        end = max(int(np.searchsorted(cum_counts, limit, side="right")), start + 1)
+        _draw_segment_batch(
+            image, starts[start:end], ends[start:end], counts[start:end], color
+        )
+        start = end
+
+
+def _draw_segment_batch(
+    image: np.ndarray, starts: np.ndarray, ends: np.ndarray, counts: np.ndarray, color
+) -> None:
+    total = int(counts.sum())
+    t = np.arange(total, dtype=np.float32)
+    t -= np.repeat((np.cumsum(counts) - counts).astype(np.float32), counts)
+    t /= np.repeat(np.maximum(counts - 1, 1).astype(np.float32), counts)
+
+    deltas = ends - starts
+    x = np.repeat(starts.real.astype(np.float32), counts)
+    x += np.repeat(deltas.real.astype(np.float32), counts) * t
+    y = np.repeat(starts.imag.astype(np.float32), counts)
+    y += np.repeat(deltas.imag.astype(np.float32), counts) * t
+
+    height, width, _ = image.shape
+    x = np.rint(x).astype(np.int32)
+    y = np.rint(y).astype(np.int32)
+    mask = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+    image.reshape(-1, 3)[y[mask] * width + x[mask]] = color
+
+
+def render_vector_data(
+    vector_data: vp.VectorData,
+    page_size: Tuple[float, float],
+    width: int = DEFAULT_WIDTH,
+    show_pen_up: bool = True,
+) -> np.ndarray:
+    """Rasterise laid out vector data on a page, returning a (height, width, 3) RGB
+    image. Layers are colored by ID and pen-up trajectories are optionally shown."""
+    page_width, page_height = page_size
+    scale = (width - 1) / page_width
+    height = int(round(page_height * scale)) + 1
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+
+    corners = np.array([0, page_width, page_width + page_height * 1j, page_height * 1j])
+    _draw_segments(image, corners * scale, np.roll(corners, -1) * scale, PAGE_COLOR)
+
+    for layer_id, lc in sorted(vector_data.layers.items()):
+        lines = [np.asarray(line) * scale for line in lc if len(line) > 0]
+        if not lines:
+            continue
+
+        if show_pen_up and len(lines) > 1:
+            _draw_segments(
+                image,
+                np.array([line[-1] for line in lines[:-1]]),
+                np.array([line[0] for line in lines[1:]]),
+                PEN_UP_COLOR,
+                step=PEN_UP_STEP,
+            )
+
+        # single points are drawn as zero-length segments
+        color = (np.array(COLORS[(layer_id - 1) % len(COLORS)]) * 255).astype(np.uint8)
+        _draw_segments(
+            image,
+            np.concatenate([line[:-1] if len(line) > 1 else line for line in lines]),
+            np.concatenate([line[1:] if len(line) > 1 else line for line in lines]),
+            color,
+        )
+
+    return image
+
+
+def encode_png(image: np.ndarray) -> bytes:
+    """Encode a (height, width, 3) uint8 image as PNG."""
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(data))
+            + tag
+            + data
+            + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+        )
+
+    height, width, _ = image.shape
+    raw = np.hstack(
+        [np.zeros((height, 1), dtype=np.uint8), image.reshape(height, width * 3)]
+    )
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw.tobytes(), 1))
+        + chunk(b"IEND", b"")
+    )
+
+
+def write_png(path: str, image: np.ndarray) -> None:
+    with open(path, "wb") as fp:
+        fp.write(encode_png(image))
+
+
+_FRAME_HEADER = struct.Struct(">III")  # height, width, title length
+# directory containing the aximix package, for the viewer process to import it
+_PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class PreviewViewer:
+    """Long-lived viewer process fed with rendered frames over a pipe. The process is
+    (re)started when needed, e.g. after its window has been closed."""
+
+    def __init__(self):
+        self._process: Optional[subprocess.Popen] = None
+
+    def show(self, image: np.ndarray, title: str = "") -> None:
+        for _ in range(2):
+            if self._process is None or self._process.poll() is not None:
+                self._process = self._start()
+            try:
+                self._send(image, title)
+                return
+            except (BrokenPipeError, OSError):
+                self._process = None
+
+    @staticmethod
+    def _start() -> subprocess.Popen:
+        # aximix may not be installed, nor the current directory be the repository
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(
+            filter(None, [_PACKAGE_ROOT, env.get("PYTHONPATH")])
+        )
+        return subprocess.Popen(
+            [sys.executable, "-m", "aximix.preview"],
+            stdin=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            env=env,
+        )
+
+    def _send(self, image: np.ndarray, title: str) -> None:
+        height, width, _ = image.shape
+        title_bytes = title.encode()
+        pipe = self._process.stdin
+        pipe.write(_FRAME_HEADER.pack(height, width, len(title_bytes)))
+        pipe.write(title_bytes)
+        pipe.write(np.ascontiguousarray(image, dtype=np.uint8).tobytes())
+        pipe.flush()
+
+    def close(self) -> None:
+        if self._process is not None and self._process.poll() is None:
+            self._process.stdin.close()
+            self._process.terminate()
+        self._process = None
+
+
+def _read_frames(stream, frames: queue.Queue) -> None:
+    while True:
+        header = stream.read(_FRAME_HEADER.size)
+        if len(header) < _FRAME_HEADER.size:
+            frames.put(None)
+            return
+        height, width, title_len = _FRAME_HEADER.unpack(header)
+        title = stream.read(title_len).decode()
+        data = stream.read(height * width * 3)
+        image = np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+        frames.put((image, title))
+
+
+def _viewer_main() -> None:
+    import matplotlib.pyplot as plt
+
+    frames: queue.Queue = queue.Queue()
+    threading.Thread(
+        target=_read_frames, args=(sys.stdin.buffer, frames), daemon=True
+    ).start()
+
+    fig, ax = plt.subplots()
+    ax.axis("off")
+    fig.tight_layout()
+    plt.show(block=False)
+    artist = None
+
+    while plt.fignum_exists(fig.number):
+        try:
+            frame = frames.get_nowait()
+        except queue.Empty:
+            fig.canvas.start_event_loop(0.05)
+            continue
+
+        if frame is None:
+            break
+
+        image, title = frame
+        if artist is None:
+            artist = ax.imshow(image, interpolation="antialiased")
+        else:
+            artist.set_data(image)
+            artist.set_extent((-0.5, image.shape[1] - 0.5, image.shape[0] - 0.5, -0.5))
+        fig.canvas.manager.set_window_title(title or "aximix preview")
+        fig.canvas.draw_idle()
+
+
+if __name__ == "__main__":
+    _viewer_main()
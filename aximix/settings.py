@@ -1,6 +1,10 @@
+import atexit
 import configparser
+import io
+import logging
 import os
-from typing import Any, Dict, TypeVar
+import threading
+from typing import Any, Dict, List, Mapping, Optional, TypeVar
 
 config_path = os.path.expanduser("~/.aximix.ini")
 config = configparser.ConfigParser()
@@ -9,22 +13,77 @@ if "__persistent__" not in config:
     config["__persistent__"] = {}
 
 
+SAVE_DELAY = 2.0  # seconds, persistent values are written at most this often
+
+_lock = threading.RLock()
+# serialises writes, so that they land in the order of their snapshots, without
+# holding _lock (and blocking set_value on the event loop) during the fsync
+_write_lock = threading.Lock()
+_save_timer: Optional[threading.Timer] = None
+
+
 def save_config():
-    with open(config_path, "w") as f:
-        config.write(f)
+    """Write the config file now. The file is replaced atomically."""
+    global _save_timer
+    with _write_lock:
+        with _lock:
+            if _save_timer is not None:
+                _save_timer.cancel()
+                _save_timer = None
+            buffer = io.StringIO()
+            config.write(buffer)
+
+        tmp_path = config_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(buffer.getvalue())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, config_path)
+
+
+def schedule_save():
+    """Write the config file after a delay, batching changes made in the meantime. The
+    write happens on a timer thread, off the event loop."""
+    global _save_timer
+    with _lock:
+        if _save_timer is None:
+            _save_timer = threading.Timer(SAVE_DELAY, _save_pending)
+            _save_timer.daemon = True
+            _save_timer.start()
+
+
+def _save_pending():
+    try:
+        save_config()
+    except OSError as exc:
+        logging.warning(f"could not save settings: {exc}")
+
+
+def flush_config():
+    """Write pending changes, if any."""
+    with _lock:
+        pending = _save_timer is not None
+    if pending:
+        _save_pending()
+
+
+atexit.register(flush_config)
 
 
 VarType = TypeVar("VarType")
 
 
 class PersistentVar:
+    """Value persisted in the config file. The typed value is cached and changes are
+    written behind (see :func:`schedule_save`)."""
+
     def __init__(self, name: str, default: VarType):
         self._name = name
         self._default: VarType = default
         self._type = type(default)
+        self._value: VarType = self._read()
 
-    @property
-    def value(self) -> VarType:
+    def _read(self) -> VarType:
         cfg = config["__persistent__"]
         if self._type is bool:
             # special case needed because bool("False") == True
@@ -33,9 +92,46 @@ class PersistentVar:
         else:
             return self._type(cfg.get(self._name, self._default))
 
+    @property
+    def value(self) -> VarType:
+        return self._value
+
     def set_value(self, value: VarType):
-        config["__persistent__"][self._name] = str(value)
-        save_config()
+        value = self._type(value)
+        if value == self._value:
+            return
+        self._value = value
+        with _lock:
+            config["__persistent__"][self._name] = str(value)
+        schedule_save()
+
+
+LAYER_SECTION_PREFIX = "layer_"
+LAYER_PARAMS = {
+    "pen": str,
+    "speed_pendown": int,
+    "speed_penup": int,
+    "accel": int,
+    "pen_pos_down": int,
+    "pen_pos_up": int,
+    "pen_rate_lower": int,
+    "pen_rate_raise": int,
+    "pen_delay_down": int,
+    "pen_delay_up": int,
+    "const_speed": bool,
+}
+
+
+def _read_section(section: configparser.SectionProxy, params: Mapping[str, type]):
+    res = {}
+    for key, t in params.items():
+        if key in section:
+            if t is bool:
+                res[key] = section.getboolean(key)
+            else:
+                res[key] = t(section[key])
+
+    return res
 
 
 def get_axidraw_config() -> Dict[str, Any]:
@@ -51,16 +147,36 @@ def get_axidraw_config() -> Dict[str, Any]:
         "port_config": int,
     }
 
+    if "axidraw" not in config:
+        return {}
+    return _read_section(config["axidraw"], params)
+
+
+def get_layer_config() -> Dict[int, Dict[str, Any]]:
+    """Per-layer settings from the ``[layer_N]`` sections: ``pen``, the name of the pen
+    used for layer N, and AxiDraw options overriding the global ones."""
     res = {}
-    for key, t in params.items():
-        if key in config["axidraw"]:
-            if t is bool:
-                res[key] = config["axidraw"].getboolean(key)
-            else:
-                res[key] = t(config["axidraw"][key])
+    for name in config.sections():
+        if name.startswith(LAYER_SECTION_PREFIX):
+            try:
+                layer_id = int(name[len(LAYER_SECTION_PREFIX) :])
+            except ValueError:
+                continue
+            res[layer_id] = _read_section(config[name], LAYER_PARAMS)
 
     return res
 
 
-def get_setting(key: str) -> str:
-    return config["aximix"][key]
+def get_layer_order() -> List[int]:
+    """Plotting order of the layers, from the ``layer_order`` setting (e.g. "3, 1, 2").
+    Layers not listed are plotted afterwards, in increasing order."""
+    return [int(v) for v in get_setting("layer_order", "").replace(",", " ").split()]
+
+
+def get_setting(key: str, default: Optional[str] = None) -> str:
+    if default is None:
+        return config["aximix"][key]
+    elif "aximix" not in config:
+        return default
+    else:
+        return config["aximix"].get(key, default)
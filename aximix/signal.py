@@ -1,16 +1,122 @@
+import inspect
+import itertools
+import weakref
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+_signals: "weakref.WeakSet[Signal]" = weakref.WeakSet()
+
+
+def live_slot_count() -> int:
+    """Number of connected slots across all signals (diagnostics)."""
+    return sum(signal.slot_count for signal in list(_signals))
+
+
+def _slot_key(callback: Callable) -> Any:
+    # bound methods are keyed without holding a reference to their object
+    if inspect.ismethod(callback):
+        return id(callback.__self__), callback.__func__
+    return callback
+
+
+class Connection:
+    """Handle returned by :meth:`Signal.connect`. Calling it calls the callback, so that
+    ``connect`` can still be used as a decorator."""
+
+    def __init__(
+        self,
+        signal: "Signal",
+        slot_id: int,
+        callback: Union[Callable, weakref.WeakMethod],
+    ):
+        self._signal = weakref.ref(signal)
+        self._id = slot_id
+        self._callback = callback
+
+    @property
+    def callback(self) -> Optional[Callable]:
+        """The connected callback, None if it was a weak method since collected."""
+        if isinstance(self._callback, weakref.WeakMethod):
+            return self._callback()
+        return self._callback
+
+    @property
+    def connected(self) -> bool:
+        signal = self._signal()
+        return signal is not None and self._id in signal._slots
+
+    def disconnect(self) -> None:
+        signal = self._signal()
+        if signal is not None:
+            signal._remove(self._id)
+
+    def __call__(self, *args, **kwargs):
+        callback = self.callback
+        if callback is None:
+            raise ReferenceError("weakly connected method was garbage collected")
+        return callback(*args, **kwargs)
+
+
 class Signal:
-    """Minimalistic signal-slot support."""
+    """Minimalistic signal-slot support.
+
+    Callbacks are held strongly. Bound methods connected with ``weak=True`` are held
+    through weak references instead, and are disconnected automatically when their
+    object is garbage collected.
+    """
 
     def __init__(self):
-        self._slots = []
+        # slot id -> (key, callback or weak method), in connection order
+        self._slots: Dict[int, Tuple[Any, Union[Callable, weakref.WeakMethod]]] = {}
+        self._ids: Dict[Any, int] = {}  # key -> slot id, for disconnect(callback)
+        self._counter = itertools.count()
+        _signals.add(self)
+
+    @property
+    def slot_count(self) -> int:
+        return len(self._slots)
+
+    def connect(self, callback: Callable, weak: bool = False) -> Connection:
+        slot_id = next(self._counter)
+        key = _slot_key(callback)
+        if weak and inspect.ismethod(callback):
+            self_ref = weakref.ref(self)
+
+            def on_collected(_):
+                signal = self_ref()
+                if signal is not None:
+                    signal._remove(slot_id)
+
+            slot = weakref.WeakMethod(callback, on_collected)
+        else:
+            slot = callback
+        self._slots[slot_id] = key, slot
+        self._ids[key] = slot_id
+        return Connection(self, slot_id, slot)
+
+    def disconnect(self, connection: Union[Connection, Callable]) -> None:
+        """Disconnect a slot, given its connection or its callback."""
+        if isinstance(connection, Connection):
+            connection.disconnect()
+            return
+
+        slot_id = self._ids.get(_slot_key(connection))
+        if slot_id is None:
+            raise ValueError("callback not connected")
+        self._remove(slot_id)
 
-    def connect(self, callback):
-        self._slots.append(callback)
-        return callback
+    def disconnect_all(self) -> None:
+        self._slots.clear()
+        self._ids.clear()
 
-    def disconnect(self, connection):
-        self._slots.remove(connection)
+    def _remove(self, slot_id: int) -> None:
+        slot = self._slots.pop(slot_id, None)
+        if slot is not None and self._ids.get(slot[0]) == slot_id:
+            del self._ids[slot[0]]
 
     def __call__(self, *args, **kwargs):
-        for slot in self._slots:
+        for _, slot in list(self._slots.values()):
+            if isinstance(slot, weakref.WeakMethod):
+                slot = slot()
+                if slot is None:
+                    continue
             slot(*args, **kwargs)
@@ -7,18 +7,36 @@ Strategy:
 """
 
 import asyncio
-from typing import Any
+import logging
+from typing import Any, Optional
 
 import urwid
-from axy.axidraw import axy
-from axy.stub import set_print_callback
-from watchgod import awatch
+import vpype as vp
+
+from axy import get_backend
+from axy.kinematics import MotionSettings, PlotGeometry, format_duration
+from axy.trace import TracedAxy, Tracer
 
 from .color_defs import GREEN, ORANGE, PURPLE, RED
+from .dir_watch import DirWatcher
 from .file_selector import FILE_SELECTOR_PALETTE, FileSelector
+from .journal import JOURNAL_PATH, JobJournal, file_hash, prepare_resume
 from .launchpad import Checkbox, Fader, Launchpad, Selector
+from .layer_schedule import schedule_layers
+from .loader import FileLoader
+from .midi_output import DEFAULT_BYTE_RATE, DEFAULT_MESSAGE_RATE
 from .pagelayout import PageLayout
-from .settings import PersistentVar, get_axidraw_config, get_setting
+from .plot_worker import IDLE, PAUSED, PLOTTING, PlotJob, PlotWorker
+from .preview import PreviewViewer
+from .settings import (
+    PersistentVar,
+    flush_config,
+    get_axidraw_config,
+    get_layer_config,
+    get_layer_order,
+    get_setting,
+)
+from .signal import live_slot_count
 
 CONFIG_SETTINGS = {
     "pen_rate_lower": ("Pen rate lower:", 50),
@@ -42,9 +60,19 @@ PALETTE = [
     ("center", "white,bold", "dark green"),
     ("no_fit", "dark magenta,bold", "light gray"),
     ("fit", "white,bold", "dark magenta"),
+    ("no_optimize", "brown,bold", "light gray"),
+    ("optimize", "white,bold", "brown"),
 ]
 PALETTE += FILE_SELECTOR_PALETTE
 
+PLOT_KEY = 98
+CANCEL_KEY = 89
+RESUME_KEY = 79
+LOADING_KEYS = [91, 92, 93, 94]
+PREFETCH_COUNT = 3
+METRICS_INTERVAL = 1  # seconds
+METER = 100 * vp.convert_length("1cm")
+
 
 class PersistentFader(Fader):
     def __init__(self, name: str, default: Any, *args, **kwargs):
@@ -101,9 +129,29 @@ class PersistentCheckbox(Checkbox):
 
 
 def main():
+    backend = get_backend(get_setting("backend", "axidraw"))
+    axy = backend.axy
+    if hasattr(axy, "realtime_factor"):
+        # simulator only: 1 plots in real time, 0 or empty as fast as possible
+        axy.realtime_factor = float(get_setting("realtime_factor", "") or 0) or None
+    trace_file = get_setting("trace_file", "")
+    if trace_file:
+        axy = TracedAxy(axy, Tracer(trace_file))
+
     aloop = asyncio.get_event_loop()
-    lp = Launchpad(aloop, get_setting("input_port"), get_setting("output_port"))
+    lp = Launchpad(
+        aloop,
+        get_setting("input_port"),
+        get_setting("output_port"),
+        float(get_setting("midi_message_rate", DEFAULT_MESSAGE_RATE)),
+        float(get_setting("midi_byte_rate", DEFAULT_BYTE_RATE)),
+    )
+    # status LEDs are drawn on the main scene, so that they don't show through other
+    # scenes (e.g. the file selector's page keys) while those are active
+    main_scene = lp.scene
     pl = PageLayout()
+    pl.layer_order = get_layer_order()
+    layer_config = get_layer_config()
 
     page_format_selector = PersistentSelector(
         "page_format",
@@ -140,6 +188,13 @@ def main():
     pl.fit_to_page = fit_to_page_check.value
     pl.margin = margin_selector.value
 
+    merge_check = PersistentCheckbox("merge", False, lp, 21, 9, 0)
+    sort_check = PersistentCheckbox("sort", False, lp, 22, 9, 0)
+    simplify_check = PersistentCheckbox("simplify", False, lp, 23, 9, 0)
+    pl.merge = merge_check.value
+    pl.sort = sort_check.value
+    pl.simplify = simplify_check.value
+
     txt = urwid.Text("")
     txt2 = urwid.Text("")
     txt3 = urwid.Text("")
@@ -163,33 +218,171 @@ def main():
             dividechars=1,
         )
     )
+    load_txt = urwid.Text("")
+    load_progress = urwid.ProgressBar("progress", "progress_completed")
+    optimization = urwid.Padding(
+        urwid.Columns(
+            [
+                merge_check.make_widget(
+                    "Merge: ON", "Merge: OFF", "optimize", "no_optimize"
+                ),
+                sort_check.make_widget(
+                    "Sort: ON", "Sort: OFF", "optimize", "no_optimize"
+                ),
+                simplify_check.make_widget(
+                    "Simplify: ON", "Simplify: OFF", "optimize", "no_optimize"
+                ),
+            ],
+            dividechars=1,
+        )
+    )
+    pen_up_txt = urwid.Text("")
+    estimate_txt = urwid.Text("")
+    plot_txt = urwid.Text("")
+    plot_progress = urwid.ProgressBar("progress", "progress_completed")
+    up_next_txt = urwid.Text("")
+    midi_txt = urwid.Text("")
     fill = urwid.Filler(
-        urwid.Pile([txt, txt2, txt3, txt4, page_layout]),
+        urwid.Pile(
+            [
+                txt,
+                txt2,
+                txt3,
+                txt4,
+                page_layout,
+                optimization,
+                pen_up_txt,
+                estimate_txt,
+                load_txt,
+                load_progress,
+                plot_txt,
+                plot_progress,
+                up_next_txt,
+                midi_txt,
+            ]
+        ),
         "top",
     )
 
     def axy_print(s):
-        txt2.set_text(s)
+        # called on the plot worker's thread
+        aloop.call_soon_threadsafe(txt2.set_text, s)
+
+    # plot time estimation and plot preparation: the laid out paths and their geometry
+    # are computed in the background whenever the layout changes, so that plotting
+    # starts right away (including for a file loaded "up next" while plotting). The
+    # estimate itself is cheap and updated on fader changes.
+    axy_options = {}
+    plot_geometry: Optional[PlotGeometry] = None
+    geometry_generation = 0
+    prepare_task: Optional[asyncio.Task] = None
+
+    def update_estimate():
+        if plot_geometry is None:
+            estimate_txt.set_text("")
+            return
+
+        estimate = plot_geometry.estimate(
+            MotionSettings.from_options(axy_options),
+            {
+                step.layer_id: step.motion_settings(axy_options)
+                for step in plot_schedule(plot_geometry.layers)
+            },
+        )
+        layer_times = " ".join(
+            f"L{layer_id}: {format_duration(t)}"
+            for layer_id, t in estimate.layers.items()
+        )
+        estimate_txt.set_text(
+            f"Estimated time: {format_duration(estimate.total)} ({layer_times})"
+        )
+
+    def plot_schedule(layer_ids):
+        return schedule_layers(layer_ids, axy_options, layer_config)
+
+    def update_up_next():
+        job = worker.job
+        if job is None or not pl.path or pl.path == job.name:
+            up_next_txt.set_text("")
+        elif prepare_task is not None and prepare_task.done():
+            up_next_txt.set_text(f"Up next: {pl.path} (ready)")
+        else:
+            up_next_txt.set_text(f"Up next: {pl.path} (preparing...)")
+
+    def prepare_plot(snapshot: PageLayout):
+        paths = snapshot.get_plot_paths()
+        return paths, (PlotGeometry(paths) if paths else None)
+
+    async def rebuild_geometry():
+        nonlocal plot_geometry, geometry_generation
+        geometry_generation += 1
+        generation = geometry_generation
+        estimate_txt.set_text("Estimating...")
+        update_up_next()
+        # pl keeps changing on the loop while the snapshot is laid out
+        path, layout, snapshot = pl.path, pl.layout, pl.snapshot()
+        paths, geometry = await aloop.run_in_executor(None, prepare_plot, snapshot)
+        if generation == geometry_generation:
+            plot_geometry = geometry
+            update_estimate()
+        return path, paths, layout
+
+    def invalidate_geometry():
+        nonlocal prepare_task
+        prepare_task = aloop.create_task(rebuild_geometry())
+        prepare_task.add_done_callback(lambda task: update_up_next())
+
+    # all plotter commands run on the plot worker's thread
+    worker = PlotWorker(aloop, axy)
+
+    def set_axy_option(option, value):
+        # applied once the current plot stops, if any
+        worker.run(lambda: axy.set_option(option, value), force=True)
+        axy_options[option] = value
+        update_estimate()
+
+    for check in (
+        landscape_check,
+        rotate_check,
+        center_check,
+        fit_to_page_check,
+        merge_check,
+        sort_check,
+        simplify_check,
+    ):
+        check.on_value_change.connect(lambda val: invalidate_geometry())
+    page_format_selector.on_value_change.connect(lambda val: invalidate_geometry())
+    margin_selector.on_value_change.connect(lambda val: invalidate_geometry())
 
     # init axy
-    set_print_callback(axy_print)
+    if hasattr(backend, "set_print_callback"):
+        backend.set_print_callback(axy_print)
     for k, v in get_axidraw_config().items():
-        axy.set_option(k, v)
+        set_axy_option(k, v)
 
-    async def watch_svg():
-        async for changes in awatch(get_setting("svg_dir")):
-            txt4.set_text(str(changes))
+    async def show_midi_metrics():
+        while True:
+            midi_txt.set_text(
+                f"MIDI out: queue={lp.output.depth}, {lp.output.metrics} | "
+                f"slots: {live_slot_count()}"
+            )
+            await asyncio.sleep(METRICS_INTERVAL)
 
     def print_event(msg):
         txt.set_text(str(msg))
 
+    # plots are journaled, and an unfinished plot from the last session (crash, power
+    # loss) can be resumed
+    journal = JobJournal(get_setting("journal_file", JOURNAL_PATH))
+    resume_offered = journal.load() is not None
+
     # noinspection PyUnusedLocal
     def exit_to_shell():
-        axy.shutdown()
         raise urwid.ExitMainLoop()
 
     def shutdown():
-        axy.shutdown()
+        worker.cancel()
+        worker.run(axy.shutdown, force=True)
 
     def print_value(value):
         txt3.set_text(str(value))
@@ -201,12 +394,185 @@ def main():
     loop = urwid.MainLoop(
         fill, palette=PALETTE, event_loop=urwid.AsyncioEventLoop(loop=aloop)
     )
-    aloop.create_task(watch_svg())
+    # a single watcher of the SVG directory, shared by all users
+    svg_watcher = DirWatcher(aloop, get_setting("svg_dir"))
+    svg_watcher.on_changes.connect(lambda changes: txt4.set_text(str(changes)))
+    aloop.create_task(show_midi_metrics())
 
     # setup file selector
-    file_selector = FileSelector(loop, lp, get_setting("svg_dir"))
+    file_selector = FileSelector(loop, lp, get_setting("svg_dir"), svg_watcher)
     file_selector.on_accept.connect(select_file)
-    file_selector.on_accept.connect(lambda path: setattr(pl, "path", path))
+
+    # load files in the background
+    loader = FileLoader(
+        aloop, cache_budget=int(get_setting("cache_budget_mb", "256")) * 1024 * 1024
+    )
+    file_selector.on_accept.connect(loader.load)
+    file_selector.on_files_changed.connect(
+        lambda paths: loader.prefetch(paths[:PREFETCH_COUNT])
+    )
+
+    def update_plot_keys():
+        if worker.state == PLOTTING:
+            main_scene.set_key_color(PLOT_KEY, ORANGE)
+        elif worker.state == PAUSED and worker.job and worker.job.pen_change:
+            main_scene.set_key_color(PLOT_KEY, ORANGE, mode="blink")
+        elif worker.state == PAUSED:
+            main_scene.set_key_color(PLOT_KEY, GREEN, mode="blink")
+        elif loader.loading:
+            main_scene.set_key_color(PLOT_KEY, RED)
+        else:
+            main_scene.set_key_color(PLOT_KEY, GREEN, mode="pulse")
+        main_scene.set_key_color(
+            CANCEL_KEY, RED if worker.state != IDLE or resume_offered else 0
+        )
+        if resume_offered and worker.state == IDLE:
+            main_scene.set_key_color(RESUME_KEY, ORANGE, mode="blink")
+        else:
+            main_scene.set_key_color(RESUME_KEY, 0)
+
+    def load_started(path):
+        load_txt.set_text(f"Loading {path}...")
+        load_progress.set_completion(0)
+        update_plot_keys()
+
+    def load_progress_changed(path, fraction):
+        load_progress.set_completion(fraction * 100)
+        lit_count = round(fraction * len(LOADING_KEYS))
+        main_scene.set_keys_color(
+            [
+                (key, 127, 64, 0) if i < lit_count else (key, 0, 0, 0)
+                for i, key in enumerate(LOADING_KEYS)
+            ]
+        )
+
+    def load_finished(message):
+        load_txt.set_text(message)
+        main_scene.set_keys_color([(key, 0, 0, 0) for key in LOADING_KEYS])
+        update_plot_keys()
+
+    loader.on_started.connect(load_started)
+    loader.on_progress.connect(load_progress_changed)
+    loader.on_loaded.connect(pl.set_vector_data)
+    loader.on_loaded.connect(lambda path, vd: update_optimization())
+    loader.on_loaded.connect(lambda path, vd: invalidate_geometry())
+    loader.on_loaded.connect(lambda path, vd: load_finished(f"Loaded: {path}"))
+    loader.on_failed.connect(lambda path, exc: load_finished(f"Failed: {path} ({exc})"))
+
+    async def report_pen_up(futures):
+        await asyncio.gather(
+            *(asyncio.wrap_future(f) for f in futures), return_exceptions=True
+        )
+        report = pl.pen_up_report()
+        if report is not None:
+            before, after = (d / METER for d in report)
+            pen_up_txt.set_text(f"Pen-up distance: {before:.2f}m -> {after:.2f}m")
+
+    def update_optimization():
+        futures = pl.optimize()
+        if futures:
+            pen_up_txt.set_text("Optimizing...")
+            aloop.create_task(report_pen_up(futures))
+        else:
+            pen_up_txt.set_text("")
+
+    merge_check.on_value_change.connect(lambda val: setattr(pl, "merge", val))
+    sort_check.on_value_change.connect(lambda val: setattr(pl, "sort", val))
+    simplify_check.on_value_change.connect(lambda val: setattr(pl, "simplify", val))
+    for check in (merge_check, sort_check, simplify_check):
+        check.on_value_change.connect(lambda val: update_optimization())
+
+    async def start_plot():
+        nonlocal resume_offered
+        if prepare_task is None:
+            invalidate_geometry()
+        try:
+            path, paths, layout = await prepare_task
+        except Exception as exc:
+            plot_txt.set_text(f"Cannot plot: {exc}")
+            return
+        if not paths:
+            return
+        try:
+            hash_ = await aloop.run_in_executor(None, file_hash, path)
+        except OSError as exc:
+            logging.warning(f"could not hash {path}: {exc}")
+            hash_ = ""
+        if worker.plot(PlotJob(path, paths, schedule=plot_schedule(paths))):
+            resume_offered = False
+            journal.start(
+                path, hash_, layout, [(lid, len(lines)) for lid, lines in paths.items()]
+            )
+
+    async def resume_plot():
+        nonlocal resume_offered
+        entry = journal.entry
+        plot_txt.set_text(f"Preparing to resume {entry.describe()}...")
+        try:
+            paths = await aloop.run_in_executor(None, prepare_resume, entry)
+        except (OSError, ValueError) as exc:
+            plot_txt.set_text(f"Cannot resume: {exc}")
+            return
+        job = PlotJob(
+            entry.file, paths, position=entry.position, schedule=plot_schedule(paths)
+        )
+        if resume_offered and worker.plot(job):
+            resume_offered = False
+            journal.resume()
+
+    def resume():
+        if resume_offered and worker.state == IDLE:
+            aloop.create_task(resume_plot())
+
+    def cancel():
+        nonlocal resume_offered
+        if resume_offered and worker.state == IDLE:
+            resume_offered = False
+            journal.finish()
+            plot_txt.set_text("")
+            update_plot_keys()
+        else:
+            worker.cancel()
+
+    def plot():
+        if worker.state == PLOTTING:
+            worker.pause()
+        elif worker.state == PAUSED:
+            worker.resume()
+        elif not loader.loading:
+            aloop.create_task(start_plot())
+
+    def plot_state_changed(state):
+        loader.suspend_prefetch(state == PLOTTING)
+        update_plot_keys()
+        update_up_next()
+        job = worker.job
+        if state == IDLE:
+            journal.finish()
+            plot_txt.set_text("")
+            # back to the global options after per-layer ones
+            for k, v in axy_options.items():
+                worker.run(lambda k=k, v=v: axy.set_option(k, v))
+        elif state == PAUSED:
+            if job is not None:
+                journal.pause(job.position, job.resume_svg)
+            if job is not None and job.pen_change is not None:
+                pen = job.pen_change.pen or "next pen"
+                plot_txt.set_text(
+                    f"Change pen for layer {job.pen_change.layer_id} ({pen}), then "
+                    "press plot"
+                )
+            else:
+                plot_txt.set_text("Plot paused")
+
+    def plot_progress_changed(done, total):
+        journal.progress(done)
+        plot_txt.set_text(f"Plotting: {done}/{total} lines")
+        plot_progress.set_completion(100 * done / total if total else 100)
+
+    worker.on_state_changed.connect(plot_state_changed)
+    worker.on_progress.connect(plot_progress_changed)
+    worker.on_error.connect(lambda exc: plot_txt.set_text(f"Plotter error: {exc}"))
 
     # setup HW UX
     pen_up_fader = PersistentFader(
@@ -220,8 +586,8 @@ def main():
         max_value=80,
     )
     pen_up_fader.on_value_changed.connect(print_value)
-    axy.set_option("pen_pos_up", pen_up_fader.value)
-    pen_up_fader.on_value_changed.connect(lambda val: axy.set_option("pen_pos_up", val))
+    set_axy_option("pen_pos_up", pen_up_fader.value)
+    pen_up_fader.on_value_changed.connect(lambda val: set_axy_option("pen_pos_up", val))
 
     pen_down_fader = PersistentFader(
         "pen_down_pos",
@@ -234,9 +600,9 @@ def main():
         max_value=80,
     )
     pen_down_fader.on_value_changed.connect(print_value)
-    axy.set_option("pen_pos_down", pen_down_fader.value)
+    set_axy_option("pen_pos_down", pen_down_fader.value)
     pen_down_fader.on_value_changed.connect(
-        lambda val: axy.set_option("pen_pos_down", val)
+        lambda val: set_axy_option("pen_pos_down", val)
     )
 
     speed_pendown_fader = PersistentFader(
@@ -250,9 +616,9 @@ def main():
         max_value=100,
     )
     speed_pendown_fader.on_value_changed.connect(print_value)
-    axy.set_option("speed_pendown", speed_pendown_fader.value)
+    set_axy_option("speed_pendown", speed_pendown_fader.value)
     speed_pendown_fader.on_value_changed.connect(
-        lambda val: axy.set_option("speed_pendown", val)
+        lambda val: set_axy_option("speed_pendown", val)
     )
 
     accel_fader = PersistentFader(
@@ -266,18 +632,25 @@ def main():
         max_value=100,
     )
     accel_fader.on_value_changed.connect(print_value)
-    axy.set_option("accel", accel_fader.value)
-    accel_fader.on_value_changed.connect(lambda val: axy.set_option("accel", val))
+    set_axy_option("accel", accel_fader.value)
+    accel_fader.on_value_changed.connect(lambda val: set_axy_option("accel", val))
 
     lp.on_raw_event.connect(print_event)
 
     lp.set_key_color(69, PURPLE)
-    lp.on_key_press(69).connect(lambda key: axy.pen_up())
+    lp.on_key_press(69).connect(lambda key: worker.run(axy.pen_up))
     lp.set_key_color(59, PURPLE)
-    lp.on_key_press(59).connect(lambda key: axy.pen_down())
-
-    lp.set_key_color(98, GREEN, mode="pulse")
-    lp.on_key_press(98).connect(lambda key: axy.plot_svg(pl.get_plot_svg()))
+    lp.on_key_press(59).connect(lambda key: worker.run(axy.pen_down))
+
+    update_plot_keys()
+    lp.on_key_press(PLOT_KEY).connect(lambda key: plot())
+    lp.on_key_press(CANCEL_KEY).connect(lambda key: cancel())
+    lp.on_key_press(RESUME_KEY).connect(lambda key: resume())
+    if resume_offered:
+        plot_txt.set_text(
+            f"Unfinished plot: {journal.entry.describe()}. Move the carriage home and "
+            "press resume, or cancel to discard."
+        )
 
     lp.set_key_color(19, RED, mode="solid")
     lp.on_key_press(19).connect(lambda key: exit_to_shell())
@@ -292,7 +665,25 @@ def main():
 
     # use Keys key for preview
     lp.set_key_color(97, GREEN)
-    lp.on_key_press(97).connect(lambda key: pl.preview())
+    preview_viewer = PreviewViewer()
+
+    async def show_preview():
+        path = pl.path
+        image = await aloop.run_in_executor(None, pl.snapshot().preview)
+        if image is not None:
+            preview_viewer.show(image, path)
+
+    lp.on_key_press(97).connect(lambda key: aloop.create_task(show_preview()))
 
     loop.run()
+    worker.run(axy.shutdown, force=True)
+    worker.close()
+    journal.close()
+    file_selector.index.close()
+    loader.close()
+    pl.close()
+    svg_watcher.close()
+    preview_viewer.close()
     lp.clear_all()
+    lp.close()
+    flush_config()
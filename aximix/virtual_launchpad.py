@@ -0,0 +1,127 @@
+"""In-memory Launchpad, usable as ``Launchpad(..., backend=VirtualLaunchpad())``.
+
+Outgoing sysex messages are recorded and LED updates decoded into a grid state, while
+key presses can be injected as if they came from the device.
+"""
+
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import attr
+import mido
+
+from .launchpad import ALL_KEYS, LED_DATA_LENGTH, SET_LED_PREAMBLE
+
+# the top row and right column are control change buttons, the grid sends notes
+CONTROL_KEYS = {key for key in ALL_KEYS if key > 90 or key % 10 == 9}
+
+
+@attr.s(auto_attribs=True)
+class LEDUpdate:
+    mode: int
+    data: Tuple[int, ...]
+    time: float  # time.perf_counter() when received
+
+
+class _VirtualInput:
+    def __init__(self, device: "VirtualLaunchpad", callback: Callable):
+        self._device = device
+        self.callback = callback
+
+    def close(self):
+        self._device._input = None
+
+
+class _VirtualOutput:
+    def __init__(self, device: "VirtualLaunchpad"):
+        self._device = device
+
+    def send(self, message: mido.Message) -> None:
+        self._device._receive(message)
+
+    def close(self):
+        pass
+
+
+class VirtualLaunchpad:
+    """Stand-in for ``mido`` which emulates a Launchpad in programmer mode."""
+
+    def __init__(self):
+        self.grid: Dict[int, LEDUpdate] = {}
+        self.messages: List[Tuple[float, mido.Message]] = []
+        self.byte_count = 0
+
+        self._input: Optional[_VirtualInput] = None
+        self._waiters: Dict[Optional[int], List[asyncio.Future]] = {}
+
+    # mido interface
+
+    def open_input(self, name: str = "", callback: Optional[Callable] = None):
+        self._input = _VirtualInput(self, callback)
+        return self._input
+
+    def open_output(self, name: str = ""):
+        return _VirtualOutput(self)
+
+    # device emulation
+
+    @property
+    def message_count(self) -> int:
+        return len(self.messages)
+
+    def color(self, key: int) -> Optional[Tuple[int, ...]]:
+        """Color data currently shown by ``key``, if it was ever set."""
+        update = self.grid.get(key)
+        return None if update is None else update.data
+
+    def reset_counters(self) -> None:
+        self.messages.clear()
+        self.byte_count = 0
+
+    def press(self, key: int, release: bool = True) -> None:
+        """Inject a key press (and release) as if it came from the device. Like mido's,
+        the input callback may be called from any thread."""
+        if self._input is None or self._input.callback is None:
+            raise RuntimeError("no input opened")
+        if key in CONTROL_KEYS:
+            messages = [mido.Message("control_change", control=key, value=127)]
+            if release:
+                messages.append(mido.Message("control_change", control=key, value=0))
+        else:
+            messages = [mido.Message("note_on", note=key, velocity=127)]
+            if release:
+                messages.append(mido.Message("note_on", note=key, velocity=0))
+        for message in messages:
+            self._input.callback(message)
+
+    def wait_for_update(self, key: Optional[int] = None) -> "asyncio.Future[float]":
+        """Return a future resolved with the receive time of the next update of
+        ``key`` (of any key if None). Must be called from the event loop."""
+        future = asyncio.get_event_loop().create_future()
+        self._waiters.setdefault(key, []).append(future)
+        return future
+
+    def _receive(self, message: mido.Message) -> None:
+        now = time.perf_counter()
+        self.messages.append((now, message))
+        self.byte_count += len(message.bin())
+
+        data = list(message.data) if message.type == "sysex" else []
+        preamble_length = len(SET_LED_PREAMBLE)
+        if data[:preamble_length] != SET_LED_PREAMBLE:
+            return
+
+        i = preamble_length
+        while i + 1 < len(data):
+            mode, key = data[i], data[i + 1]
+            length = LED_DATA_LENGTH.get(mode)
+            if length is None:
+                break
+            self.grid[key] = LEDUpdate(mode, tuple(data[i + 2 : i + 2 + length]), now)
+            i += 2 + length
+
+            for waiter_key in (key, None):
+                for future in self._waiters.pop(waiter_key, []):
+                    if not future.done():
+                        future.set_result(now)
@@ -0,0 +1,12 @@
+import importlib
+from types import ModuleType
+
+BACKENDS = ["axidraw", "stub", "simulator"]
+
+
+def get_backend(name: str) -> ModuleType:
+    """Import a backend module by name. Each backend module provides an ``Axy`` class
+    and an ``axy`` instance, and optionally ``set_print_callback()``."""
+    if name not in BACKENDS:
+        raise ValueError(f"backend {name} invalid (available: {', '.join(BACKENDS)})")
+    return importlib.import_module(f"{__name__}.{name}")
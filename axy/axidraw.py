@@ -1,25 +1,120 @@
+import logging
+from typing import Callable, Iterable, Mapping, Optional, TypeVar
+
+import numpy as np
+
 # noinspection PyUnresolvedReferences
 from pyaxidraw import axidraw
 
+from .kinematics import PX_PER_INCH
+
+PAUSED_ERROR_CODE = 102  # pyaxidraw's code for a plot stopped by the pause button
+
+ResultType = TypeVar("ResultType")
+
 
 class Axy:
-    def __init__(self):
+    """AxiDraw wrapper.
+
+    In session mode (the default), manual commands and path plotting share a single
+    interactive connection which is kept open, and only changed options are sent to the
+    board. The connection is re-established if the board drops off: pyaxidraw only
+    prints an error when the port is lost, so the port is checked around each command.
+    Otherwise, each command goes through a full ``plot_setup()``/``plot_run()`` cycle.
+    """
+
+    def __init__(self, session: bool = True):
         self._options = {}
+        self._session_mode = session
+        self._connected = False
+        self._options_dirty = False
         self.ad = axidraw.AxiDraw()
 
     def __del__(self):
         self.shutdown()
 
     def set_option(self, option, value):
+        if self._options.get(option) != value:
+            self._options_dirty = True
         self._options[option] = value
 
     def _apply_options(self):
         for k, v in self._options.items():
             setattr(self.ad.options, k, v)
 
+    def _port_alive(self) -> bool:
+        """Whether the interactive session's serial port is still usable."""
+        if not getattr(self.ad, "connected", True):
+            return False
+        # newer pyaxidraw releases keep the port in plot_status, older ones on the object
+        plot_status = getattr(self.ad, "plot_status", None)
+        if plot_status is not None and hasattr(plot_status, "port"):
+            port = plot_status.port
+        elif hasattr(self.ad, "serial_port"):
+            port = self.ad.serial_port
+        else:
+            return True
+        return port is not None and getattr(port, "is_open", True)
+
+    def _check_port(self) -> None:
+        if not self._port_alive():
+            self.disconnect()
+            raise RuntimeError("AxiDraw connection lost")
+
+    def _connect(self) -> None:
+        """Open the interactive session if needed, or push pending option changes."""
+        if self._connected and not self._port_alive():
+            logging.warning("AxiDraw session lost, reconnecting")
+            self.disconnect()
+        if not self._connected:
+            self.ad.interactive()
+            self._apply_options()
+            self.ad.options.units = 0  # inches
+            if not self.ad.connect():
+                raise RuntimeError("could not connect to the AxiDraw")
+            self._connected = True
+        elif self._options_dirty:
+            self._apply_options()
+            self.ad.update()
+        self._options_dirty = False
+
+    def disconnect(self) -> None:
+        """Close the interactive session, if any."""
+        if self._connected:
+            self._connected = False
+            try:
+                self.ad.disconnect()
+            except Exception as exc:
+                logging.info(f"error while disconnecting: {exc}")
+
+    def _run_in_session(self, func: Callable[[], ResultType]) -> ResultType:
+        """Run ``func`` in the interactive session, reconnecting once if (re)opening
+        the session fails, e.g. after the board dropped off.
+
+        Errors raised by ``func``, or the port being lost while it runs, are not
+        retried, since the carriage may already have moved: the session is closed and
+        the next command reconnects.
+        """
+        try:
+            self._connect()
+        except Exception as exc:
+            logging.warning(f"AxiDraw session lost ({exc}), reconnecting")
+            self.disconnect()
+            self._connect()
+        try:
+            result = func()
+        except Exception:
+            self.disconnect()
+            raise
+        self._check_port()
+        return result
+
     def walk_x(self, x: float):
         if x == 0:
             return
+        if self._session_mode:
+            self._run_in_session(lambda: self.ad.go(x, 0))
+            return
         self.ad.plot_setup()
         self._apply_options()
         self.ad.options.mode = "manual"
@@ -30,6 +125,9 @@ class Axy:
     def walk_y(self, y: float):
         if y == 0:
             return
+        if self._session_mode:
+            self._run_in_session(lambda: self.ad.go(0, y))
+            return
         self.ad.plot_setup()
         self._apply_options()
         self.ad.options.mode = "manual"
@@ -37,14 +135,85 @@ class Axy:
         self.ad.options.walk_dist = y
         self.ad.plot_run()
 
-    def plot_svg(self, svg: str):
+    def plot_svg(self, svg: str, resume: bool = False) -> Optional[str]:
+        """Plot a SVG in plot mode. If the plot is paused with the hardware button, the
+        output SVG (which contains pyaxidraw's resume data) is returned and can be passed
+        back with ``resume=True``. Returns None otherwise."""
+        # plot mode opens its own connection
+        self.disconnect()
         self.ad.plot_setup(svg)
         self._apply_options()
-        self.ad.options.mode = "plot"
+        self.ad.options.mode = "res_plot" if resume else "plot"
         self.ad.options.auto_rotate = False
-        self.ad.plot_run()
+        output = self.ad.plot_run(True)
+        error_code = getattr(getattr(self.ad, "errors", None), "code", None)
+        return output if error_code == PAUSED_ERROR_CODE else None
+
+    def plot_paths(
+        self,
+        layers: Mapping[int, Iterable[np.ndarray]],
+        start: int = 0,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
+        home: bool = True,
+    ) -> int:
+        """Plot polylines (complex arrays in CSS pixels) layer by layer through the
+        interactive API, bypassing SVG serialisation and parsing.
+
+        Lines are counted across layers. The first ``start`` lines are skipped, which
+        allows resuming an interrupted plot. ``should_stop`` is polled between lines; if
+        it returns True, the pen is raised and the plot interrupted. ``on_progress`` is
+        called with the number of lines done and the total line count. Unless ``home``
+        is set, the carriage stays at the end of the last line, e.g. when more layers
+        follow.
+
+        Returns the number of lines done, i.e. the total line count unless interrupted.
+        """
+        layers = {layer_id: list(lines) for layer_id, lines in layers.items()}
+        total = sum(len(lines) for lines in layers.values())
+
+        if self._session_mode:
+            self._run_in_session(lambda: None)
+        else:
+            self._connect()
+
+        index = 0
+        try:
+            for lines in layers.values():
+                for line in lines:
+                    if index < start:
+                        index += 1
+                        continue
+                    if should_stop is not None and should_stop():
+                        self.ad.penup()
+                        return index
+
+                    points = (np.asarray(line) / PX_PER_INCH).tolist()
+                    if points:
+                        self.ad.moveto(points[0].real, points[0].imag)
+                        # single points are plotted as a zero-length line
+                        for p in points[1:] or points:
+                            self.ad.lineto(p.real, p.imag)
+                    # the line is redone on resume if the port was lost while plotting
+                    self._check_port()
+                    index += 1
+                    if on_progress is not None:
+                        on_progress(index, total)
+            if home:
+                self.ad.moveto(0, 0)
+            else:
+                self.ad.penup()
+        except Exception:
+            # lines done so far were reported, the plot is resumed from there
+            self.disconnect()
+            raise
+        finally:
+            if not self._session_mode:
+                self.disconnect()
+        return index
 
     def shutdown(self):
+        self.disconnect()
         self.ad.plot_setup()
         self._apply_options()
         self.ad.options.mode = "manual"
@@ -52,6 +221,9 @@ class Axy:
         self.ad.plot_run()
 
     def pen_up(self):
+        if self._session_mode:
+            self._run_in_session(self.ad.penup)
+            return
         self.ad.plot_setup()
         self._apply_options()
         self.ad.options.mode = "toggle"
@@ -60,6 +232,9 @@ class Axy:
         self.ad.plot_run()
 
     def pen_down(self):
+        if self._session_mode:
+            self._run_in_session(self.ad.pendown)
+            return
         self.ad.plot_setup()
         self._apply_options()
         self.ad.options.mode = "toggle"
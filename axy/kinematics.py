@@ -0,0 +1,233 @@
+"""Approximate AxiDraw motion model, used to estimate plot durations.
+
+Geometry is expected in CSS pixels (1/96 inch) as used by SVG and vpype. The relatively
+expensive geometric pre-processing is done once in :class:`PlotGeometry`, so that
+estimates can be recomputed cheaply when the motion settings change.
+"""
+
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+import attr
+import numpy as np
+
+PX_PER_INCH = 96.0
+
+# see pyaxidraw's axidraw_conf.py
+SPEED_LIM_XY = 8.6979  # in/s, maximum XY speed (high resolution mode)
+ACCEL_RATE = 40.0  # in/s^2, pen-down acceleration at 100%
+ACCEL_RATE_PU = 60.0  # in/s^2, pen-up acceleration at 100%
+MIN_SPEED = 0.01  # in/s, avoids divisions by zero
+
+
+@attr.s(auto_attribs=True)
+class MotionSettings:
+    """Subset of the AxiDraw options which affect the plot duration."""
+
+    speed_pendown: float = 25
+    speed_penup: float = 75
+    accel: float = 75
+    pen_pos_up: float = 60
+    pen_pos_down: float = 30
+    pen_rate_raise: float = 75
+    pen_rate_lower: float = 50
+    pen_delay_up: float = 0
+    pen_delay_down: float = 0
+    const_speed: bool = False
+
+    @classmethod
+    def from_options(cls, options: Mapping[str, Any]) -> "MotionSettings":
+        names = {a.name for a in attr.fields(cls)}
+        return cls(**{k: v for k, v in options.items() if k in names})
+
+    @property
+    def pen_raise_time(self) -> float:
+        """Time (s) to raise the pen, including the delay."""
+        distance = abs(self.pen_pos_up - self.pen_pos_down)
+        ms = 1000.0 * distance / max(self.pen_rate_raise, 1) + self.pen_delay_up
+        return max(ms, 0) / 1000.0
+
+    @property
+    def pen_lower_time(self) -> float:
+        """Time (s) to lower the pen, including the delay."""
+        distance = abs(self.pen_pos_up - self.pen_pos_down)
+        ms = 1000.0 * distance / max(self.pen_rate_lower, 1) + self.pen_delay_down
+        return max(ms, 0) / 1000.0
+
+
+def trapezoid_time(
+    lengths: np.ndarray,
+    v_max: float,
+    accel: float,
+    v_start: Optional[np.ndarray] = None,
+    v_end: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Duration of moves along segments of given lengths with a trapezoidal velocity
+    profile. Entry/exit velocities default to zero and are clamped to what the
+    acceleration allows."""
+    lengths = np.asarray(lengths, dtype=float)
+    v_max = max(v_max, MIN_SPEED)
+    if accel <= 0:
+        return lengths / v_max
+
+    v0 = np.zeros_like(lengths) if v_start is None else np.minimum(v_start, v_max)
+    v1 = np.zeros_like(lengths) if v_end is None else np.minimum(v_end, v_max)
+    v1 = np.minimum(v1, np.sqrt(v0**2 + 2 * accel * lengths))
+    v0 = np.minimum(v0, np.sqrt(v1**2 + 2 * accel * lengths))
+
+    v_peak = np.minimum(v_max, np.sqrt(accel * lengths + (v0**2 + v1**2) / 2))
+    accel_dist = (2 * v_peak**2 - v0**2 - v1**2) / (2 * accel)
+    cruise_time = np.maximum(lengths - accel_dist, 0) / np.maximum(v_peak, MIN_SPEED)
+    return (2 * v_peak - v0 - v1) / accel + cruise_time
+
+
+def travel_time(distances: np.ndarray, settings: MotionSettings) -> np.ndarray:
+    """Duration of pen-up moves (distances in inches) from rest to rest."""
+    return trapezoid_time(
+        distances,
+        SPEED_LIM_XY * settings.speed_penup / 100,
+        ACCEL_RATE_PU * settings.accel / 100,
+    )
+
+
+class LayerGeometry:
+    """Pre-processed geometry of one layer, whose plot starts at ``start`` (in CSS
+    pixels).
+
+    Junction speeds at polyline vertices are approximated with a cornering factor
+    ranging from 1 (straight) to 0 (reversal).
+    """
+
+    def __init__(self, lines: Iterable[np.ndarray], start: complex = 0j):
+        lines = [np.asarray(line) / PX_PER_INCH for line in lines if len(line) > 0]
+        self.line_count = len(lines)
+        self.start = start
+        self.end = lines[-1][-1] * PX_PER_INCH if lines else start
+
+        if lines:
+            points = np.concatenate(lines)
+            line_ends = np.cumsum([len(line) for line in lines])
+            # a segment exists between consecutive points of the same line
+            is_segment = np.ones(len(points) - 1, dtype=bool)
+            is_segment[line_ends[:-1] - 1] = False
+            deltas = np.diff(points)
+
+            # cornering factor at the start of each segment (0 at line boundaries)
+            unit = deltas / np.maximum(np.abs(deltas), 1e-12)
+            cos_angle = (unit[1:] * np.conj(unit[:-1])).real
+            corner = np.zeros(len(deltas))
+            corner[1:] = np.where(
+                is_segment[:-1] & is_segment[1:], (1 + cos_angle) / 2, 0
+            )
+
+            self.lengths = np.abs(deltas[is_segment])
+            self.entry_factors = corner[is_segment]
+            exit_factors = np.zeros(len(deltas))
+            exit_factors[:-1] = corner[1:]
+            self.exit_factors = exit_factors[is_segment]
+            # index of the line each segment belongs to
+            point_lines = np.repeat(
+                np.arange(len(lines)), [len(line) for line in lines]
+            )
+            self.segment_lines = point_lines[:-1][is_segment]
+
+            start_inch = start / PX_PER_INCH
+            starts = np.array([start_inch] + [line[0] for line in lines])
+            ends = np.array([start_inch] + [line[-1] for line in lines])
+            self.pen_up_lengths = np.abs(starts[1:] - ends[:-1])
+        else:
+            self.lengths = np.zeros(0)
+            self.entry_factors = np.zeros(0)
+            self.exit_factors = np.zeros(0)
+            self.segment_lines = np.zeros(0, dtype=int)
+            self.pen_up_lengths = np.zeros(0)
+
+    @property
+    def segment_count(self) -> int:
+        return len(self.lengths)
+
+    @property
+    def pen_down_distance(self) -> float:
+        """Inches."""
+        return float(self.lengths.sum())
+
+    @property
+    def pen_up_distance(self) -> float:
+        """Inches."""
+        return float(self.pen_up_lengths.sum())
+
+    def line_times(self, settings: MotionSettings) -> np.ndarray:
+        """Duration in seconds of each line, including the pen-up travel to it and the
+        pen lowering/raising."""
+        v_down = SPEED_LIM_XY * settings.speed_pendown / 100
+
+        if settings.const_speed:
+            segment_times = self.lengths / max(v_down, MIN_SPEED)
+        else:
+            segment_times = trapezoid_time(
+                self.lengths,
+                v_down,
+                ACCEL_RATE * settings.accel / 100,
+                self.entry_factors * v_down,
+                self.exit_factors * v_down,
+            )
+        down_times = np.bincount(
+            self.segment_lines, weights=segment_times, minlength=self.line_count
+        )
+        up_times = travel_time(self.pen_up_lengths, settings)
+        pen_time = settings.pen_lower_time + settings.pen_raise_time
+        return down_times + up_times + pen_time
+
+    def estimate(self, settings: MotionSettings) -> float:
+        """Duration in seconds."""
+        return float(self.line_times(settings).sum())
+
+
+@attr.s(auto_attribs=True)
+class PlotEstimate:
+    total: float
+    layers: Dict[int, float]
+    pen_up_distance: float  # inches
+    pen_down_distance: float  # inches
+
+
+class PlotGeometry:
+    """Pre-processed geometry of a whole plot. Layers are plotted in order, starting
+    at ``start`` (in CSS pixels) and ending at the home position."""
+
+    def __init__(self, layers: Mapping[int, Iterable[np.ndarray]], start: complex = 0j):
+        self.layers: Dict[int, LayerGeometry] = {}
+        position = start
+        for layer_id, lines in layers.items():
+            geometry = LayerGeometry(lines, position)
+            self.layers[layer_id] = geometry
+            position = geometry.end
+        self.return_length = abs(position) / PX_PER_INCH
+
+    def estimate(
+        self,
+        settings: MotionSettings,
+        layer_settings: Optional[Mapping[int, MotionSettings]] = None,
+    ) -> PlotEstimate:
+        """Estimate the plot duration, with ``layer_settings`` overriding ``settings``
+        for some layers."""
+        layer_settings = layer_settings or {}
+        layer_times = {
+            layer_id: geometry.estimate(layer_settings.get(layer_id, settings))
+            for layer_id, geometry in self.layers.items()
+        }
+        return_time = float(travel_time(np.array([self.return_length]), settings)[0])
+        return PlotEstimate(
+            total=sum(layer_times.values()) + return_time,
+            layers=layer_times,
+            pen_up_distance=sum(g.pen_up_distance for g in self.layers.values())
+            + self.return_length,
+            pen_down_distance=sum(g.pen_down_distance for g in self.layers.values()),
+        )
+
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return (
+        f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+    )
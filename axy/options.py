@@ -0,0 +1,31 @@
+"""AxiDraw options, as checked by the virtual backends."""
+
+ALLOWABLE_OPTION = [
+    "speed_pendown",
+    "speed_penup",
+    "accel",
+    "pen_pos_down",
+    "pen_pos_up",
+    "pen_rate_lower",
+    "pen_rate_raise",
+    "pen_delay_down",
+    "pen_delay_up",
+    "const_speed",
+    "model",
+    "port",
+    "port_config",
+    # plot context
+    "mode",
+    "manual_cmd",
+    "walk_dist",
+    "layer",
+    "copies",
+    "page_delay",
+    "auto_rotate",
+    "preview",
+    "rendering",
+    "reordering",
+    "report_time",
+    # interactive context
+    "units",
+]
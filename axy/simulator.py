@@ -0,0 +1,167 @@
+"""Virtual plotter with simulated timing.
+
+Drop-in replacement for :mod:`axy.axidraw` which simulates the motion with the model of
+:mod:`axy.kinematics` instead of driving a board. Statistics (simulated plot time,
+pen-up distance and command count) are accumulated in :attr:`Axy.stats`. With a
+``realtime_factor``, calls also take the simulated time divided by that factor.
+"""
+
+import os
+import tempfile
+import time
+from typing import Callable, Iterable, Mapping, Optional
+
+import attr
+import numpy as np
+
+from .kinematics import (
+    PX_PER_INCH,
+    LayerGeometry,
+    MotionSettings,
+    format_duration,
+    travel_time,
+)
+from .options import ALLOWABLE_OPTION
+
+_sim_print = print
+
+
+def set_print_callback(cb):
+    global _sim_print
+    _sim_print = cb
+
+
+@attr.s(auto_attribs=True)
+class SimulationStats:
+    plot_time: float = 0.0  # seconds
+    pen_up_distance: float = 0.0  # inches
+    pen_down_distance: float = 0.0  # inches
+    command_count: int = 0
+
+    def __str__(self):
+        return (
+            f"time={format_duration(self.plot_time)}, "
+            f"pen_up={self.pen_up_distance * 0.0254:.2f}m, "
+            f"pen_down={self.pen_down_distance * 0.0254:.2f}m, "
+            f"commands={self.command_count}"
+        )
+
+
+class Axy:
+    def __init__(self, session: bool = True, realtime_factor: Optional[float] = None):
+        self._options = {}
+        self.realtime_factor = realtime_factor
+        self.position = 0j  # CSS pixels
+        self.stats = SimulationStats()
+
+    def set_option(self, option, value):
+        if option not in ALLOWABLE_OPTION:
+            raise ValueError(f"option {option} invalid")
+        self._options[option] = value
+
+    def reset_stats(self) -> SimulationStats:
+        """Reset the statistics, returning the previous ones."""
+        stats, self.stats = self.stats, SimulationStats()
+        return stats
+
+    def _settings(self) -> MotionSettings:
+        return MotionSettings.from_options(self._options)
+
+    def _elapse(self, seconds: float, command_count: int = 1) -> None:
+        self.stats.plot_time += seconds
+        self.stats.command_count += command_count
+        if self.realtime_factor:
+            time.sleep(seconds / self.realtime_factor)
+
+    def _travel_to(self, position: complex) -> None:
+        distance = abs(position - self.position) / PX_PER_INCH
+        self.position = position
+        self.stats.pen_up_distance += distance
+        self._elapse(float(travel_time(np.array([distance]), self._settings())[0]))
+
+    def disconnect(self):
+        pass
+
+    def walk_x(self, x: float):
+        self._travel_to(self.position + x * PX_PER_INCH)
+
+    def walk_y(self, y: float):
+        self._travel_to(self.position + 1j * y * PX_PER_INCH)
+
+    def pen_up(self):
+        self._elapse(self._settings().pen_raise_time)
+
+    def pen_down(self):
+        self._elapse(self._settings().pen_lower_time)
+
+    def shutdown(self):
+        pass
+
+    def plot_svg(self, svg: str, resume: bool = False) -> Optional[str]:
+        # the SVG is parsed just like pyaxidraw would have to
+        import vpype as vp
+
+        fd, path = tempfile.mkstemp(suffix=".svg")
+        try:
+            with os.fdopen(fd, "w") as fp:
+                fp.write(svg)
+            vector_data = vp.read_multilayer_svg(
+                path, vp.convert_length("0.05mm"), False
+            )
+        finally:
+            os.remove(path)
+
+        self.plot_paths(
+            {
+                layer_id: list(vector_data.layers[layer_id])
+                for layer_id in sorted(vector_data.layers)
+            }
+        )
+        return None
+
+    def plot_paths(
+        self,
+        layers: Mapping[int, Iterable[np.ndarray]],
+        start: int = 0,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
+        home: bool = True,
+    ) -> int:
+        lines = [np.asarray(line) for layer in layers.values() for line in layer]
+        total = len(lines)
+
+        settings = self._settings()
+        geometry = LayerGeometry(lines[start:], self.position)
+        line_times = geometry.line_times(settings)
+        line_lengths = np.bincount(
+            geometry.segment_lines,
+            weights=geometry.lengths,
+            minlength=geometry.line_count,
+        )
+        # one command per segment, plus pen-up move, pen lowering and raising
+        line_commands = 3 + np.bincount(
+            geometry.segment_lines, minlength=geometry.line_count
+        )
+
+        index = start
+        i = 0  # index in the geometry, which skips empty lines
+        for line in lines[start:]:
+            if should_stop is not None and should_stop():
+                return index
+            if len(line) > 0:
+                self.stats.pen_up_distance += geometry.pen_up_lengths[i]
+                self.stats.pen_down_distance += line_lengths[i]
+                self.position = line[-1]
+                self._elapse(float(line_times[i]), int(line_commands[i]))
+                i += 1
+            index += 1
+            if on_progress is not None:
+                on_progress(index, total)
+
+        if home:
+            self._travel_to(0j)
+        _sim_print(f"SIM: plot_paths(lines={total - start}) {self.stats}")
+        return index
+
+
+axy = Axy()
@@ -1,33 +1,4 @@
-ALLOWABLE_OPTION = [
-    "speed_pendown",
-    "speed_penup",
-    "accel",
-    "pen_pos_down",
-    "pen_pos_up",
-    "pen_rate_lower",
-    "pen_rate_raise",
-    "pen_delay_down",
-    "pen_delay_up",
-    "const_speed",
-    "model",
-    "port",
-    "port_config",
-    # plot context
-    "mode",
-    "manual_cmd",
-    "walk_dist",
-    "layer",
-    "copies",
-    "page_delay",
-    "auto_rotate",
-    "preview",
-    "rendering",
-    "reordering",
-    "report_time",
-    # interactive context
-    "units",
-]
-
+from .options import ALLOWABLE_OPTION
 
 _stub_print = print
 
@@ -39,8 +10,8 @@ def set_print_callback(cb):
 
 # noinspection PyMethodMayBeStatic
 class Axy:
-    def __init__(self):
-        _stub_print("STUB: __init__()")
+    def __init__(self, session: bool = True):
+        _stub_print(f"STUB: __init__(session={session})")
 
     def __del__(self):
         _stub_print("STUB: __del__()")
@@ -50,14 +21,31 @@ class Axy:
             raise ValueError(f"option {option} invalid")
         _stub_print(f"STUB: set_option({option}, {value})")
 
+    def disconnect(self):
+        _stub_print("STUB: disconnect()")
+
     def walk_x(self, x: float):
         _stub_print(f"STUB: walk_x({x})")
 
     def walk_y(self, y: float):
         _stub_print(f"STUB: walk_y({y})")
 
-    def plot_svg(self, svg: str):
-        _stub_print(f"STUB: plot_svg(str_len={len(svg)})")
+    def plot_svg(self, svg: str, resume: bool = False):
+        _stub_print(f"STUB: plot_svg(str_len={len(svg)}, resume={resume})")
+        return None
+
+    def plot_paths(
+        self, layers, start=0, on_progress=None, should_stop=None, home=True
+    ):
+        lines = [line for layer in layers.values() for line in layer]
+        _stub_print(
+            f"STUB: plot_paths(layer_count={len(layers)}, line_count={len(lines)}, "
+            f"point_count={sum(len(line) for line in lines)}, start={start}, "
+            f"home={home})"
+        )
+        if on_progress is not None:
+            on_progress(len(lines), len(lines))
+        return len(lines)
 
     def shutdown(self):
         _stub_print(f"STUB: shutdown()")
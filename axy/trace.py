@@ -0,0 +1,294 @@
+"""Call tracing and replay.
+
+:class:`TracedAxy` wraps any backend's ``Axy`` and records every call as a JSON line:
+method, arguments, option snapshot and duration. For the real AxiDraw backend, the
+underlying pyaxidraw calls are recorded as nested spans (``plot_setup`` includes SVG
+parsing, ``connect`` the connection setup, etc.), with motion commands aggregated
+per call to keep the trace small.
+
+Traces can be summarised or replayed on another backend::
+
+    python -m axy.trace summary session.jsonl
+    python -m axy.trace replay session.jsonl --backend simulator
+"""
+
+import argparse
+import collections
+import contextlib
+import inspect
+import json
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+
+import numpy as np
+
+# pyaxidraw calls aggregated instead of recorded individually
+_MOTION_CALLS = {"moveto", "lineto", "go", "goto", "move", "line", "penup", "pendown"}
+
+
+class Tracer:
+    """Write timing spans to a JSON lines file. Thread safe."""
+
+    def __init__(self, path: str):
+        self._fp: TextIO = open(path, "a")
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = time.time() - time.perf_counter()
+
+    def _stack(self) -> List[Dict[str, Any]]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def now(self) -> float:
+        """Time stamp for records: wall clock time at start, then following the
+        monotonic clock so that records stay ordered."""
+        return self._origin + time.perf_counter()
+
+    @property
+    def current_span(self) -> Optional[Dict[str, Any]]:
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self._fp.write(line + "\n")
+            self._fp.flush()
+
+    @contextlib.contextmanager
+    def span(self, name: str, **fields: Any) -> Iterator[Dict[str, Any]]:
+        stack = self._stack()
+        start = time.perf_counter()
+        record = {
+            "name": name,
+            "time": self._origin + start,
+            "depth": len(stack),
+            "thread": threading.current_thread().name,
+            **fields,
+        }
+        stack.append(record)
+        try:
+            yield record
+        except Exception as exc:
+            record["error"] = repr(exc)
+            raise
+        finally:
+            stack.pop()
+            record["duration"] = time.perf_counter() - start
+            self.write(record)
+
+    def close(self) -> None:
+        with self._lock:
+            self._fp.close()
+
+
+def encode_paths(layers) -> Dict[str, List[List[List[float]]]]:
+    return {
+        str(layer_id): [
+            np.column_stack([np.real(line), np.imag(line)]).tolist() for line in lines
+        ]
+        for layer_id, lines in layers.items()
+    }
+
+
+def decode_paths(
+    data: Dict[str, List[List[List[float]]]]
+) -> Dict[int, List[np.ndarray]]:
+    layers = {}
+    for layer_id, lines in data.items():
+        points = [np.asarray(line, dtype=float).reshape(-1, 2) for line in lines]
+        layers[int(layer_id)] = [p[:, 0] + 1j * p[:, 1] for p in points]
+    return layers
+
+
+def _encode_args(
+    func, args, kwargs, record_data: bool
+) -> Tuple[Dict[str, Any], tuple, Dict[str, Any]]:
+    """Encode a call's arguments for the trace. Returns them along with the arguments
+    to call ``func`` with: layers are materialised once, so that generators of lines
+    are not consumed by the trace."""
+    try:
+        bound = inspect.signature(func).bind(*args, **kwargs)
+    except TypeError:
+        return {"args": [repr(a) for a in args]}, args, kwargs
+
+    encoded = {}
+    for name, value in bound.arguments.items():
+        if callable(value) or value is None:
+            continue
+        if name == "layers":
+            value = {layer_id: list(lines) for layer_id, lines in value.items()}
+            bound.arguments[name] = value
+            if record_data:
+                encoded[name] = encode_paths(value)
+            else:
+                encoded["line_count"] = sum(len(lines) for lines in value.values())
+        elif isinstance(value, str) and len(value) > 256 and not record_data:
+            encoded[f"{name}_len"] = len(value)
+        else:
+            encoded[name] = value
+    return encoded, bound.args, bound.kwargs
+
+
+class _TracedAxiDraw:
+    """Proxy of a pyaxidraw ``AxiDraw`` recording its method calls as nested spans."""
+
+    def __init__(self, ad, tracer: Tracer):
+        self._ad = ad
+        self._tracer = tracer
+
+    def __getattr__(self, name):
+        value = getattr(self._ad, name)
+        if name.startswith("_") or not callable(value):
+            return value
+
+        def traced(*args, **kwargs):
+            if name in _MOTION_CALLS:
+                start = time.perf_counter()
+                try:
+                    return value(*args, **kwargs)
+                finally:
+                    span = self._tracer.current_span
+                    if span is not None:
+                        span["motion_calls"] = span.get("motion_calls", 0) + 1
+                        span["motion_time"] = (
+                            span.get("motion_time", 0.0) + time.perf_counter() - start
+                        )
+            with self._tracer.span(f"ad.{name}"):
+                return value(*args, **kwargs)
+
+        return traced
+
+    def __setattr__(self, name, value):
+        if name in ("_ad", "_tracer"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._ad, name, value)
+
+
+class TracedAxy:
+    """Wrap an ``Axy`` instance and trace all its calls.
+
+    With ``record_data``, plotted paths and SVGs are stored in full so that the trace
+    can be replayed.
+    """
+
+    def __init__(self, axy, tracer: Tracer, record_data: bool = True):
+        self._axy = axy
+        self._tracer = tracer
+        self._record_data = record_data
+        self._options: Dict[str, Any] = {}
+
+        if hasattr(axy, "ad"):
+            axy.ad = _TracedAxiDraw(axy.ad, tracer)
+
+    @property
+    def wrapped(self):
+        return self._axy
+
+    def set_option(self, option, value):
+        self._options[option] = value
+        self._tracer.write(
+            {
+                "name": "set_option",
+                "time": self._tracer.now(),
+                "option": option,
+                "value": value,
+            }
+        )
+        return self._axy.set_option(option, value)
+
+    def __getattr__(self, name):
+        value = getattr(self._axy, name)
+        if name.startswith("_") or not callable(value):
+            return value
+
+        def traced(*args, **kwargs):
+            fields, args, kwargs = _encode_args(value, args, kwargs, self._record_data)
+            with self._tracer.span(
+                name, kind="call", args=fields, options=dict(self._options)
+            ):
+                return value(*args, **kwargs)
+
+        return traced
+
+
+def read_trace(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path) as fp:
+        for line in fp:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def summarize(path: str, out: TextIO = sys.stdout) -> None:
+    totals: Dict[str, List[float]] = collections.defaultdict(list)
+    for record in read_trace(path):
+        if "duration" in record:
+            totals[record["name"]].append(record["duration"])
+            if "motion_time" in record:
+                totals[f"{record['name']} (motion)"].append(record["motion_time"])
+
+    out.write(f"{'span':<32}{'count':>8}{'total (s)':>12}{'mean (ms)':>12}\n")
+    for name, durations in sorted(totals.items(), key=lambda kv: -sum(kv[1])):
+        total = sum(durations)
+        out.write(
+            f"{name:<32}{len(durations):>8}{total:>12.3f}"
+            f"{1000 * total / len(durations):>12.1f}\n"
+        )
+
+
+def replay(path: str, axy, realtime: bool = False) -> int:
+    """Replay the top-level calls of a trace on ``axy``. With ``realtime``, the original
+    delays between calls are reproduced. Returns the number of replayed calls."""
+    count = 0
+    previous_time = None
+    for record in read_trace(path):
+        if realtime and previous_time is not None:
+            time.sleep(max(record["time"] - previous_time, 0))
+        previous_time = record["time"]
+
+        if record["name"] == "set_option":
+            axy.set_option(record["option"], record["value"])
+        elif record.get("kind") == "call" and record.get("depth") == 0:
+            args = dict(record.get("args", {}))
+            if "layers" in args:
+                args["layers"] = decode_paths(args["layers"])
+            elif record["name"] in ("plot_paths", "plot_svg") and "svg" not in args:
+                print(f"skipping {record['name']}: data not recorded", file=sys.stderr)
+                continue
+            getattr(axy, record["name"])(**args)
+            count += 1
+    return count
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from . import get_backend
+
+    parser = argparse.ArgumentParser(prog="python -m axy.trace")
+    sub = parser.add_subparsers(dest="command", required=True)
+    summary_parser = sub.add_parser("summary", help="print time spent per span")
+    summary_parser.add_argument("trace")
+    replay_parser = sub.add_parser("replay", help="replay a trace on a backend")
+    replay_parser.add_argument("trace")
+    replay_parser.add_argument("--backend", "-b", default="simulator")
+    replay_parser.add_argument(
+        "--realtime", "-r", action="store_true", help="reproduce delays between calls"
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "summary":
+        summarize(args.trace)
+    else:
+        axy = get_backend(args.backend).Axy()
+        count = replay(args.trace, axy, args.realtime)
+        print(f"replayed {count} calls", file=sys.stderr)
+        if hasattr(axy, "stats"):
+            print(axy.stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import logging
+import os
 import socket
-from typing import BinaryIO
+from typing import BinaryIO, Iterable, Optional
 
 import click
 from serial import Serial
@@ -8,6 +9,38 @@ from tqdm import tqdm
 
 logging.getLogger().setLevel(logging.INFO)
 
+CHUNK_SIZE = 1024
+
+
+def send(
+    chunks: Iterable[bytes],
+    dest: str,
+    remote: bool = False,
+    port: int = 5678,
+    rtscts: bool = False,
+    total: Optional[int] = None,
+) -> None:
+    """Send data to a serial device, or to a remote serialserver if ``remote`` is set.
+
+    ``chunks`` is consumed lazily, so it can be a generator producing the data while it
+    is sent. ``total`` is the data size in bytes, if known, for the progress bar.
+    """
+    with tqdm(total=total, unit="B", unit_scale=True) as progress:
+        if remote:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+                # Connect to server and send data
+                sock.connect((dest, port))
+                for chunk in chunks:
+                    sock.sendall(chunk)
+                    progress.update(len(chunk))
+        else:
+            with Serial(port=dest, rtscts=rtscts) as serial:
+                for chunk in chunks:
+                    serial.write(chunk)
+                    progress.update(len(chunk))
+                logging.info("Flushing...")
+                serial.flush()
+
 
 @click.command()
 @click.argument("file", type=click.File("rb"))
@@ -18,17 +51,8 @@ logging.getLogger().setLevel(logging.INFO)
 def serialwrite(
     file: BinaryIO, dest: str, remote: bool, port: int, rtscts: bool
 ) -> None:
-    data = file.read()
-    if remote:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-            # Connect to server and send data
-            sock.connect((dest, port))
-            sock.sendall(data)
-    else:
-        serial = Serial(port=dest, rtscts=rtscts)
-        # serial.write(data)
-        for c in tqdm(data):
-            serial.write(c)
-        logging.info("Flushing...")
-        serial.flush()
-        serial.close()
+    try:
+        total = os.fstat(file.fileno()).st_size or None
+    except (OSError, ValueError):
+        total = None
+    send(iter(lambda: file.read(CHUNK_SIZE), b""), dest, remote, port, rtscts, total)
@@ -0,0 +1,190 @@
+import importlib
+import sys
+import types
+
+import numpy as np
+import pytest
+
+from axy.kinematics import PX_PER_INCH
+
+
+class FakeAxiDraw:
+    """Records the pyaxidraw interactive API calls. Like pyaxidraw, commands don't
+    raise when the port is lost."""
+
+    def __init__(self):
+        self.options = types.SimpleNamespace()
+        self.plot_status = types.SimpleNamespace(port=None)
+        self.calls = []
+        self.connected = False
+
+    def __getattr__(self, name):
+        def method(*args):
+            self.calls.append((name, *args))
+
+        return method
+
+    def connect(self):
+        self.calls.append(("connect",))
+        self.connected = True
+        self.plot_status.port = types.SimpleNamespace(is_open=True)
+        return True
+
+    def disconnect(self):
+        self.calls.append(("disconnect",))
+        self.connected = False
+        self.plot_status.port = None
+
+    def drop(self):
+        """Simulate the board dropping off."""
+        self.plot_status.port.is_open = False
+
+
+@pytest.fixture
+def axidraw(monkeypatch):
+    """axy.axidraw imported against a fake pyaxidraw."""
+    pyaxidraw = types.ModuleType("pyaxidraw")
+    pyaxidraw.axidraw = types.ModuleType("pyaxidraw.axidraw")
+    pyaxidraw.axidraw.AxiDraw = FakeAxiDraw
+    monkeypatch.setitem(sys.modules, "pyaxidraw", pyaxidraw)
+    monkeypatch.setitem(sys.modules, "pyaxidraw.axidraw", pyaxidraw.axidraw)
+
+    sys.modules.pop("axy.axidraw", None)
+    yield importlib.import_module("axy.axidraw")
+    sys.modules.pop("axy.axidraw", None)
+
+
+def commands(ad, names=("moveto", "lineto", "penup")):
+    return [call for call in ad.calls if call[0] in names]
+
+
+def test_plot_paths(axidraw):
+    axy = axidraw.Axy()
+    layers = {
+        1: [np.array([1, 2]) * PX_PER_INCH],
+        2: [np.array([3 + 1j, 4 + 1j, 4 + 2j]) * PX_PER_INCH],
+    }
+    progress = []
+    assert axy.plot_paths(layers, on_progress=lambda *p: progress.append(p)) == 2
+    assert progress == [(1, 2), (2, 2)]
+    assert commands(axy.ad) == [
+        ("moveto", 1, 0),
+        ("lineto", 2, 0),
+        ("moveto", 3, 1),
+        ("lineto", 4, 1),
+        ("lineto", 4, 2),
+        ("moveto", 0, 0),
+    ]
+    assert axy.ad.options.units == 0
+    # the session is kept open
+    assert axy.ad.connected
+
+
+def test_plot_paths_start_and_stop(axidraw):
+    axy = axidraw.Axy()
+    layers = {1: [np.array([i, i + 1]) * PX_PER_INCH for i in range(4)]}
+    assert axy.plot_paths(layers, start=1, should_stop=lambda: False, home=False) == 4
+    assert commands(axy.ad)[0] == ("moveto", 1, 0)
+    assert commands(axy.ad)[-1] == ("penup",)
+
+    axy.ad.calls.clear()
+    stops = iter([False, True])
+    assert axy.plot_paths(layers, should_stop=lambda: next(stops)) == 1
+    assert commands(axy.ad) == [("moveto", 0, 0), ("lineto", 1, 0), ("penup",)]
+
+
+def test_plot_paths_single_point(axidraw):
+    axy = axidraw.Axy()
+    axy.plot_paths({1: [np.array([1 + 1j]) * PX_PER_INCH]}, home=False)
+    assert commands(axy.ad, ("moveto", "lineto")) == [
+        ("moveto", 1, 1),
+        ("lineto", 1, 1),
+    ]
+
+
+def test_options_forwarded(axidraw):
+    axy = axidraw.Axy()
+    axy.set_option("speed_pendown", 30)
+    axy.walk_x(1)
+    assert axy.ad.options.speed_pendown == 30
+    assert ("update",) not in axy.ad.calls
+
+    # unchanged options are not sent again
+    axy.set_option("speed_pendown", 30)
+    axy.walk_x(1)
+    assert ("update",) not in axy.ad.calls
+
+    axy.set_option("speed_pendown", 40)
+    axy.walk_y(1)
+    assert axy.ad.options.speed_pendown == 40
+    assert axy.ad.calls.count(("update",)) == 1
+    assert axy.ad.calls.count(("connect",)) == 1
+    assert commands(axy.ad, ("go",)) == [("go", 1, 0), ("go", 1, 0), ("go", 0, 1)]
+
+
+def test_plot_paths_error_disconnects(axidraw):
+    axy = axidraw.Axy()
+
+    def fail(*args):
+        raise OSError("write failed")
+
+    axy.ad.lineto = fail
+    progress = []
+    with pytest.raises(OSError):
+        axy.plot_paths(
+            {1: [np.array([0, 1])] * 2}, on_progress=lambda *p: progress.append(p)
+        )
+    assert progress == []
+    assert not axy.ad.connected
+
+
+def test_non_session_mode(axidraw):
+    axy = axidraw.Axy(session=False)
+    axy.plot_paths({1: [np.array([0, 1])]})
+    assert axy.ad.calls.count(("connect",)) == 1
+    assert not axy.ad.connected
+
+
+def test_reconnect_after_port_lost(axidraw):
+    axy = axidraw.Axy()
+    axy.walk_x(1)
+    axy.ad.drop()
+    axy.walk_x(1)
+    assert axy.ad.calls.count(("connect",)) == 2
+    assert commands(axy.ad, ("go",)) == [("go", 1, 0), ("go", 1, 0)]
+    assert axy.ad.plot_status.port.is_open
+
+
+def test_port_lost_during_command(axidraw):
+    axy = axidraw.Axy()
+    axy.ad.go = lambda *args: axy.ad.drop()
+    with pytest.raises(RuntimeError):
+        axy.walk_x(1)
+    assert not axy.ad.connected
+
+    del axy.ad.go
+    axy.walk_x(1)
+    assert axy.ad.calls.count(("connect",)) == 2
+    assert commands(axy.ad, ("go",)) == [("go", 1, 0)]
+
+
+def test_port_lost_during_plot(axidraw):
+    axy = axidraw.Axy()
+    lines = [np.array([i, i + 1]) * PX_PER_INCH for i in range(3)]
+    progress = []
+
+    def on_progress(done, total):
+        progress.append(done)
+        if done == 1:
+            axy.ad.drop()
+
+    with pytest.raises(RuntimeError):
+        axy.plot_paths({1: lines}, on_progress=on_progress)
+    # the line plotted while the port was lost isn't reported as done
+    assert progress == [1]
+    assert not axy.ad.connected
+
+    progress.clear()
+    assert axy.plot_paths({1: lines}, start=1, on_progress=on_progress) == 3
+    assert progress == [2, 3]
+    assert axy.ad.calls.count(("connect",)) == 2
@@ -0,0 +1,144 @@
+import asyncio
+import os
+
+import pytest
+from watchgod import Change
+
+from aximix import dir_watch
+from aximix.dir_watch import DirWatcher, _merge
+
+
+def test_merge():
+    assert _merge(None, Change.added) == Change.added
+    assert _merge(Change.added, Change.modified) == Change.added
+    assert _merge(Change.added, Change.deleted) is None
+    assert _merge(Change.deleted, Change.added) == Change.modified
+    assert _merge(Change.modified, Change.deleted) == Change.deleted
+
+
+async def watch(directory, actions, **kwargs):
+    """Run ``actions`` (callables, separated by longer than the coalesce delay) and
+    return the watcher's polling state and the batches of changes it emitted."""
+    watcher = DirWatcher(
+        asyncio.get_running_loop(), directory, coalesce_delay=0.02, **kwargs
+    )
+    batches = []
+    watcher.on_changes.connect(batches.append)
+    try:
+        await asyncio.sleep(0.05)  # let polling take its first snapshot
+        for action in actions:
+            action()
+            await asyncio.sleep(0.15)
+        return watcher.polling, batches
+    finally:
+        watcher.close()
+
+
+def write(path, data):
+    def action():
+        with open(path, "a") as fp:
+            fp.write(data)
+
+    return action
+
+
+@pytest.fixture(params=["inotify", "polling"])
+def mode(request, monkeypatch):
+    if request.param == "polling":
+
+        def unavailable(directory):
+            raise OSError("unavailable")
+
+        monkeypatch.setattr(dir_watch, "_Inotify", unavailable)
+    return request.param
+
+
+def test_changes(tmp_path, mode):
+    a, b = str(tmp_path / "a.svg"), str(tmp_path / "b.svg")
+    actions = [
+        write(a, "x"),
+        write(a, "yy"),
+        lambda: os.rename(a, b),
+        lambda: os.remove(b),
+    ]
+    polling, batches = asyncio.run(watch(str(tmp_path), actions, poll_interval=0.03))
+    if mode == "inotify" and polling:
+        pytest.skip("inotify unavailable")
+
+    assert polling == (mode == "polling")
+    assert batches == [
+        {(Change.added, a)},
+        {(Change.modified, a)},
+        {(Change.deleted, a), (Change.added, b)},
+        {(Change.deleted, b)},
+    ]
+
+
+def test_coalesced(tmp_path):
+    path = str(tmp_path / "tmp.svg")
+
+    def create_and_delete():
+        write(path, "x")()
+        os.remove(path)
+
+    polling, batches = asyncio.run(watch(str(tmp_path), [create_and_delete]))
+    if polling:
+        pytest.skip("inotify unavailable")
+    assert batches == []
+
+
+def test_directory_removed(tmp_path):
+    directory = tmp_path / "watched"
+    directory.mkdir()
+
+    async def main():
+        watcher = DirWatcher(asyncio.get_running_loop(), str(directory))
+        if watcher.polling:
+            watcher.close()
+            pytest.skip("inotify unavailable")
+        directory.rmdir()
+        await asyncio.sleep(0.1)
+        polling = watcher.polling
+        watcher.close()
+        return polling
+
+    assert asyncio.run(main())
+
+
+def test_queue_overflow(tmp_path):
+    kept, changed, removed = (str(tmp_path / f"{name}.svg") for name in "kcr")
+    for path in (kept, changed, removed):
+        write(path, "x")()
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        watcher = DirWatcher(loop, str(tmp_path), coalesce_delay=0.02)
+        if watcher.polling:
+            watcher.close()
+            pytest.skip("inotify unavailable")
+        batches = []
+        watcher.on_changes.connect(batches.append)
+
+        # a reported change is part of the snapshot
+        write(changed, "y")()
+        await asyncio.sleep(0.1)
+        assert batches == [{(Change.modified, changed)}]
+
+        # events are lost while the queue is full
+        loop.remove_reader(watcher._inotify.fd)
+        added = str(tmp_path / "a.svg")
+        write(added, "x")()
+        write(changed, "zz")()
+        os.remove(removed)
+        watcher._inotify.read_events = lambda: iter([(dir_watch.IN_Q_OVERFLOW, "")])
+        watcher._read_inotify()
+        await asyncio.sleep(0.1)
+        watcher.close()
+        return added, batches
+
+    added, batches = asyncio.run(main())
+    assert batches[1] == {
+        (Change.added, added),
+        (Change.modified, changed),
+        (Change.deleted, removed),
+    }
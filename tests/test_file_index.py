@@ -0,0 +1,154 @@
+import asyncio
+import os
+import threading
+
+import pytest
+
+pytest.importorskip("vpype")
+
+from aximix import file_index  # noqa: E402
+from aximix.file_index import FileIndex  # noqa: E402
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 5))
+
+
+def write(path, content="<svg/>", mtime=None):
+    path.write_text(content)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def scanned(directory, index_path):
+    index = FileIndex(str(directory), str(index_path))
+    run(index.scan())
+    return index
+
+
+@pytest.fixture
+def svg_dir(tmp_path):
+    directory = tmp_path / "svg"
+    directory.mkdir()
+    return directory
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    return tmp_path / "index.json"
+
+
+def set_metadata(entry):
+    entry.layer_count = 2
+    entry.bounds = (0.0, 0.0, 10.0, 20.0)
+    entry.estimated_time = 60.0
+
+
+def test_scan(svg_dir, index_path):
+    old = write(svg_dir / "old.svg", mtime=1000)
+    new = write(svg_dir / "new.SVG", mtime=2000)
+    write(svg_dir / "notes.txt")
+    (svg_dir / "dir.svg").mkdir()
+
+    index = scanned(svg_dir, index_path)
+    assert index.paths == [new, old]
+    assert index.get(old).mtime == 1000
+    assert index.get(old).size == len("<svg/>")
+    assert not index.get(old).has_metadata
+
+
+def test_scan_missing_directory(tmp_path, index_path):
+    index = scanned(tmp_path / "missing", index_path)
+    assert len(index) == 0
+
+
+def test_persistence(svg_dir, index_path):
+    path = write(svg_dir / "a.svg", mtime=1000)
+    index = scanned(svg_dir, index_path)
+    set_metadata(index.get(path))
+    index.save()
+
+    # persisted entries are listed before the scan
+    index = FileIndex(str(svg_dir), str(index_path))
+    assert index.paths == [path]
+    entry = index.get(path)
+    assert entry.bounds == (0.0, 0.0, 10.0, 20.0)
+
+    run(index.scan())
+    assert index.get(path) is entry
+
+
+def test_persisted_index_of_other_directory(svg_dir, tmp_path, index_path):
+    write(svg_dir / "a.svg")
+    scanned(svg_dir, index_path).save()
+    other = tmp_path / "other"
+    other.mkdir()
+    assert len(FileIndex(str(other), str(index_path))) == 0
+
+
+def test_invalidated_on_mtime_change(svg_dir, index_path):
+    path = write(svg_dir / "a.svg", mtime=1000)
+    index = scanned(svg_dir, index_path)
+    set_metadata(index.get(path))
+    index.save()
+
+    os.utime(path, (1001, 1001))
+    index = scanned(svg_dir, index_path)
+    assert index.get(path).mtime == 1001
+    assert not index.get(path).has_metadata
+
+
+def test_invalidated_on_size_change(svg_dir, index_path):
+    path = write(svg_dir / "a.svg", mtime=1000)
+    index = scanned(svg_dir, index_path)
+    set_metadata(index.get(path))
+    index.save()
+
+    write(svg_dir / "a.svg", "<svg></svg>", mtime=1000)
+    index = scanned(svg_dir, index_path)
+    assert not index.get(path).has_metadata
+
+
+def test_scan_removes_deleted_files(svg_dir, index_path):
+    path = write(svg_dir / "a.svg")
+    scanned(svg_dir, index_path).save()
+    os.remove(path)
+
+    index = FileIndex(str(svg_dir), str(index_path))
+    assert index.paths == [path]
+    scanned_signal = []
+    index.on_scanned.connect(lambda: scanned_signal.append(None))
+    run(index.scan())
+    assert index.paths == []
+    assert scanned_signal == [None]
+
+
+def test_updates_while_scanning(svg_dir, index_path, monkeypatch):
+    removed = write(svg_dir / "removed.svg", mtime=1000)
+    kept = write(svg_dir / "kept.svg", mtime=1000)
+    release = threading.Event()
+    scan_directory = file_index.scan_directory
+
+    def slow_scan(directory):
+        stats = scan_directory(directory)
+        release.wait()
+        return stats
+
+    monkeypatch.setattr(file_index, "scan_directory", slow_scan)
+    index = FileIndex(str(svg_dir), str(index_path))
+
+    async def main():
+        task = asyncio.create_task(index.scan())
+        await asyncio.sleep(0.01)
+        # changes reported by the watcher after the directory was listed
+        os.remove(removed)
+        index.remove(removed)
+        added = write(svg_dir / "added.svg", mtime=2000)
+        index.update(added)
+        release.set()
+        await task
+        return added
+
+    added = run(main())
+    assert index.paths == [added, kept]
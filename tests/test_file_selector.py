@@ -0,0 +1,147 @@
+import asyncio
+import os
+import types
+
+import pytest
+import urwid
+from watchgod import Change
+
+pytest.importorskip("vpype")
+
+from aximix import file_selector  # noqa: E402
+from aximix.file_index import FileIndex  # noqa: E402
+from aximix.file_selector import FileSelector  # noqa: E402
+from aximix.launchpad import Launchpad  # noqa: E402
+from aximix.signal import Signal  # noqa: E402
+from aximix.virtual_launchpad import VirtualLaunchpad  # noqa: E402
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 5))
+
+
+class FakeWatcher:
+    def __init__(self):
+        self.on_changes = Signal()
+
+
+@pytest.fixture(autouse=True)
+def no_background_work(monkeypatch):
+    # files are only added through watch events, without metadata extraction
+    monkeypatch.setattr(FileIndex, "start", lambda self, loop: None)
+    monkeypatch.setattr(file_selector, "DEBOUNCE", 0.05)
+    monkeypatch.setattr(file_selector, "MAX_DEBOUNCE", 0.15)
+
+
+def make_selector(tmp_path):
+    watcher = FakeWatcher()
+    loop = types.SimpleNamespace(widget=urwid.SolidFill())
+    lp = Launchpad(asyncio.get_running_loop(), backend=VirtualLaunchpad())
+    selector = FileSelector(loop, lp, str(tmp_path / "svg"), watcher=watcher)
+    return selector, watcher
+
+
+def write(directory, name, mtime):
+    path = directory / name
+    path.write_text("<svg/>")
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def record_redraws(selector):
+    redrawn = []
+    for i, text in enumerate(selector._texts):
+        set_text = text.set_text
+
+        def recording_set_text(markup, i=i, set_text=set_text):
+            redrawn.append(i)
+            set_text(markup)
+
+        text.set_text = recording_set_text
+    return redrawn
+
+
+@pytest.fixture
+def svg_dir(tmp_path):
+    directory = tmp_path / "svg"
+    directory.mkdir()
+    return directory
+
+
+def test_only_changed_slots_redrawn(tmp_path, svg_dir):
+    async def main():
+        selector, watcher = make_selector(tmp_path)
+        redrawn = record_redraws(selector)
+        paths = [write(svg_dir, f"{i}.svg", 1000 * (3 - i)) for i in range(3)]
+
+        watcher.on_changes({(Change.added, path) for path in paths})
+        await asyncio.sleep(0.1)
+        assert sorted(redrawn) == [0, 1, 2]
+        assert selector._visible_files() == paths
+
+        # an older file is listed last
+        redrawn.clear()
+        old = write(svg_dir, "old.svg", 500)
+        watcher.on_changes({(Change.added, old)})
+        await asyncio.sleep(0.1)
+        assert redrawn == [3]
+
+        # metadata of one file
+        redrawn.clear()
+        entry = selector.index.get(paths[1])
+        entry.layer_count = 2
+        entry.estimated_time = 60.0
+        selector._metadata_ready(paths[1])
+        assert redrawn == [1]
+
+        redrawn.clear()
+        os.remove(old)
+        watcher.on_changes({(Change.deleted, old)})
+        await asyncio.sleep(0.1)
+        assert redrawn == [3]
+
+        # changes to other files
+        redrawn.clear()
+        watcher.on_changes({(Change.added, str(svg_dir / "notes.txt"))})
+        await asyncio.sleep(0.1)
+        assert redrawn == []
+
+    run(main())
+
+
+def test_changes_debounced(tmp_path, svg_dir):
+    async def main():
+        selector, watcher = make_selector(tmp_path)
+        changed = []
+        selector.on_files_changed.connect(changed.append)
+
+        paths = [write(svg_dir, f"{i}.svg", 1000 + i) for i in range(3)]
+        for path in paths:
+            watcher.on_changes({(Change.added, path)})
+            await asyncio.sleep(0.005)
+        assert changed == []
+        await asyncio.sleep(0.1)
+        assert changed == [paths[::-1]]
+
+    run(main())
+
+
+def test_max_debounce(tmp_path, svg_dir):
+    async def main():
+        selector, watcher = make_selector(tmp_path)
+        loop = asyncio.get_running_loop()
+        changed = []
+        selector.on_files_changed.connect(lambda paths: changed.append(loop.time()))
+
+        # a burst of changes, each within DEBOUNCE of the previous one
+        start = loop.time()
+        for i in range(60):
+            watcher.on_changes({(Change.added, write(svg_dir, f"{i}.svg", 1000 + i))})
+            await asyncio.sleep(0.005)
+        end = loop.time()
+
+        assert changed
+        assert changed[0] - start >= 0.15
+        assert changed[0] < end
+
+    run(main())
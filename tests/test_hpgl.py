@@ -0,0 +1,58 @@
+import numpy as np
+
+from aximix import hpgl
+from aximix.hpgl import format_lines, iter_hpgl, quantize_lines
+
+INCH = 96.0  # CSS pixels
+HEIGHT = 2 * INCH
+
+
+def test_quantize_flips_y():
+    coords, sizes = quantize_lines([np.array([0, INCH + 0.5 * INCH * 1j])], HEIGHT)
+    assert coords.tolist() == [[0, 2032], [1016, 1524]]
+    assert sizes.tolist() == [2]
+
+
+def test_quantize_rounds_and_drops_duplicates():
+    line = np.array([0, 0.01, 0.02 + 0.01j, INCH, INCH])
+    coords, sizes = quantize_lines([line, np.array([INCH, INCH])], HEIGHT)
+    # duplicates are only dropped within a line
+    assert coords.tolist() == [[0, 2032], [1016, 2032], [1016, 2032], [1016, 2032]]
+    assert sizes.tolist() == [2, 2]
+
+
+def test_quantize_doubles_single_points():
+    lines = [np.array([INCH]), np.array([]), np.array([0, 0.001]), np.array([0, INCH])]
+    coords, sizes = quantize_lines(lines, HEIGHT)
+    assert sizes.tolist() == [2, 2, 2]
+    assert coords[:4].tolist() == [[1016, 2032]] * 2 + [[0, 2032]] * 2
+
+
+def test_quantize_empty():
+    coords, sizes = quantize_lines([np.array([])], HEIGHT)
+    assert coords.shape == (0, 2) and len(sizes) == 0
+
+
+def test_format_lines():
+    lines = [np.array([0, INCH, INCH + INCH * 1j]), np.array([INCH * 1j])]
+    expected = "PU0,2032;PD1016,2032,1016,1016;\nPU0,1016;PD0,1016;\n"
+    assert format_lines(lines, HEIGHT) == expected
+    assert format_lines([], HEIGHT) == ""
+
+
+def test_iter_hpgl(monkeypatch):
+    monkeypatch.setattr(hpgl, "CHUNK_LINES", 2)
+    line = np.array([0, INCH])
+    chunks = list(
+        iter_hpgl({2: iter([line] * 3), 5: [line]}, HEIGHT, {5: 1}, velocity=20)
+    )
+    assert chunks[0] == "IN;DF;VS20;\n"
+    assert chunks[1] == "SP2;\n"
+    assert chunks[2] == 2 * "PU0,2032;PD1016,2032;\n"
+    assert chunks[3] == "PU0,2032;PD1016,2032;\n"
+    assert chunks[4:] == ["SP1;\n", "PU0,2032;PD1016,2032;\n", "PU;SP0;\n"]
+
+
+def test_iter_hpgl_defaults():
+    chunks = list(iter_hpgl({1: []}, HEIGHT))
+    assert chunks == ["IN;DF;\n", "SP1;\n", "PU;SP0;\n"]
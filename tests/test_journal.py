@@ -0,0 +1,134 @@
+import json
+
+import pytest
+
+from aximix import journal
+from aximix.journal import JobJournal, JournalEntry, file_hash
+
+LAYOUT = {"page_format": [793.7, 1122.5], "margin": 75.6}
+LAYERS = [(1, 10), (2, 5)]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "journal.jsonl")
+
+
+@pytest.fixture
+def fsyncs(monkeypatch):
+    calls = []
+    monkeypatch.setattr(journal.os, "fsync", calls.append)
+    return calls
+
+
+def events(path):
+    with open(path) as fp:
+        return [json.loads(line)["event"] for line in fp]
+
+
+def test_entry():
+    entry = JournalEntry("/a.svg", "h", {}, LAYERS, position=12)
+    assert entry.line_count == 15
+    assert entry.layers_done == [1]
+    assert entry.current_layer == 2
+    assert not entry.completed
+    assert entry.describe() == "a.svg, 12/15 lines (layer 2)"
+
+    entry.position = 15
+    assert entry.completed and entry.current_layer is None
+    entry.resume_svg = "<svg/>"
+    assert not entry.completed
+
+
+def test_no_journal(path):
+    assert JobJournal(path).load() is None
+
+
+def test_resume_after_crash(path, fsyncs):
+    jj = JobJournal(path)
+    jj.start("/a.svg", "h", LAYOUT, LAYERS)
+    jj.progress(4)
+    jj.progress(12)
+    jj.close()  # crash, no pause or finish
+
+    entry = JobJournal(path).load()
+    assert entry == JournalEntry("/a.svg", "h", LAYOUT, LAYERS, position=12)
+
+
+def test_pause_and_finish(path, fsyncs):
+    jj = JobJournal(path)
+    jj.start("/a.svg", "h", LAYOUT, [(1, 3)])
+    jj.pause(1, resume_svg="<resume/>")
+    jj.close()
+
+    jj = JobJournal(path)
+    entry = jj.load()
+    assert (entry.position, entry.resume_svg) == (1, "<resume/>")
+    jj.resume()
+    jj.finish()
+    assert JobJournal(path).load() is None
+    assert events(path)[-2:] == ["resumed", "finished"]
+
+
+def test_completed_without_finish(path, fsyncs):
+    jj = JobJournal(path)
+    jj.start("/a.svg", "h", LAYOUT, LAYERS)
+    jj.progress(15)
+    jj.close()
+    assert JobJournal(path).load() is None
+
+
+def test_torn_line(path, fsyncs):
+    jj = JobJournal(path)
+    jj.start("/a.svg", "h", LAYOUT, LAYERS)
+    jj.pause(12)
+    jj.close()
+    with open(path, "a") as fp:
+        fp.write('{"event": "progr')  # power loss while writing
+
+    jj = JobJournal(path)
+    assert jj.load().position == 12
+    jj.resume()
+    jj.pause(14)
+    jj.close()
+    # the torn line doesn't swallow the next event
+    assert JobJournal(path).load().position == 14
+
+
+def test_progress_throttled(path, fsyncs, monkeypatch):
+    monkeypatch.setattr(journal, "PROGRESS_INTERVAL", 3600)
+    jj = JobJournal(path)
+    jj.start("/a.svg", "h", LAYOUT, LAYERS)
+    for position in range(1, 13):
+        jj.progress(position)
+    jj.pause(12)
+    jj.finish()
+
+    assert events(path) == [
+        "start",
+        "progress",  # layer 1 done
+        "layer_done",
+        "paused",
+        "finished",
+    ]
+    # only state changes are synced to the disk
+    assert len(fsyncs) == 3
+
+
+def test_start_truncates(path, fsyncs):
+    jj = JobJournal(path)
+    jj.start("/a.svg", "h", LAYOUT, LAYERS)
+    jj.progress(3)
+    jj.start("/b.svg", "h2", LAYOUT, [(1, 2)])
+    jj.close()
+    assert events(path) == ["start"]
+    assert JobJournal(path).load().file == "/b.svg"
+
+
+def test_file_hash(tmp_path):
+    svg = tmp_path / "a.svg"
+    svg.write_text("<svg/>")
+    first = file_hash(str(svg))
+    assert first == file_hash(str(svg))
+    svg.write_text("<svg></svg>")
+    assert file_hash(str(svg)) != first
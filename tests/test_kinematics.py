@@ -0,0 +1,79 @@
+import math
+
+import numpy as np
+import pytest
+
+from axy.kinematics import (
+    PX_PER_INCH,
+    MotionSettings,
+    PlotGeometry,
+    format_duration,
+    trapezoid_time,
+)
+
+
+def test_trapezoid_cruise():
+    # accelerate to v, cruise, decelerate: L / v + v / a
+    t = trapezoid_time(np.array([10.0]), 2.0, 4.0)
+    assert t[0] == pytest.approx(10 / 2 + 2 / 4)
+
+
+def test_trapezoid_triangle():
+    # too short to reach v_max: the peak is sqrt(a * L)
+    t = trapezoid_time(np.array([0.25]), 10.0, 4.0)
+    assert t[0] == pytest.approx(2 * math.sqrt(0.25 / 4))
+
+
+def test_trapezoid_no_accel():
+    t = trapezoid_time(np.array([1.0, 3.0]), 2.0, 0)
+    assert t == pytest.approx([0.5, 1.5])
+
+
+def test_trapezoid_entry_exit_speed():
+    lengths = np.array([1.0])
+    full_speed = np.array([2.0])
+    t = trapezoid_time(lengths, 2.0, 4.0, full_speed, full_speed)
+    assert t[0] == pytest.approx(0.5)
+    # entry and exit speeds are clamped to what the acceleration allows
+    assert trapezoid_time(lengths, 2.0, 4.0, full_speed)[0] > 0.5
+
+
+def test_motion_settings_from_options():
+    settings = MotionSettings.from_options({"speed_pendown": 50, "port": "/dev/x"})
+    assert settings.speed_pendown == 50
+    assert settings.speed_penup == MotionSettings().speed_penup
+
+
+def test_plot_geometry_distances():
+    inch = PX_PER_INCH
+    layers = {1: [np.array([inch, 2 * inch])], 2: [np.array([2 * inch, 3 * inch])]}
+    geometry = PlotGeometry(layers)
+    estimate = geometry.estimate(MotionSettings())
+
+    assert estimate.pen_down_distance == pytest.approx(2)
+    # to the first line, none between layers, and back home from (3, 0)
+    assert estimate.pen_up_distance == pytest.approx(1 + 0 + 3)
+    assert estimate.total > sum(estimate.layers.values())
+
+
+def test_plot_geometry_layer_settings():
+    layers = {1: [np.array([0, 1000])], 2: [np.array([1000, 0])]}
+    geometry = PlotGeometry(layers)
+    settings = MotionSettings()
+    base = geometry.estimate(settings)
+    slow = geometry.estimate(settings, {2: MotionSettings(speed_pendown=5)})
+
+    assert slow.layers[1] == pytest.approx(base.layers[1])
+    assert slow.layers[2] > base.layers[2]
+
+
+def test_empty_layer():
+    geometry = PlotGeometry({1: []})
+    estimate = geometry.estimate(MotionSettings())
+    assert estimate.total == 0
+    assert estimate.layers == {1: 0}
+
+
+def test_format_duration():
+    assert format_duration(59.6) == "1:00"
+    assert format_duration(3725) == "1:02:05"
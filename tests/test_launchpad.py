@@ -0,0 +1,128 @@
+import asyncio
+
+from aximix.launchpad import Launchpad, Scene
+from aximix.virtual_launchpad import VirtualLaunchpad
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 5))
+
+
+async def make_launchpad():
+    device = VirtualLaunchpad()
+    lp = Launchpad(asyncio.get_running_loop(), backend=device)
+    await sync(lp)
+    device.reset_counters()
+    return device, lp
+
+
+async def sync(lp):
+    """Run the scheduled flush and send the output right away."""
+    await asyncio.sleep(0)
+    lp.output.send_all()
+
+
+def count_flushes(lp):
+    flushes = []
+    flush = lp.flush
+
+    def counting_flush():
+        flushes.append(None)
+        flush()
+
+    lp.flush = counting_flush
+    return flushes
+
+
+def test_changes_coalesced():
+    async def main():
+        device, lp = await make_launchpad()
+        flushes = count_flushes(lp)
+
+        for key in range(11, 19):
+            lp.set_key_color(key, 5)
+        lp.set_key_color(11, 6)
+        lp.set_keys_color([(21, 1, 2, 3), (22, 4, 5, 6)])
+        await sync(lp)
+
+        assert len(flushes) == 1
+        assert device.message_count == 1
+        assert device.color(11) == (6,)
+        assert device.color(18) == (5,)
+        assert device.color(22) == (4, 5, 6)
+
+    run(main())
+
+
+def test_unchanged_keys_not_flushed():
+    async def main():
+        device, lp = await make_launchpad()
+        lp.set_key_color(11, 5)
+        await sync(lp)
+        device.reset_counters()
+        flushes = count_flushes(lp)
+
+        lp.set_key_color(11, 5)
+        await sync(lp)
+        assert flushes == []
+        assert device.message_count == 0
+
+        # changed and changed back within one iteration
+        lp.set_key_color(11, 6)
+        lp.set_key_color(11, 5)
+        await sync(lp)
+        assert len(flushes) == 1
+        assert device.message_count == 0
+
+    run(main())
+
+
+def test_inactive_scene_not_flushed():
+    async def main():
+        device, lp = await make_launchpad()
+        scene = Scene(lp)
+        flushes = count_flushes(lp)
+
+        scene.set_key_color(11, 5)
+        await sync(lp)
+        assert flushes == []
+        assert device.color(11) is None
+
+        lp.push_scene(scene)
+        await sync(lp)
+        assert device.color(11) == (5,)
+
+    run(main())
+
+
+def test_scene_switch_sends_differences():
+    async def main():
+        device, lp = await make_launchpad()
+        for key in range(11, 19):
+            lp.set_key_color(key, 5)
+        lp.set_key_color(21, 9)
+
+        scene = Scene(lp)
+        for key in range(11, 18):
+            scene.set_key_color(key, 5)
+        scene.set_key_color(18, 7)
+        await sync(lp)
+
+        device.grid.clear()
+        device.reset_counters()
+        lp.push_scene(scene)
+        await sync(lp)
+        # keys showing the same color in both scenes are not resent
+        assert sorted(device.grid) == [18, 21]
+        assert device.color(18) == (7,)
+        assert device.color(21) == (0,)
+        assert device.message_count == 1
+
+        device.grid.clear()
+        lp.pop_scene()
+        await sync(lp)
+        assert sorted(device.grid) == [18, 21]
+        assert device.color(18) == (5,)
+        assert device.color(21) == (9,)
+
+    run(main())
@@ -0,0 +1,106 @@
+import asyncio
+
+import numpy as np
+
+from aximix.layer_schedule import LayerStep, schedule_layers
+from aximix.plot_worker import IDLE, PAUSED, PlotJob, PlotWorker
+from axy.kinematics import MotionSettings
+
+BASE = {"speed_pendown": 25, "pen_pos_down": 30}
+
+
+def test_no_layer_config():
+    steps = schedule_layers([1, 2], BASE, {})
+    assert steps == [LayerStep(1, {}), LayerStep(2, {})]
+
+
+def test_overrides_are_reset():
+    steps = schedule_layers([1, 2, 3], BASE, {2: {"speed_pendown": 10}})
+    # layers 1 and 3 set the global value back, so the override doesn't leak
+    assert [step.options for step in steps] == [
+        {"speed_pendown": 25},
+        {"speed_pendown": 10},
+        {"speed_pendown": 25},
+    ]
+    assert not any(step.pen_change for step in steps)
+
+
+def test_override_without_base_value():
+    # the AxiDraw default is set back
+    steps = schedule_layers([1, 2, 3], BASE, {2: {"accel": 50}})
+    default = MotionSettings().accel
+    assert [step.options for step in steps] == [
+        {"accel": default},
+        {"accel": 50},
+        {"accel": default},
+    ]
+
+
+def test_pen_changes():
+    config = {1: {"pen": "black"}, 2: {"pen": "black"}, 3: {"pen": "red"}}
+    steps = schedule_layers([3, 1, 2, 4], BASE, config)
+    assert [(step.pen, step.pen_change) for step in steps] == [
+        ("red", False),
+        ("black", True),
+        ("black", False),
+        (None, True),
+    ]
+
+
+def test_motion_settings():
+    (step,) = schedule_layers([1], BASE, {1: {"speed_pendown": 10}})
+    assert step.motion_settings(BASE) == MotionSettings(
+        speed_pendown=10, pen_pos_down=30
+    )
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def set_option(self, option, value):
+        self.calls.append(("set_option", option, value))
+
+    def plot_paths(
+        self, layers, start=0, on_progress=None, should_stop=None, home=True
+    ):
+        ((layer_id, lines),) = layers.items()
+        self.calls.append(("plot_paths", layer_id, start, home))
+        if on_progress is not None:
+            on_progress(len(lines), len(lines))
+        return len(lines)
+
+
+def test_worker_follows_schedule():
+    axy = Recorder()
+    paths = {1: [np.array([0, 1j])], 2: [np.array([1, 2]), np.array([3, 4j])]}
+    schedule = schedule_layers(
+        paths, BASE, {1: {"pen": "red", "speed_pendown": 10}, 2: {"pen": "blue"}}
+    )
+
+    async def main():
+        states = []
+        worker = PlotWorker(asyncio.get_running_loop(), axy)
+        worker.on_state_changed.connect(states.append)
+        job = PlotJob("a.svg", paths, schedule=schedule)
+
+        async def wait_for(state):
+            while not states or states[-1] != state:
+                await asyncio.sleep(0.001)
+
+        worker.plot(job)
+        await wait_for(PAUSED)
+        assert (job.position, job.pen_change) == (1, schedule[1])
+        worker.resume()
+        await wait_for(IDLE)
+        worker.close()
+        return job
+
+    job = asyncio.run(asyncio.wait_for(main(), 5))
+    assert job.position == 3 and job.pen_change is None
+    assert axy.calls == [
+        ("set_option", "speed_pendown", 10),
+        ("plot_paths", 1, 0, False),
+        ("set_option", "speed_pendown", 25),
+        ("plot_paths", 2, 0, True),
+    ]
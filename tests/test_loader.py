@@ -0,0 +1,122 @@
+import asyncio
+import os
+
+import numpy as np
+import pytest
+
+vp = pytest.importorskip("vpype")
+
+from aximix import loader  # noqa: E402
+from aximix.loader import MAX_PREFETCH, FileLoader, VectorDataCache  # noqa: E402
+
+
+def vector_data(point_count=2):
+    vd = vp.VectorData()
+    vd.add(vp.LineCollection([np.arange(point_count) * (1 + 1j)]), 1)
+    return vd
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = []
+    for i in range(20):
+        path = tmp_path / f"{i}.svg"
+        path.write_text("<svg/>")
+        paths.append(str(path))
+    return paths
+
+
+def test_estimate_memory():
+    assert loader.estimate_memory(vector_data(2)) == 16 * 2 + 112
+
+
+def test_cache_lru_eviction(files):
+    a, b, c = files[:3]
+    cache = VectorDataCache(budget=300)  # 2 entries of 144 bytes
+    cache.put(a, os.path.getmtime(a), vector_data())
+    cache.put(b, os.path.getmtime(b), vector_data())
+    assert cache.get(a) is not None  # a is now the most recently used
+
+    cache.put(c, os.path.getmtime(c), vector_data())
+    assert a in cache and c in cache and b not in cache
+    assert (len(cache), cache.size) == (2, 288)
+
+
+def test_cache_budget(files):
+    cache = VectorDataCache(budget=100)
+    cache.put(files[0], os.path.getmtime(files[0]), vector_data())
+    assert len(cache) == 0 and cache.size == 0
+
+
+def test_cache_invalidated_by_mtime(files):
+    path = files[0]
+    cache = VectorDataCache()
+    mtime = os.path.getmtime(path)
+    cache.put(path, mtime, vector_data())
+    os.utime(path, (mtime + 10, mtime + 10))
+    assert path not in cache
+    assert cache.get(path) is None
+    assert (len(cache), cache.size) == (0, 0)
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    paths = []
+
+    def read_vector_data(path):
+        paths.append(path)
+        return vector_data()
+
+    monkeypatch.setattr(loader, "read_vector_data", read_vector_data)
+    return paths
+
+
+async def settle(file_loader):
+    while file_loader._prefetching:
+        await asyncio.sleep(0.01)
+
+
+def test_prefetch_drops_stale_requests(files, parsed):
+    async def main():
+        file_loader = FileLoader(asyncio.get_running_loop())
+        file_loader.suspend_prefetch()
+        file_loader.prefetch(files[:4])
+        await asyncio.sleep(0.05)
+        assert parsed == []
+        file_loader.prefetch(files[10:12])
+        file_loader.suspend_prefetch(False)
+        await settle(file_loader)
+        return file_loader
+
+    file_loader = asyncio.run(asyncio.wait_for(main(), 5))
+    # the first file was already waiting on the prefetch thread, its result dropped
+    assert parsed[1:] == files[10:12]
+    assert parsed[0] in (files[0], files[10])
+    assert [path in file_loader.cache for path in files[:4]] == [False] * 4
+    assert files[10] in file_loader.cache and files[11] in file_loader.cache
+    file_loader.close()
+
+
+def test_prefetch_capped(files, parsed):
+    async def main():
+        file_loader = FileLoader(asyncio.get_running_loop())
+        file_loader.prefetch(files)
+        queued = len(file_loader._prefetching)
+        await settle(file_loader)
+        file_loader.close()
+        return queued
+
+    assert asyncio.run(asyncio.wait_for(main(), 5)) == MAX_PREFETCH
+    assert parsed == files[:MAX_PREFETCH]
+
+
+def test_close_while_suspended(files, parsed):
+    async def main():
+        file_loader = FileLoader(asyncio.get_running_loop())
+        file_loader.suspend_prefetch()
+        file_loader.prefetch(files[:2])
+        await asyncio.sleep(0.05)
+        file_loader.close()
+
+    asyncio.run(asyncio.wait_for(main(), 5))
+    assert parsed == []
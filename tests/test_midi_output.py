@@ -0,0 +1,123 @@
+import asyncio
+import time
+
+from aximix.midi_output import SYSEX_FRAMING, OutputQueue
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 5))
+
+
+async def drain(queue: OutputQueue) -> None:
+    while queue.depth:
+        await asyncio.sleep(0.001)
+
+
+def make_queue(sent, **kwargs) -> OutputQueue:
+    return OutputQueue(
+        asyncio.get_running_loop(),
+        lambda msg: sent.append(list(msg.data)),
+        [0, 1],
+        **kwargs,
+    )
+
+
+def test_sysex_order():
+    sent = []
+
+    async def main():
+        queue = make_queue(sent)
+        for i in range(5):
+            queue.put_sysex([i, i])
+        await drain(queue)
+        return queue.metrics
+
+    metrics = run(main())
+    assert sent == [[i, i] for i in range(5)]
+    assert metrics.sent_messages == 5
+    assert metrics.sent_bytes == 5 * (2 + SYSEX_FRAMING)
+
+
+def test_led_updates_merged_and_packed():
+    sent = []
+
+    async def main():
+        # preamble (2) + 2 updates (3 each) + framing (2) = 10 bytes per message
+        queue = make_queue(sent, max_sysex_size=10)
+        queue.put_leds([(key, bytes([key, 0, 0])) for key in range(5)])
+        queue.put_leds([(0, bytes([0, 9, 9]))])
+        await drain(queue)
+        return queue.metrics
+
+    metrics = run(main())
+    assert metrics.merged_updates == 1
+    assert sent == [
+        [0, 1, 0, 9, 9, 1, 0, 0],
+        [0, 1, 2, 0, 0, 3, 0, 0],
+        [0, 1, 4, 0, 0],
+    ]
+
+
+def test_message_rate():
+    sent = []
+
+    async def main():
+        # 5 messages are sent in a burst, the next 10 at 100 messages/s (100ms)
+        queue = make_queue(sent, message_rate=100)
+        start = time.monotonic()
+        for i in range(15):
+            queue.put_sysex([i])
+        await drain(queue)
+        return time.monotonic() - start
+
+    assert run(main()) >= 0.08
+    assert len(sent) == 15
+
+
+def test_byte_rate():
+    sent = []
+
+    async def main():
+        # 2 messages of 102 bytes fit in the 256 bytes burst, the next 2 wait for
+        # 4 * 102 - 256 = 152 bytes at 2000 B/s (76ms)
+        queue = make_queue(sent, byte_rate=2000)
+        start = time.monotonic()
+        for i in range(4):
+            queue.put_sysex([i] * 100)
+        await drain(queue)
+        return time.monotonic() - start
+
+    assert run(main()) >= 0.07
+    assert len(sent) == 4
+
+
+def test_send_all_ignores_budget():
+    sent = []
+
+    async def main():
+        queue = make_queue(sent, message_rate=1)
+        for i in range(10):
+            queue.put_sysex([i])
+        queue.send_all()
+        return queue.depth
+
+    assert run(main()) == 0
+    assert len(sent) == 10
+
+
+def test_send_failure_is_not_fatal():
+    sent = []
+
+    def send(msg):
+        if msg.data[0] == 1:
+            raise OSError("port closed")
+        sent.append(list(msg.data))
+
+    async def main():
+        queue = OutputQueue(asyncio.get_running_loop(), send, [])
+        for i in range(3):
+            queue.put_sysex([i])
+        await drain(queue)
+
+    run(main())
+    assert sent == [[0], [2]]
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+vp = pytest.importorskip("vpype")
+
+from aximix.optimize import (  # noqa: E402
+    MERGE_TOLERANCE,
+    SIMPLIFY_TOLERANCE,
+    merge_lines,
+    optimize_lines,
+    pen_up_distance,
+    simplify_line,
+    sort_lines,
+)
+
+
+def line(*points):
+    return np.array(points, dtype=complex)
+
+
+def test_pen_up_distance():
+    assert pen_up_distance([]) == 0
+    assert pen_up_distance([line(0, 10)]) == 0
+    lines = [line(0, 10), line(10 + 3j, 20), line(), line(20 + 4j, 30)]
+    assert pen_up_distance(lines) == pytest.approx(7)
+
+
+def test_merge_within_tolerance():
+    merged = merge_lines([line(0, 10), line(10.01, 20)], tolerance=0.05)
+    assert len(merged) == 1
+    assert merged[0][0] == 0
+    assert merged[0][-1] == 20
+
+
+def test_merge_beyond_tolerance():
+    merged = merge_lines([line(0, 10), line(10.1, 20)], tolerance=0.05)
+    assert len(merged) == 2
+
+
+def test_merge_flips_lines():
+    merged = merge_lines([line(0, 10), line(20, 10)], tolerance=0.05)
+    assert len(merged) == 1
+    assert {merged[0][0], merged[0][-1]} == {0, 20}
+
+
+def test_sort_nearest_neighbour():
+    lines = [line(0, 1), line(100, 101), line(2, 3), line(50, 51)]
+    assert [s[0] for s in sort_lines(lines)] == [0, 2, 50, 100]
+
+
+def test_sort_reverses_lines():
+    sorted_lines = sort_lines([line(0, 10), line(30, 11)])
+    assert np.array_equal(sorted_lines[1], line(11, 30))
+
+
+def test_sort_trivial():
+    assert sort_lines([]) == []
+    single = [line(0, 1)]
+    assert sort_lines(single) == single
+
+
+def test_simplify_keeps_endpoints():
+    points = line(*(x + 0.01j * (x % 2) for x in range(10)))
+    simplified = simplify_line(points, tolerance=0.05)
+    assert np.array_equal(simplified, points[[0, -1]])
+
+
+def test_simplify_keeps_corners():
+    points = line(0, 1, 2, 2 + 1j, 2 + 2j)
+    assert np.array_equal(simplify_line(points, tolerance=0.05), line(0, 2, 2 + 2j))
+
+
+def test_simplify_short_lines():
+    points = line(0, 1)
+    assert simplify_line(points, tolerance=1) is points
+
+
+def test_optimize_lines_distances():
+    lines = [line(0, 10), line(100, 110), line(10.01, 20)]
+    optimized, before, after = optimize_lines(
+        lines, merge=True, sort=True, simplify=True
+    )
+    assert before == pytest.approx(pen_up_distance(lines))
+    assert after == pytest.approx(pen_up_distance(optimized))
+    assert after < before
+    assert len(optimized) == 2
+
+
+def test_optimize_lines_disabled():
+    lines = [line(0, 10), line(100, 110), line(10.01, 20)]
+    optimized, before, after = optimize_lines(
+        lines, merge=False, sort=False, simplify=False
+    )
+    assert optimized is lines
+    assert before == after
+
+
+def test_tolerances():
+    assert MERGE_TOLERANCE == pytest.approx(vp.convert_length("0.05mm"))
+    assert SIMPLIFY_TOLERANCE == pytest.approx(vp.convert_length("0.05mm"))
@@ -0,0 +1,75 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+vp = pytest.importorskip("vpype")
+
+from aximix.pagelayout import PageLayout  # noqa: E402
+
+
+def vector_data(*layer_ids):
+    vd = vp.VectorData()
+    for layer_id in layer_ids:
+        vd.add(vp.LineCollection([np.array([0, 10 + 10j]) * layer_id]), layer_id)
+    return vd
+
+
+@pytest.fixture
+def executor():
+    executor = ThreadPoolExecutor(max_workers=1)
+    yield executor
+    executor.shutdown()
+
+
+def block(executor):
+    """Keep the executor busy until the returned event is set, so that optimisations
+    stay pending."""
+    release = threading.Event()
+    executor.submit(release.wait)
+    return release
+
+
+def test_snapshot_survives_file_change(executor):
+    pl = PageLayout(executor=executor)
+    pl.sort = True
+    release = block(executor)
+    pl.set_vector_data("a.svg", vector_data(1, 2))
+    pl.optimize()
+    snapshot = pl.snapshot()
+    shared = snapshot.optimize()
+
+    # loading another file cancels the pending optimisations of the previous one
+    pl.set_vector_data("b.svg", vector_data(3))
+    assert all(future.cancelled() for future in shared)
+
+    release.set()
+    vd = snapshot.get_plot_vector_data()
+    assert sorted(vd.layers) == [1, 2]
+    assert pl.path == "b.svg"
+    assert snapshot.path == "a.svg"
+
+
+def test_snapshot_reuses_optimisations(executor):
+    pl = PageLayout(executor=executor)
+    pl.merge = True
+    pl.set_vector_data("a.svg", vector_data(1))
+    futures = pl.optimize()
+    snapshot = pl.snapshot()
+    assert snapshot.optimize() == futures
+
+    # optimisations started by the snapshot aren't added to the layout
+    snapshot.sort = True
+    snapshot.optimize()
+    assert pl.optimize() == futures
+
+
+def test_snapshot_settings_independent():
+    pl = PageLayout()
+    pl.set_vector_data("a.svg", vector_data(1, 2))
+    snapshot = pl.snapshot()
+    pl.set_layer_enabled(1, False)
+    pl.layer_order = [2, 1]
+    assert snapshot.layer_enabled(1)
+    assert snapshot.layer_order == []
@@ -0,0 +1,65 @@
+import asyncio
+import threading
+
+import numpy as np
+
+from aximix.plot_worker import IDLE, PAUSED, PLOTTING, PlotJob, PlotWorker
+
+
+class BlockingAxy:
+    """Plots block until released, then fail."""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.options = {}
+
+    def set_option(self, option, value):
+        self.options[option] = value
+
+    def plot_paths(
+        self, layers, start=0, on_progress=None, should_stop=None, home=True
+    ):
+        self.started.set()
+        self.release.wait()
+        raise OSError("plotter unplugged")
+
+
+def run_failing_plot(cancel):
+    async def main():
+        loop = asyncio.get_running_loop()
+        axy = BlockingAxy()
+        worker = PlotWorker(loop, axy)
+        states = []
+        worker.on_state_changed.connect(states.append)
+        errors = []
+        worker.on_error.connect(errors.append)
+
+        worker.plot(PlotJob("f", {1: [np.array([0, 1j])]}))
+        await loop.run_in_executor(None, axy.started.wait)
+        if cancel:
+            worker.cancel()
+        axy.release.set()
+        while worker.state == PLOTTING:
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0)
+        state, job = worker.state, worker.job
+        worker.close()
+        return state, job, states, errors
+
+    return asyncio.run(asyncio.wait_for(main(), 5))
+
+
+def test_error_pauses_job():
+    state, job, states, errors = run_failing_plot(cancel=False)
+    assert state == PAUSED
+    assert job is not None
+    assert len(errors) == 1
+
+
+def test_error_after_cancel_ends_job():
+    state, job, states, errors = run_failing_plot(cancel=True)
+    assert state == IDLE
+    assert job is None
+    assert PAUSED not in states
+    assert len(errors) == 1
@@ -0,0 +1,108 @@
+import asyncio
+
+import numpy as np
+
+from aximix.plot_worker import PlotJob
+from aximix.plotter_pool import PlotterPool
+
+
+class FakeAxy:
+    def __init__(self, failing_ports):
+        self._failing_ports = failing_ports
+        self.port = None
+        self.plotted = []
+
+    def set_option(self, option, value):
+        if option == "port":
+            self.port = value
+
+    def plot_paths(
+        self, layers, start=0, on_progress=None, should_stop=None, home=True
+    ):
+        if self.port in self._failing_ports:
+            raise OSError(f"no plotter on {self.port}")
+        self.plotted.append(list(layers))
+        return sum(len(lines) for lines in layers.values())
+
+
+def run_pool(ports, jobs, failing_ports=(), split_layers=False):
+    events = []
+
+    async def main():
+        pool = PlotterPool(
+            asyncio.get_running_loop(), lambda: FakeAxy(failing_ports), ports
+        )
+        pool.on_job_finished.connect(
+            lambda port, job: events.append(("finished", port, job.name))
+        )
+        pool.on_job_failed.connect(
+            lambda port, job, exc: events.append(("failed", port, job.name))
+        )
+        for job in jobs:
+            (pool.submit_layers if split_layers else pool.submit)(job)
+        while not pool.idle:
+            await asyncio.sleep(0.001)
+        pool.close()
+        return pool
+
+    return asyncio.run(asyncio.wait_for(main(), 5)), events
+
+
+def job(name, layers=(1,)):
+    return PlotJob(name, {layer_id: [np.array([0, 1j])] for layer_id in layers})
+
+
+def test_jobs_shared_between_plotters():
+    pool, events = run_pool(["p1", "p2"], [job(f"f{i}") for i in range(6)])
+    assert sorted(name for _, _, name in events) == [f"f{i}" for i in range(6)]
+    assert all(kind == "finished" for kind, _, _ in events)
+    assert sum(len(w.axy.plotted) for w in pool.workers.values()) == 6
+
+
+def test_split_layers():
+    pool, events = run_pool(["p1", "p2"], [job("f", (1, 2, 3))], split_layers=True)
+    assert sorted(name for _, _, name in events) == ["f [1]", "f [2]", "f [3]"]
+
+
+def test_failing_plotter_out_of_service():
+    pool, events = run_pool(
+        ["bad", "good"], [job(f"f{i}") for i in range(4)], failing_ports={"bad"}
+    )
+    # the job given to the failing plotter is plotted by the other one
+    assert sorted(events) == [("finished", "good", f"f{i}") for i in range(4)]
+    assert pool.available_ports == ["good"]
+
+
+def test_no_plotter_left():
+    pool, events = run_pool(
+        ["p1", "p2"], [job("f0"), job("f1"), job("f2")], failing_ports={"p1", "p2"}
+    )
+    assert sorted(events) == [("failed", None, f"f{i}") for i in range(3)]
+    assert pool.available_ports == []
+
+
+def test_partly_plotted_job_fails():
+    class FailingOnLayer2(FakeAxy):
+        def plot_paths(self, layers, **kwargs):
+            if 2 in layers:
+                raise OSError("disconnected")
+            return super().plot_paths(layers, **kwargs)
+
+    events = []
+
+    async def main():
+        pool = PlotterPool(
+            asyncio.get_running_loop(), lambda: FailingOnLayer2(()), ["p1", "p2"]
+        )
+        pool.on_job_failed.connect(
+            lambda port, job, exc: events.append((port, job.name, job.position, exc))
+        )
+        pool.submit(job("f", (1, 2)))
+        while not pool.idle:
+            await asyncio.sleep(0.001)
+        pool.close()
+
+    asyncio.run(asyncio.wait_for(main(), 5))
+    # it can't be finished on another plotter's paper
+    ((port, name, position, exc),) = events
+    assert (port, name, position, str(exc)) == ("p1", "f", 1, "disconnected")
@@ -0,0 +1,137 @@
+import io
+import queue
+import struct
+import subprocess
+import sys
+import zlib
+
+import numpy as np
+import pytest
+
+vp = pytest.importorskip("vpype")
+pytest.importorskip("matplotlib")
+
+from aximix import preview  # noqa: E402
+from aximix.preview import (  # noqa: E402
+    PAGE_COLOR,
+    PEN_UP_COLOR,
+    PreviewViewer,
+    encode_png,
+    render_vector_data,
+)
+
+WHITE = (255, 255, 255)
+
+
+def layer_color(layer_id):
+    return tuple((np.array(preview.COLORS[layer_id - 1]) * 255).astype(np.uint8))
+
+
+def render(lines, layer_id=1, **kwargs):
+    vd = vp.VectorData()
+    vd.add(vp.LineCollection(lines), layer_id)
+    # 1 pixel per mm
+    return render_vector_data(vd, (100, 50), width=101, **kwargs)
+
+
+def test_render_page():
+    image = render([])
+    assert image.shape == (51, 101, 3)
+    assert image.dtype == np.uint8
+    assert tuple(image[0, 0]) == PAGE_COLOR
+    assert tuple(image[50, 100]) == PAGE_COLOR
+    assert tuple(image[0, 50]) == PAGE_COLOR
+    assert tuple(image[25, 0]) == PAGE_COLOR
+    assert tuple(image[25, 50]) == WHITE
+
+
+def test_render_lines_colored_by_layer():
+    image = render([[10 + 10j, 30 + 10j]], layer_id=3)
+    color = layer_color(3)
+    for x in range(10, 31):
+        assert tuple(image[10, x]) == color
+    assert tuple(image[11, 20]) == WHITE
+    assert layer_color(3) != layer_color(1)
+
+
+def test_render_pen_up():
+    lines = [[10 + 10j, 20 + 10j], [20 + 40j, 30 + 40j]]
+    image = render(lines)
+    travel = image[11:40, 20]
+    assert any(tuple(pixel) == PEN_UP_COLOR for pixel in travel)
+    # the trajectory is dotted
+    assert any(tuple(pixel) == WHITE for pixel in travel)
+
+    image = render(lines, show_pen_up=False)
+    assert all(tuple(pixel) == WHITE for pixel in image[11:40, 20])
+
+
+def read_chunks(data):
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    pos = 8
+    chunks = []
+    while pos < len(data):
+        (length,) = struct.unpack(">I", data[pos : pos + 4])
+        tag = data[pos + 4 : pos + 8]
+        body = data[pos + 8 : pos + 8 + length]
+        (crc,) = struct.unpack(">I", data[pos + 8 + length : pos + 12 + length])
+        assert crc == zlib.crc32(tag + body) & 0xFFFFFFFF
+        chunks.append((tag, body))
+        pos += 12 + length
+    return chunks
+
+
+def test_encode_png():
+    image = np.random.default_rng(0).integers(0, 256, (7, 5, 3), dtype=np.uint8)
+    chunks = read_chunks(encode_png(image))
+    assert [tag for tag, _ in chunks] == [b"IHDR", b"IDAT", b"IEND"]
+
+    width, height, depth, color_type, *_ = struct.unpack(">IIBBBBB", chunks[0][1])
+    assert (width, height, depth, color_type) == (5, 7, 8, 2)
+
+    raw = np.frombuffer(zlib.decompress(chunks[1][1]), dtype=np.uint8)
+    rows = raw.reshape(7, 1 + 5 * 3)
+    assert np.all(rows[:, 0] == 0)
+    assert np.array_equal(rows[:, 1:].reshape(7, 5, 3), image)
+
+
+def test_write_png(tmp_path):
+    image = np.zeros((2, 3, 3), dtype=np.uint8)
+    path = tmp_path / "preview.png"
+    preview.write_png(str(path), image)
+    assert path.read_bytes() == encode_png(image)
+
+
+def test_read_frames():
+    stream = io.BytesIO()
+    image = np.arange(2 * 3 * 3, dtype=np.uint8).reshape(2, 3, 3)
+    for title in ("first", "second"):
+        stream.write(preview._FRAME_HEADER.pack(2, 3, len(title)))
+        stream.write(title.encode())
+        stream.write(image.tobytes())
+    stream.seek(0)
+
+    frames = queue.Queue()
+    preview._read_frames(stream, frames)
+    for title in ("first", "second"):
+        frame_image, frame_title = frames.get_nowait()
+        assert frame_title == title
+        assert np.array_equal(frame_image, image)
+    assert frames.get_nowait() is None
+
+
+def test_viewer_imports_package_from_any_directory(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        subprocess, "Popen", lambda args, **kwargs: calls.append((args, kwargs))
+    )
+    monkeypatch.delenv("PYTHONPATH", raising=False)
+    PreviewViewer._start()
+    ((args, kwargs),) = calls
+    assert args == [sys.executable, "-m", "aximix.preview"]
+    monkeypatch.undo()
+
+    result = subprocess.run(
+        [sys.executable, "-c", "import aximix"], cwd=tmp_path, env=kwargs["env"]
+    )
+    assert result.returncode == 0
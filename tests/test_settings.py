@@ -0,0 +1,101 @@
+import configparser
+import os
+import threading
+
+import pytest
+
+from aximix import settings
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    cfg = configparser.ConfigParser()
+    cfg["__persistent__"] = {}
+    path = str(tmp_path / "aximix.ini")
+    monkeypatch.setattr(settings, "config", cfg)
+    monkeypatch.setattr(settings, "config_path", path)
+    yield cfg
+    settings.flush_config()
+
+
+def read_back(path):
+    cfg = configparser.ConfigParser()
+    cfg.read(path)
+    return cfg
+
+
+def test_write_behind(config, monkeypatch):
+    monkeypatch.setattr(settings, "SAVE_DELAY", 60)
+    var = settings.PersistentVar("speed", 1.5)
+    var.set_value(3)
+    var.set_value(4)
+
+    # cached as the variable's type, not written yet
+    assert var.value == 4.0 and isinstance(var.value, float)
+    assert config["__persistent__"]["speed"] == "4.0"
+    assert not os.path.exists(settings.config_path)
+
+    settings.flush_config()
+    assert read_back(settings.config_path)["__persistent__"]["speed"] == "4.0"
+    assert not os.path.exists(settings.config_path + ".tmp")
+
+
+def test_timer_save(config, monkeypatch):
+    monkeypatch.setattr(settings, "SAVE_DELAY", 0.01)
+    saved = threading.Event()
+    save_config = settings.save_config
+
+    def save():
+        save_config()
+        saved.set()
+
+    monkeypatch.setattr(settings, "save_config", save)
+    settings.PersistentVar("name", "a").set_value("b")
+    assert saved.wait(5)
+    assert read_back(settings.config_path)["__persistent__"]["name"] == "b"
+
+
+def test_read_bool(config):
+    config["__persistent__"]["flag"] = "False"
+    assert settings.PersistentVar("flag", True).value is False
+    assert settings.PersistentVar("other", True).value is True
+
+
+def test_concurrent_saves(config):
+    var = settings.PersistentVar("count", 0)
+    threads = [threading.Thread(target=settings.save_config) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for i in range(50):
+        var.set_value(i)
+    for thread in threads:
+        thread.join()
+
+    settings.flush_config()
+    assert read_back(settings.config_path)["__persistent__"]["count"] == "49"
+
+
+def test_axidraw_config(config):
+    assert settings.get_axidraw_config() == {}
+    config["axidraw"] = {"speed_penup": "80", "const_speed": "yes", "port": "/dev/x"}
+    assert settings.get_axidraw_config() == {
+        "speed_penup": 80,
+        "const_speed": True,
+        "port": "/dev/x",
+    }
+
+
+def test_layer_config(config):
+    config["layer_2"] = {"pen": "red", "speed_pendown": "10"}
+    config["layer_x"] = {"pen": "ignored"}
+    assert settings.get_layer_config() == {2: {"pen": "red", "speed_pendown": 10}}
+
+
+def test_get_setting(config):
+    assert settings.get_setting("layer_order", "") == ""
+    assert settings.get_layer_order() == []
+    with pytest.raises(KeyError):
+        settings.get_setting("layer_order")
+
+    config["aximix"] = {"layer_order": "3, 1 2"}
+    assert settings.get_layer_order() == [3, 1, 2]
@@ -0,0 +1,125 @@
+import gc
+
+import pytest
+
+from aximix.launchpad import Scene
+from aximix.signal import Signal, live_slot_count
+
+
+class Receiver:
+    def __init__(self):
+        self.values = []
+
+    def receive(self, value):
+        self.values.append(value)
+
+
+def test_emit_in_connection_order():
+    signal = Signal()
+    calls = []
+    signal.connect(lambda v: calls.append(("a", v)))
+    signal.connect(lambda v: calls.append(("b", v)))
+    signal(1)
+    assert calls == [("a", 1), ("b", 1)]
+
+
+def test_connection_disconnect():
+    signal = Signal()
+    calls = []
+    connection = signal.connect(calls.append)
+    assert connection.connected
+    connection.disconnect()
+    assert not connection.connected
+    signal(1)
+    assert calls == []
+    assert signal.slot_count == 0
+    connection.disconnect()  # no-op
+
+
+def test_disconnect_by_callback():
+    signal = Signal()
+    receiver = Receiver()
+    signal.connect(receiver.receive)
+    # an equal bound method, not the same object
+    signal.disconnect(receiver.receive)
+    assert signal.slot_count == 0
+    with pytest.raises(ValueError):
+        signal.disconnect(receiver.receive)
+
+
+def test_connect_as_decorator():
+    signal = Signal()
+
+    @signal.connect
+    def double(value):
+        return 2 * value
+
+    assert double(2) == 4
+    signal.disconnect(double)
+    assert signal.slot_count == 0
+
+
+def test_bound_methods_held_strongly_by_default():
+    signal = Signal()
+    receiver = Receiver()
+    values = receiver.values
+    signal.connect(receiver.receive)
+    del receiver
+    gc.collect()
+    signal(1)
+    assert values == [1]
+
+
+def test_weak_slot_dropped_when_collected():
+    signal = Signal()
+    receiver = Receiver()
+    connection = signal.connect(receiver.receive, weak=True)
+    signal(1)
+    assert receiver.values == [1]
+
+    del receiver
+    gc.collect()
+    assert signal.slot_count == 0
+    assert not connection.connected
+    assert connection.callback is None
+    signal(2)  # nothing left to call
+
+
+def test_disconnect_while_emitting():
+    signal = Signal()
+    calls = []
+    second = None
+
+    def first(value):
+        calls.append("first")
+        second.disconnect()
+
+    signal.connect(first)
+    second = signal.connect(lambda v: calls.append("second"))
+    signal(1)  # slots are snapshotted before the emission
+    signal(2)
+    assert calls == ["first", "second", "first"]
+
+
+def test_live_slot_count():
+    before = live_slot_count()
+    signal = Signal()
+    connection = signal.connect(print)
+    assert live_slot_count() == before + 1
+    connection.disconnect()
+    assert live_slot_count() == before
+
+
+def test_scene_bind_key_replaces_binding():
+    scene = Scene(None)
+    calls = []
+    scene.on_key_press(11).connect(lambda key: calls.append("direct"))
+    scene.bind_key(11, lambda key: calls.append("first"))
+    scene.bind_key(11, lambda key: calls.append("second"))
+    scene.trigger_on_key_press(11)
+    assert calls == ["direct", "second"]
+
+    scene.unbind_key(11)
+    scene.trigger_on_key_press(11)
+    assert calls == ["direct", "second", "direct"]
+    assert scene.slot_count == 1
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from axy.kinematics import PX_PER_INCH, LayerGeometry, MotionSettings, travel_time
+from axy.simulator import Axy
+
+LAYERS = {
+    1: [np.array([1, 2]) * PX_PER_INCH, np.array([2 + 1j, 4 + 1j]) * PX_PER_INCH],
+    2: [np.array([4 + 2j, 4 + 3j]) * PX_PER_INCH],
+}
+
+
+@pytest.fixture
+def sim():
+    return Axy()
+
+
+def test_plot_paths_stats(sim):
+    progress = []
+    assert sim.plot_paths(LAYERS, on_progress=lambda *p: progress.append(p)) == 3
+    assert progress == [(1, 3), (2, 3), (3, 3)]
+
+    # from home to the first line, between lines and back home
+    assert sim.stats.pen_up_distance == pytest.approx(1 + 1 + 1 + 5)
+    assert sim.stats.pen_down_distance == pytest.approx(1 + 2 + 1)
+    # per line: pen-up move, pen lowering and raising, one segment; plus homing
+    assert sim.stats.command_count == 3 * 4 + 1
+    assert sim.position == 0
+
+
+def test_plot_paths_time_matches_estimate(sim):
+    sim.plot_paths(LAYERS)
+    settings = MotionSettings()
+    lines = [line for layer in LAYERS.values() for line in layer]
+    expected = LayerGeometry(lines).estimate(settings)
+    expected += travel_time(np.array([5.0]), settings)[0]
+    assert sim.stats.plot_time == pytest.approx(expected)
+
+
+def test_plot_paths_options(sim):
+    sim.plot_paths(LAYERS)
+    default_time = sim.reset_stats().plot_time
+
+    sim.set_option("speed_pendown", 10)
+    sim.plot_paths(LAYERS)
+    assert sim.stats.plot_time > default_time
+
+
+def test_set_option_invalid(sim):
+    with pytest.raises(ValueError):
+        sim.set_option("no_such_option", 1)
+
+
+def test_plot_paths_start(sim):
+    progress = []
+    done = sim.plot_paths(
+        LAYERS, start=2, on_progress=lambda *p: progress.append(p), home=False
+    )
+    assert done == 3
+    assert progress == [(3, 3)]
+    assert sim.stats.pen_down_distance == pytest.approx(1)
+    assert sim.position == (4 + 3j) * PX_PER_INCH
+
+
+def test_plot_paths_stop(sim):
+    calls = []
+
+    def should_stop():
+        calls.append(None)
+        return len(calls) > 2
+
+    assert sim.plot_paths(LAYERS, should_stop=should_stop) == 2
+    assert sim.stats.pen_down_distance == pytest.approx(3)
+    assert sim.position == (4 + 1j) * PX_PER_INCH
+
+
+def test_walk(sim):
+    sim.walk_x(2)
+    sim.walk_y(1)
+    assert sim.position == (2 + 1j) * PX_PER_INCH
+    assert sim.stats.pen_up_distance == pytest.approx(3)
+    assert sim.stats.command_count == 2
+
+
+def test_pen_moves(sim):
+    sim.pen_down()
+    sim.pen_up()
+    settings = MotionSettings()
+    expected = settings.pen_lower_time + settings.pen_raise_time
+    assert sim.stats.plot_time == pytest.approx(expected)
+
+
+def test_reset_stats(sim):
+    sim.walk_x(1)
+    stats = sim.reset_stats()
+    assert stats.pen_up_distance == pytest.approx(1)
+    assert sim.stats.pen_up_distance == 0
@@ -0,0 +1,146 @@
+import io
+
+import numpy as np
+import pytest
+
+from axy.trace import (
+    TracedAxy,
+    Tracer,
+    decode_paths,
+    encode_paths,
+    read_trace,
+    replay,
+    summarize,
+)
+
+
+class Recorder:
+    """Minimal Axy recording its calls."""
+
+    def __init__(self):
+        self.calls = []
+        self.options = {}
+
+    def set_option(self, option, value):
+        self.options[option] = value
+
+    def plot_paths(self, layers, start=0, on_progress=None, should_stop=None):
+        layers = {layer_id: list(lines) for layer_id, lines in layers.items()}
+        self.calls.append(("plot_paths", layers, start))
+        return sum(len(lines) for lines in layers.values())
+
+    def plot_svg(self, svg, resume=False):
+        self.calls.append(("plot_svg", svg, resume))
+
+    def pen_up(self):
+        self.calls.append(("pen_up",))
+
+
+LAYERS = {
+    1: [np.array([0, 1 + 2j, 3.5 + 4j]), np.array([5j])],
+    3: [np.array([1.25 + 0.5j, 2 + 2j])],
+}
+
+
+def assert_layers_equal(actual, expected):
+    assert list(actual) == list(expected)
+    for layer_id, lines in expected.items():
+        assert len(actual[layer_id]) == len(lines)
+        for a, b in zip(actual[layer_id], lines):
+            np.testing.assert_array_equal(a, b)
+
+
+@pytest.fixture
+def trace_path(tmp_path):
+    return str(tmp_path / "trace.jsonl")
+
+
+def traced(trace_path, record_data=True):
+    tracer = Tracer(trace_path)
+    return TracedAxy(Recorder(), tracer, record_data=record_data), tracer
+
+
+def test_encode_decode_paths():
+    assert_layers_equal(decode_paths(encode_paths(LAYERS)), LAYERS)
+
+
+def test_replay_round_trip(trace_path):
+    axy, tracer = traced(trace_path)
+    axy.set_option("speed_pendown", 40)
+    assert axy.plot_paths(LAYERS, start=1, on_progress=lambda d, t: None) == 3
+    axy.plot_svg("<svg/>" * 100)
+    axy.pen_up()
+    tracer.close()
+
+    target = Recorder()
+    assert replay(trace_path, target) == 3
+    assert target.options == {"speed_pendown": 40}
+    name, layers, start = target.calls[0]
+    assert (name, start) == ("plot_paths", 1)
+    assert_layers_equal(layers, LAYERS)
+    assert target.calls[1:] == [("plot_svg", "<svg/>" * 100, False), ("pen_up",)]
+
+
+def test_no_data_keeps_generators(trace_path):
+    axy, tracer = traced(trace_path, record_data=False)
+    lines = (line for line in LAYERS[1])
+    assert axy.plot_paths({1: lines}) == 2
+    assert_layers_equal(axy.wrapped.calls[0][1], {1: LAYERS[1]})
+    tracer.close()
+
+    (record,) = read_trace(trace_path)
+    assert record["args"]["line_count"] == 2
+    assert "layers" not in record["args"]
+
+
+def test_replay_skips_unrecorded_data(trace_path, capsys):
+    axy, tracer = traced(trace_path, record_data=False)
+    axy.plot_paths(LAYERS)
+    axy.plot_svg("<svg/>")  # short SVGs are recorded anyway
+    axy.plot_svg("<svg/>" * 100)
+    tracer.close()
+
+    target = Recorder()
+    assert replay(trace_path, target) == 1
+    assert target.calls == [("plot_svg", "<svg/>", False)]
+    assert "skipping plot_paths" in capsys.readouterr().err
+
+
+def test_error_recorded(trace_path):
+    axy, tracer = traced(trace_path)
+    axy.wrapped.pen_up = lambda: 1 / 0
+    with pytest.raises(ZeroDivisionError):
+        axy.pen_up()
+    tracer.close()
+
+    (record,) = read_trace(trace_path)
+    assert "ZeroDivisionError" in record["error"]
+    assert record["duration"] >= 0
+
+
+def test_summarize(trace_path):
+    axy, tracer = traced(trace_path)
+    axy.pen_up()
+    axy.pen_up()
+    tracer.close()
+
+    out = io.StringIO()
+    summarize(trace_path, out)
+    (row,) = [line for line in out.getvalue().splitlines() if line.startswith("pen_up")]
+    assert row.split()[1] == "2"
+
+
+def test_records_use_tracer_clock(trace_path, monkeypatch):
+    axy, tracer = traced(trace_path)
+    with tracer.span("before"):
+        pass
+    # a wall clock step doesn't reorder records
+    monkeypatch.setattr("time.time", lambda: 0.0)
+    axy.set_option("speed_pendown", 30)
+    axy.pen_up()
+    tracer.close()
+
+    records = list(read_trace(trace_path))
+    assert [r["name"] for r in records] == ["before", "set_option", "pen_up"]
+    times = [r["time"] for r in records]
+    assert times == sorted(times)